@@ -0,0 +1,441 @@
+"""
+Sends load to a running server and reports throughput, latency
+percentiles and errors, to size the workers in `gunicorn.conf.py`.
+
+    poetry run python benchmarks/load.py --start-server --workers 3 --concurrency 64
+    poetry run python benchmarks/load.py --url http://localhost:8080 --rate 500
+    poetry run python benchmarks/load.py --log traffic.jsonl --rate 200
+
+Without `--log`, traffic is a mix of `/tickers`, paginated history and
+portfolio requests by `--users` random users: `--follow` of the history
+pages are followed by a request to their `next` link. A log replays one
+request per line, in order: `{"path": "/tickers", "username": "..."}`,
+where `username` is optional.
+
+With `--concurrency`, each connection sends a request as soon as the
+previous one is answered. With `--rate`, requests are sent at a fixed
+rate whatever the response times: latencies are measured from the time
+each request was due, so a saturated server shows up in the percentiles.
+"""
+import argparse
+import asyncio
+import base64
+import collections
+import functools
+import itertools
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import urllib.parse
+import uuid
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+from littlejohn.entrypoints.asgi import ALLOWED_STOCK_SYMBOLS
+
+PERCENTILES = [50, 95, 99, 99.9]
+LINK_NEXT = re.compile(r'<?([^>;]+)>?; rel="next"')
+
+
+class Request(NamedTuple):
+    path: str
+    username: str
+
+
+class Response(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+class Result(NamedTuple):
+    route: str
+    # None when the request failed without a response
+    status: Optional[int]
+    latency: float
+
+
+class Connection:
+    """HTTP/1.1 connection kept alive between requests."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def get(self, request: Request) -> Response:
+        try:
+            return await asyncio.wait_for(self._get(request), self.timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _get(self, request: Request) -> Response:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        assert self.reader is not None
+
+        credentials = base64.b64encode(f"{request.username}:".encode("utf-8"))
+        self.writer.write(
+            f"GET {request.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Authorization: Basic {credentials.decode('ascii')}\r\n"
+            "\r\n".encode("utf-8")
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readuntil(b"\r\n")).decode("latin-1")
+            if line == "\r\n":
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            body = await self._read_chunks()
+        else:
+            body = b""
+
+        if headers.get("connection") == "close":
+            self.close()
+        return Response(status=status, headers=headers, body=body)
+
+    async def _read_chunks(self) -> bytes:
+        assert self.reader is not None
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            chunks.append(await self.reader.readexactly(size + 2))
+            if size == 0:
+                return b"".join(chunk[:-2] for chunk in chunks)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+Connect = Callable[[], Connection]
+
+
+class Traffic:
+    """
+    Requests to send: from `log` if given, otherwise generated. The `next`
+    links of history pages are followed with probability `follow`.
+    """
+
+    def __init__(
+        self,
+        log: Optional[Iterator[Request]],
+        users: int,
+        follow: float,
+        seed: int,
+    ):
+        self.log = log
+        self.random = random.Random(seed)
+        self.users = [
+            uuid.UUID(int=self.random.getrandbits(128), version=4).hex
+            for _ in range(users)
+        ]
+        self.symbols = sorted(ALLOWED_STOCK_SYMBOLS)
+        self.follow = follow
+        self.pending: Deque[Request] = collections.deque()
+
+    def __iter__(self) -> "Traffic":
+        return self
+
+    def __next__(self) -> Request:
+        if self.pending:
+            return self.pending.popleft()
+
+        if self.log is not None:
+            return next(self.log)
+
+        username = self.random.choice(self.users)
+        kind = self.random.choices(
+            ["tickers", "history", "multiple", "portfolio"],
+            weights=[50, 30, 10, 10],
+        )[0]
+        if kind == "tickers":
+            return Request("/tickers", username)
+        if kind == "history":
+            return Request(
+                f"/tickers/{self.random.choice(self.symbols)}/history", username
+            )
+        if kind == "multiple":
+            symbols = self.random.sample(self.symbols, k=self.random.randint(2, 10))
+            return Request(f"/tickers/history?symbols={','.join(symbols)}", username)
+        return Request("/portfolio/history", username)
+
+    def observe(self, request: Request, response: Response) -> None:
+        link = LINK_NEXT.search(response.headers.get("link", ""))
+        if self.log is None and link and self.random.random() < self.follow:
+            self.pending.append(Request(link.group(1).strip(), request.username))
+
+
+def read_log(path: str) -> Iterator[Request]:
+    with open(path) as file:
+        for number, line in enumerate(file, start=1):
+            try:
+                entry = json.loads(line)
+                request_path = entry["path"]
+            except (ValueError, KeyError, TypeError):
+                print(f"{path}:{number}: not a request, skipped", file=sys.stderr)
+                continue
+            username = entry.get("username") or uuid.uuid4().hex
+            yield Request(request_path, username)
+
+
+def route(path: str) -> str:
+    """`path` without its query and symbol, to group the results."""
+    path = urllib.parse.urlsplit(path).path
+    return re.sub(
+        r"^/tickers/(?!history)[^/]+/history", "/tickers/{symbol}/history", path
+    )
+
+
+async def run_closed_loop(
+    traffic: Traffic,
+    connect: Connect,
+    concurrency: int,
+    deadline: float,
+) -> List[Result]:
+    results: List[Result] = []
+
+    async def worker() -> None:
+        connection = connect()
+        while time.perf_counter() < deadline:
+            try:
+                request = next(traffic)
+            except StopIteration:
+                break
+            start = time.perf_counter()
+            results.append(await send(traffic, connection, request, start))
+        connection.close()
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return results
+
+
+async def run_open_loop(
+    traffic: Traffic,
+    connect: Connect,
+    rate: float,
+    max_connections: int,
+    deadline: float,
+) -> List[Result]:
+    results: List[Result] = []
+    idle: List[Connection] = []
+    slots = asyncio.Semaphore(max_connections)
+
+    async def request_at(request: Request, due: float) -> None:
+        async with slots:
+            connection = idle.pop() if idle else connect()
+            results.append(await send(traffic, connection, request, due))
+            idle.append(connection)
+
+    tasks = []
+    start = time.perf_counter()
+    for n in itertools.count():
+        due = start + n / rate
+        if due >= deadline:
+            break
+        try:
+            request = next(traffic)
+        except StopIteration:
+            break
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(request_at(request, due)))
+
+    await asyncio.gather(*tasks)
+    for connection in idle:
+        connection.close()
+    return results
+
+
+async def send(
+    traffic: Traffic,
+    connection: Connection,
+    request: Request,
+    start: float,
+) -> Result:
+    try:
+        response = await connection.get(request)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+        return Result(route(request.path), None, time.perf_counter() - start)
+
+    latency = time.perf_counter() - start
+    traffic.observe(request, response)
+    return Result(route(request.path), response.status, latency)
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 50), percentile([1.0, 2.0, 3.0, 4.0], 99)
+    (2.0, 4.0)
+    """
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(results: Sequence[Result], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(r.latency for r in results)
+    errors = [r for r in results if r.status is None or r.status >= 400]
+    statuses = collections.Counter(
+        str(r.status) if r.status is not None else "failed" for r in results
+    )
+    return {
+        "requests": len(results),
+        "throughput": len(results) / elapsed if elapsed > 0 else 0.0,
+        "error_rate": len(errors) / len(results) if results else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "latency": {
+            **{f"p{p:g}": percentile(latencies, p) for p in PERCENTILES},
+            "max": latencies[-1] if latencies else float("nan"),
+        },
+    }
+
+
+def print_summary(name: str, summary: Dict[str, Any]) -> None:
+    latency = "  ".join(
+        f"{key} {value * 1e3:8.1f}ms" for key, value in summary["latency"].items()
+    )
+    print(
+        f"{name:28} {summary['requests']:8} req {summary['throughput']:9.1f} req/s"
+        f"  errors {summary['error_rate']:6.2%}  {latency}"
+    )
+
+
+def start_server(port: int, workers: int) -> "subprocess.Popen[bytes]":
+    server = subprocess.Popen(
+        [
+            "gunicorn",
+            "--config",
+            "gunicorn.conf.py",
+            "--workers",
+            str(workers),
+            "--access-logfile",
+            "/dev/null",
+            "littlejohn.entrypoints.asgi:create_app()",
+        ],
+        env={**os.environ, "HTTP_PORT": str(port)},
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("the server exited")
+        try:
+            connection = Connection("localhost", port, timeout=1)
+            response = asyncio.run(connection.get(Request("/health", "")))
+            connection.close()
+            if response.status == 200:
+                return server
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("the server did not start")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--start-server", action="store_true", help="run gunicorn")
+    parser.add_argument("--workers", type=int, default=3, help="gunicorn workers")
+    parser.add_argument("--log", help="JSONL requests to replay")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=32)
+    mode.add_argument("--rate", type=float, help="requests per second")
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--follow", type=float, default=0.7)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    url = urllib.parse.urlsplit(args.url)
+    host, port = url.hostname or "localhost", url.port or 80
+    traffic = Traffic(
+        log=read_log(args.log) if args.log else None,
+        users=args.users,
+        follow=args.follow,
+        seed=args.seed,
+    )
+
+    server = start_server(port, args.workers) if args.start_server else None
+    try:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        connect = functools.partial(Connection, host, port, timeout=args.timeout)
+        if args.rate is not None:
+            run = run_open_loop(
+                traffic, connect, args.rate, args.max_connections, deadline
+            )
+        else:
+            run = run_closed_loop(traffic, connect, args.concurrency, deadline)
+        results = asyncio.run(run)
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    by_route: Dict[str, List[Result]] = collections.defaultdict(list)
+    for result in results:
+        by_route[result.route].append(result)
+    report = {
+        "settings": {
+            "url": args.url,
+            "workers": args.workers if args.start_server else None,
+            "concurrency": args.concurrency if args.rate is None else None,
+            "rate": args.rate,
+            "log": args.log,
+            "duration": elapsed,
+        },
+        "total": summarize(results, elapsed),
+        "routes": {
+            name: summarize(route_results, elapsed)
+            for name, route_results in sorted(by_route.items())
+        },
+    }
+
+    print_summary("total", report["total"])
+    for name, summary in report["routes"].items():
+        print_summary(name, summary)
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
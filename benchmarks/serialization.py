@@ -0,0 +1,64 @@
+"""
+Compares the encoding of a page of history through the pydantic models
+with `encode_price_history`.
+
+    poetry run python benchmarks/serialization.py
+"""
+import argparse
+import datetime
+import timeit
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+from littlejohn.domain.entities import PriceAtDate
+from littlejohn.entrypoints.asgi import GAIN, ZERO_DATE, create_stock_price_seeds
+from littlejohn.entrypoints.asgi.encoding import encode_price_history
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--length", type=int, default=90, help="days in a page")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    walker = StockPriceServiceRandomWalker(
+        zero_date=ZERO_DATE,
+        seeds=create_stock_price_seeds(["AAPL"]),
+        gain=GAIN,
+    )
+    history = walker.get_history(
+        ["AAPL"],
+        start_from=ZERO_DATE + datetime.timedelta(days=365),
+        length=args.length,
+    )
+    dates = history.dates()
+    prices = history.prices["AAPL"]
+
+    def models() -> bytes:
+        data = [PriceAtDate(price=p, date=d) for d, p in zip(dates, prices)]
+        body: bytes = JSONResponse(jsonable_encoder(data)).body
+        return body
+
+    def columns() -> bytes:
+        return encode_price_history(dates, prices)
+
+    if models() != columns():
+        raise AssertionError("encodings differ")
+
+    baseline = None
+    for name, encode in [("models", models), ("columns", columns)]:
+        best = min(timeit.repeat(encode, repeat=args.repeat, number=args.number))
+        per_page = best / args.number
+        baseline = baseline or per_page
+        print(
+            f"{name:8} {per_page * 1e6:9.1f} us/page"
+            f" {baseline / per_page:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Benchmarks of the price engine, the portfolio generator, the cursors and
+the HTTP endpoints, compared against a saved baseline.
+
+    poetry run python benchmarks/suite.py --save-baseline
+    poetry run python benchmarks/suite.py --baseline benchmarks/baseline.json
+
+Each benchmark reports the best time per operation over `--repeat` runs.
+The run fails if a benchmark is slower than its baseline by more than
+`--tolerance`. The price engine is configured by the `LITTLEJOHN_*`
+environment variables, as the server is: compare runs with the same ones.
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import itertools
+import json
+import platform
+import sys
+import timeit
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+
+from littlejohn.adapters.portfolio_repository import PortfolioRepositoryGenerator
+from littlejohn.domain.entities import StockPriceHistoryCursor
+from littlejohn.domain.service import StockPriceService
+from littlejohn.entrypoints.asgi import (
+    ALLOWED_STOCK_SYMBOLS,
+    GAIN,
+    ZERO_DATE,
+    create_app,
+    create_stock_price_seeds,
+    create_stock_price_service,
+)
+from littlejohn.entrypoints.asgi.api import decode_cursor, encode_cursor
+from littlejohn.entrypoints.asgi.settings import Settings
+
+Benchmark = Tuple[str, Callable[[], Any]]
+
+DISTANCES = [0, 365, 3650]
+LENGTHS = [1, 90, 1000]
+SYMBOL_COUNTS = [1, 5, 20]
+USERS = [uuid.UUID(int=n, version=4).hex for n in range(1000)]
+
+
+class AsgiClient:
+    """Sends GET requests to an ASGI app in-process, on the running loop."""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+
+    async def get(self, url: str, username: str) -> bytes:
+        path, _, query = url.partition("?")
+        credentials = base64.b64encode(f"{username}:".encode("utf-8"))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("utf-8"),
+            "root_path": "",
+            "query_string": query.encode("utf-8"),
+            "headers": [(b"authorization", b"Basic " + credentials)],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 8080),
+        }
+        status = 0
+        body: List[bytes] = []
+
+        async def receive() -> Dict[str, Any]:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        if status != 200:
+            raise AssertionError(f"GET {url} returned {status}")
+        return b"".join(body)
+
+
+def price_engine_benchmarks(settings: Settings) -> List[Benchmark]:
+    symbols = sorted(ALLOWED_STOCK_SYMBOLS)
+    seeds = create_stock_price_seeds(symbols)
+
+    def create_service() -> StockPriceService:
+        return create_stock_price_service(
+            settings=settings,
+            zero_date=ZERO_DATE,
+            seeds=seeds,
+            gain=GAIN,
+        )
+
+    warm_service = create_service()
+
+    def get_history(
+        cold: bool,
+        distance: int,
+        length: int,
+        symbol_count: int,
+    ) -> Callable[[], Any]:
+        start_from = ZERO_DATE + datetime.timedelta(days=distance)
+        requested = symbols[:symbol_count]
+
+        def run() -> Any:
+            # a new service does not have checkpoints nor caches
+            service = create_service() if cold else warm_service
+            return service.get_history(requested, start_from=start_from, length=length)
+
+        return run
+
+    benchmarks = []
+    for cold in [True, False]:
+        for distance in DISTANCES:
+            for length in LENGTHS:
+                name = (
+                    f"get_history[{'cold' if cold else 'warm'},"
+                    f"distance={distance},length={length},symbols=1]"
+                )
+                benchmarks.append((name, get_history(cold, distance, length, 1)))
+    for symbol_count in SYMBOL_COUNTS[1:]:
+        name = f"get_history[warm,distance=365,length=90,symbols={symbol_count}]"
+        benchmarks.append((name, get_history(False, 365, 90, symbol_count)))
+    return benchmarks
+
+
+def portfolio_benchmarks() -> List[Benchmark]:
+    repository = PortfolioRepositoryGenerator(
+        stocks=ALLOWED_STOCK_SYMBOLS,
+        min_stocks_in_portfolio=1,
+        max_stocks_in_portfolio=10,
+    )
+    users = itertools.cycle(USERS)
+    return [
+        (
+            "get_user_portfolio",
+            lambda: repository.get_user_portfolio(username=next(users)),
+        )
+    ]
+
+
+def cursor_benchmarks() -> List[Benchmark]:
+    cursor = StockPriceHistoryCursor(
+        start_from=ZERO_DATE,
+        length=90,
+        until=ZERO_DATE - datetime.timedelta(days=365),
+    )
+    encoded = encode_cursor(cursor)
+    return [
+        ("encode_cursor", lambda: encode_cursor(cursor)),
+        ("decode_cursor", lambda: decode_cursor(encoded)),
+    ]
+
+
+def http_benchmarks(
+    settings: Settings,
+    loop: asyncio.AbstractEventLoop,
+) -> List[Benchmark]:
+    # the client does not send lifespan events, which start the warmup, and
+    # prefetching would compute pages in the background of the timed calls
+    app = create_app(
+        settings.copy(
+            update={"warmup": "blocking", "history_prefetch_max_concurrency": 0}
+        )
+    )
+    client = AsgiClient(app)
+    users = itertools.cycle(USERS)
+    days = itertools.count()
+    five_symbols = ",".join(sorted(ALLOWED_STOCK_SYMBOLS)[:5])
+
+    def get(url: Callable[[], str]) -> Callable[[], Any]:
+        return lambda: loop.run_until_complete(client.get(url(), next(users)))
+
+    def uncached_page() -> str:
+        # a different page each time, not in the response cache
+        to = ZERO_DATE - datetime.timedelta(days=next(days) % 3650)
+        return f"/tickers/AAPL/history?to={to}"
+
+    return [
+        ("http[/health]", get(lambda: "/health")),
+        ("http[/tickers]", get(lambda: "/tickers")),
+        ("http[/tickers/AAPL/history]", get(lambda: "/tickers/AAPL/history")),
+        ("http[/tickers/AAPL/history?to=...]", get(uncached_page)),
+        (
+            "http[/tickers/history?symbols=5]",
+            get(lambda: f"/tickers/history?symbols={five_symbols}"),
+        ),
+        ("http[/portfolio/history]", get(lambda: "/portfolio/history")),
+    ]
+
+
+def measure(run: Callable[[], Any], repeat: int) -> float:
+    """Best time of `run`, in seconds per call."""
+    run()
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def compare(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    tolerance: float,
+) -> List[str]:
+    """Names of the benchmarks slower than `baseline` beyond `tolerance`."""
+    return [
+        name
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + tolerance)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-k", "--filter", default="", help="run matching names")
+    parser.add_argument("--output", default="benchmarks/results.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const="benchmarks/baseline.json",
+        default=None,
+        help="write the results as the new baseline",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown, as a fraction of the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    settings = Settings()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    benchmarks = [
+        *price_engine_benchmarks(settings),
+        *portfolio_benchmarks(),
+        *cursor_benchmarks(),
+        *http_benchmarks(settings, loop),
+    ]
+
+    baseline: Dict[str, float] = {}
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+
+    results: Dict[str, float] = {}
+    for name, run in benchmarks:
+        if args.filter not in name:
+            continue
+        results[name] = measure(run, repeat=args.repeat)
+        line = f"{name:58} {results[name] * 1e6:12.1f} us"
+        if name in baseline:
+            change = results[name] / baseline[name] - 1
+            line += f" {change:+8.1%}"
+        print(line, flush=True)
+    loop.close()
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": settings.dict(),
+        "results": results,
+    }
+    for path in [args.output, args.save_baseline]:
+        if path is not None:
+            with open(path, "w") as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+                file.write("\n")
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name in regressions:
+        print(f"regression: {name} is {results[name] / baseline[name]:.2f}x slower")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
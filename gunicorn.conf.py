@@ -1,3 +1,4 @@
+import gc
 import os
 
 worker_class = "uvicorn.workers.UvicornWorker"
@@ -5,3 +6,10 @@ workers = 3
 accesslog = "-"
 errorlog = "-"
 bind = f"0.0.0.0:{os.getenv('HTTP_PORT')}"
+
+
+def pre_fork(server, worker):
+    # with --preload, the app and its warmed up caches are created before
+    # forking: frozen objects are never collected by the workers, which
+    # would otherwise write to their pages and copy them
+    gc.freeze()
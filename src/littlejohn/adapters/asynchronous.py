@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import datetime
+import functools
+from concurrent.futures import Executor
+from typing import Deque, List, Optional, Tuple, TypedDict
+
+from littlejohn.domain.entities import HistoricalPrices, StockSymbol
+from littlejohn.domain.service import (
+    AsyncPortfolioRepository,
+    AsyncStockPriceService,
+    PortfolioRepository,
+    StockPriceService,
+)
+from littlejohn.libs.single_flight import SingleFlight, SingleFlightStats
+
+__all__ = [
+    "AsyncPortfolioRepositoryInline",
+    "AsyncStockPriceServiceOffloaded",
+    "OffloadStats",
+    "AsyncStockPriceServiceSingleFlight",
+]
+
+# symbols, start_from, length
+HistoryKey = Tuple[Tuple[StockSymbol, ...], datetime.date, int]
+
+
+class OffloadStats(TypedDict):
+    # calls submitted to the executor and not completed yet
+    pending: int
+    # pending calls waiting for a thread
+    queued: int
+
+
+class AsyncPortfolioRepositoryInline(AsyncPortfolioRepository):
+    """
+    Calls `portfolio_repository` on the event loop: only for repositories
+    that answer from memory without blocking.
+    """
+
+    def __init__(self, portfolio_repository: PortfolioRepository):
+        self.portfolio_repository = portfolio_repository
+
+    async def get_user_portfolio(self, username: str) -> List[StockSymbol]:
+        return self.portfolio_repository.get_user_portfolio(username=username)
+
+
+class AsyncStockPriceServiceOffloaded(AsyncStockPriceService):
+    """
+    Runs `stock_price_service` in `executor`, the default executor of the
+    event loop if not given, so that generating prices does not block the
+    loop.
+    """
+
+    def __init__(
+        self,
+        stock_price_service: StockPriceService,
+        executor: Optional[Executor] = None,
+    ):
+        self.stock_price_service = stock_price_service
+        self.executor = executor
+        self._pending = 0
+        # one item per call running in a thread: appending to and popping
+        # from a deque are atomic, so threads need no lock
+        self._running: Deque[None] = collections.deque()
+
+    def stats(self) -> OffloadStats:
+        running = len(self._running)
+        return {
+            "pending": self._pending,
+            "queued": max(0, self._pending - running),
+        }
+
+    async def get_history(
+        self,
+        symbols: List[StockSymbol],
+        start_from: datetime.date,
+        length: int,
+    ) -> HistoricalPrices:
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(
+                    self._get_history,
+                    symbols=symbols,
+                    start_from=start_from,
+                    length=length,
+                ),
+            )
+        finally:
+            self._pending -= 1
+
+    def _get_history(
+        self,
+        symbols: List[StockSymbol],
+        start_from: datetime.date,
+        length: int,
+    ) -> HistoricalPrices:
+        self._running.append(None)
+        try:
+            return self.stock_price_service.get_history(
+                symbols=symbols,
+                start_from=start_from,
+                length=length,
+            )
+        finally:
+            self._running.pop()
+
+
+class AsyncStockPriceServiceSingleFlight(AsyncStockPriceService):
+    """
+    Coalesces concurrent identical requests to `stock_price_service`: they
+    share the history computed for the first one.
+    """
+
+    def __init__(self, stock_price_service: AsyncStockPriceService):
+        self.stock_price_service = stock_price_service
+        self.flights: SingleFlight[HistoryKey, HistoricalPrices] = SingleFlight()
+
+    def stats(self) -> SingleFlightStats:
+        return self.flights.stats()
+
+    async def get_history(
+        self,
+        symbols: List[StockSymbol],
+        start_from: datetime.date,
+        length: int,
+    ) -> HistoricalPrices:
+        return await self.flights.do(
+            (tuple(symbols), start_from, length),
+            functools.partial(
+                self.stock_price_service.get_history,
+                symbols=symbols,
+                start_from=start_from,
+                length=length,
+            ),
+        )
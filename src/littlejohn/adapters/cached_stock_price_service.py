@@ -0,0 +1,141 @@
+import datetime
+import sys
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+from littlejohn.domain.entities import HistoricalPrices, StockSymbol
+from littlejohn.domain.service import GetTodayUtc, StockPriceService
+
+__all__ = [
+    "CacheStats",
+    "StockPriceServiceCache",
+]
+
+# symbol, start_from, length
+CacheKey = Tuple[StockSymbol, datetime.date, int]
+# prices in descending date order, starting from start_from
+Prices = Tuple[Decimal, ...]
+
+
+class CacheStats(TypedDict):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    bytes: int
+
+
+def estimate_size(prices: Prices) -> int:
+    return sys.getsizeof(prices) + sum(sys.getsizeof(p) for p in prices)
+
+
+class StockPriceServiceCache(StockPriceService):
+    """
+    LRU cache of the price windows returned by `stock_price_service`,
+    one entry per symbol and date range.
+
+    The least recently used entries are evicted when the cache holds more
+    than `max_entries` entries or more than `max_bytes` (estimated) bytes.
+    The cache is emptied whenever `get_today_utc` returns a new day.
+    """
+
+    def __init__(
+        self,
+        stock_price_service: StockPriceService,
+        get_today_utc: GetTodayUtc,
+        max_entries: int,
+        max_bytes: int,
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
+
+        self.stock_price_service = stock_price_service
+        self.get_today_utc = get_today_utc
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, Tuple[Prices, int]]" = OrderedDict()
+        self._bytes = 0
+        self._today: Optional[datetime.date] = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def get_history(
+        self,
+        symbols: List[StockSymbol],
+        start_from: datetime.date,
+        length: int,
+    ) -> HistoricalPrices:
+        today = self.get_today_utc()
+        windows: Dict[StockSymbol, Prices] = {}
+        with self._lock:
+            if today != self._today:
+                self._clear(today)
+            for symbol in symbols:
+                key = (symbol, start_from, length)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    windows[symbol] = entry[0]
+            self._hits += len(windows)
+            self._misses += len(symbols) - len(windows)
+
+        missing_symbols = [symbol for symbol in symbols if symbol not in windows]
+        if missing_symbols:
+            history = self.stock_price_service.get_history(
+                symbols=missing_symbols,
+                start_from=start_from,
+                length=length,
+            )
+            computed = {
+                symbol: tuple(prices) for symbol, prices in history.prices.items()
+            }
+            with self._lock:
+                if today == self._today:
+                    for symbol, prices in computed.items():
+                        self._put((symbol, start_from, length), prices)
+            windows.update(computed)
+
+        return HistoricalPrices(
+            start_from=start_from,
+            length=length,
+            prices={symbol: windows[symbol] for symbol in symbols if symbol in windows},
+        )
+
+    def _put(self, key: CacheKey, prices: Prices) -> None:
+        if key in self._entries:
+            return
+
+        size = estimate_size(prices)
+        self._entries[key] = (prices, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evictions += 1
+
+    def _clear(self, today: datetime.date) -> None:
+        if self._today is not None:
+            self._invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+        self._today = today
@@ -1,11 +1,25 @@
-from typing import List, Set
+from typing import List, Optional, Set, Tuple
 
 from littlejohn.domain.entities import StockSymbol
 from littlejohn.domain.service import PortfolioRepository
 from littlejohn.libs.random import xorshift_32_randint
 
+# seeds of 32 characters hexadecimal usernames, such as UUIDs, are below
+# 32 * ord("f") = 3264
+PORTFOLIO_TABLE_SIZE = 4096
+
+Portfolio = Tuple[StockSymbol, ...]
+
 
 class PortfolioRepositoryGenerator(PortfolioRepository):
+    """
+    Generates a portfolio from the sum of the bytes of the username.
+
+    As usernames share few sums, the portfolio of each sum below
+    `PORTFOLIO_TABLE_SIZE` is generated once and kept in a table indexed
+    by the sum.
+    """
+
     def __init__(
         self,
         stocks: Set[StockSymbol],
@@ -31,9 +45,19 @@ class PortfolioRepositoryGenerator(PortfolioRepository):
         self.stocks = sorted(list(stocks))
         self.min_stocks_in_portfolio = min_stocks_in_portfolio
         self.max_stocks_in_portfolio = max_stocks_in_portfolio
+        self._portfolios: List[Optional[Portfolio]] = [None] * PORTFOLIO_TABLE_SIZE
 
     def get_user_portfolio(self, username: str) -> List[StockSymbol]:
-        seed = sum(list(username.encode("utf-8")))
+        seed = sum(username.encode("utf-8"))
+        if seed >= PORTFOLIO_TABLE_SIZE:
+            return list(self._generate_portfolio(seed))
+
+        portfolio = self._portfolios[seed]
+        if portfolio is None:
+            portfolio = self._portfolios[seed] = self._generate_portfolio(seed)
+        return list(portfolio)
+
+    def _generate_portfolio(self, seed: int) -> Portfolio:
         randint = xorshift_32_randint(seed)
         available_stocks = self.stocks.copy()
         number_of_optional_stocks = (
@@ -46,10 +70,6 @@ class PortfolioRepositoryGenerator(PortfolioRepository):
         portfolio: List[StockSymbol] = []
         for _ in range(number_of_stocks_to_choose):
             chosen_stock_index = next(randint) % len(available_stocks)
-            portfolio = [*portfolio, available_stocks[chosen_stock_index]]
-            available_stocks = [
-                *available_stocks[:chosen_stock_index],
-                *available_stocks[chosen_stock_index + 1 :],
-            ]
+            portfolio.append(available_stocks.pop(chosen_stock_index))
 
-        return sorted(portfolio)
+        return tuple(sorted(portfolio))
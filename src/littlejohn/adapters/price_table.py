@@ -0,0 +1,173 @@
+import datetime
+import mmap
+import struct
+import sys
+from array import array
+from decimal import Decimal
+from typing import BinaryIO, Dict, List, Sequence
+
+from littlejohn.domain.entities import HistoricalPrices, StockSymbol, to_cents
+from littlejohn.domain.service import StockPriceService
+
+__all__ = [
+    "StockPriceServicePriceTable",
+    "write_price_table",
+]
+
+# Layout of a price table, all integers are little-endian:
+#
+#   header       magic, version, number of symbols, ordinal of the first
+#                date, number of days, offset of the prices
+#   symbols      utf-8, separated by newlines
+#   padding      up to a multiple of 8 bytes
+#   prices       int32 cents, one row of `days` prices for each symbol,
+#                in ascending date order
+HEADER = struct.Struct("<4sHHIII")
+MAGIC = b"LJPT"
+VERSION = 1
+PRICE_SIZE = 4
+
+
+def write_price_table(
+    file: BinaryIO,
+    stock_price_service: StockPriceService,
+    symbols: Sequence[StockSymbol],
+    first_date: datetime.date,
+    days: int,
+) -> None:
+    """Writes the prices of `symbols` from `first_date` for `days` days."""
+    if days < 1:
+        raise ValueError("days must be positive")
+
+    encoded_symbols = "\n".join(symbols).encode("utf-8")
+    data_offset = HEADER.size + len(encoded_symbols)
+    data_offset += -data_offset % 8
+    file.write(
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            len(symbols),
+            first_date.toordinal(),
+            days,
+            data_offset,
+        )
+    )
+    file.write(encoded_symbols.ljust(data_offset - HEADER.size, b"\0"))
+
+    last_date = first_date + datetime.timedelta(days=days - 1)
+    for symbol in symbols:
+        history = stock_price_service.get_history(
+            symbols=[symbol],
+            start_from=last_date,
+            length=days,
+        )
+        row = array("i")
+        # the history is in descending date order
+        for price in reversed(history.prices[symbol]):
+            cents = to_cents(price)
+            if not -(2 ** 31) <= cents < 2 ** 31:
+                raise ValueError(f"Price of {symbol} does not fit in 32 bits")
+            row.append(cents)
+        if sys.byteorder != "little":
+            row.byteswap()
+        file.write(row.tobytes())
+
+
+class StockPriceServicePriceTable(StockPriceService):
+    """
+    Serves prices from a table written by `write_price_table`.
+
+    The file is memory-mapped read-only, so processes serving the same
+    table share a single copy in the page cache. Requests for dates or
+    symbols outside the table are forwarded to `fallback`, which must
+    generate the same prices as the service the table was built from:
+    this is verified when the table is opened.
+    """
+
+    def __init__(self, path: str, fallback: StockPriceService):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = HEADER.unpack_from(self._mmap)
+        magic, version, symbol_count, first_day, days, data_offset = header
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a price table")
+
+        symbols = (
+            self._mmap[HEADER.size : data_offset].rstrip(b"\0").decode("utf-8")
+        ).split("\n")[:symbol_count]
+        self.fallback = fallback
+        self.first_date = datetime.date.fromordinal(first_day)
+        self.days = days
+        self.rows: Dict[StockSymbol, int] = {
+            symbol: row for row, symbol in enumerate(symbols)
+        }
+        prices = memoryview(self._mmap)[
+            data_offset : data_offset + symbol_count * days * PRICE_SIZE
+        ]
+        self.prices: Sequence[int] = (
+            prices.cast("i") if sys.byteorder == "little" else _byteswapped(prices)
+        )
+        self._check_fallback()
+
+    @property
+    def last_date(self) -> datetime.date:
+        return self.first_date + datetime.timedelta(days=self.days - 1)
+
+    def get_history(
+        self,
+        symbols: List[StockSymbol],
+        start_from: datetime.date,
+        length: int,
+    ) -> HistoricalPrices:
+        oldest = start_from - datetime.timedelta(days=length - 1)
+        if length < 1 or oldest < self.first_date or start_from > self.last_date:
+            return self.fallback.get_history(
+                symbols=symbols,
+                start_from=start_from,
+                length=length,
+            )
+
+        other_symbols = [symbol for symbol in symbols if symbol not in self.rows]
+        other_prices = (
+            self.fallback.get_history(
+                symbols=other_symbols,
+                start_from=start_from,
+                length=length,
+            ).prices
+            if other_symbols
+            else {}
+        )
+
+        first_column = (oldest - self.first_date).days
+        prices: Dict[StockSymbol, Sequence[Decimal]] = {}
+        for symbol in symbols:
+            if symbol in self.rows:
+                start = self.rows[symbol] * self.days + first_column
+                # rows are in ascending date order
+                prices[symbol] = [
+                    Decimal(cents).scaleb(-2)
+                    for cents in reversed(self.prices[start : start + length])
+                ]
+            elif symbol in other_prices:
+                prices[symbol] = other_prices[symbol]
+
+        return HistoricalPrices(start_from=start_from, length=length, prices=prices)
+
+    def _check_fallback(self) -> None:
+        symbols = list(self.rows)
+        for date in {self.first_date, self.last_date}:
+            expected = self.fallback.get_history(symbols, start_from=date, length=1)
+            for symbol, row in self.rows.items():
+                price = self.prices[row * self.days + (date - self.first_date).days]
+                expected_prices = expected.prices.get(symbol)
+                if not expected_prices or to_cents(expected_prices[0]) != price:
+                    raise ValueError(
+                        "Price table does not match the prices of the fallback"
+                    )
+
+
+def _byteswapped(prices: memoryview) -> Sequence[int]:
+    swapped = array("i", prices.tobytes())
+    swapped.byteswap()
+    return swapped
@@ -1,10 +1,12 @@
 import datetime
+import threading
 from decimal import Decimal
-from typing import Generator, List, TypedDict
+from typing import Dict, List, Protocol, Tuple, TypedDict
 
 from littlejohn.domain.entities import HistoricalPrices, StockSymbol
 from littlejohn.domain.service import StockPriceService
-from littlejohn.libs.random import xorshift_32_rand
+from littlejohn.libs.bitmap import RankBitmap
+from littlejohn.libs.random import xorshift_32_randint
 
 __all__ = [
     "StockPriceServiceRandomWalker",
@@ -12,36 +14,163 @@ __all__ = [
 ]
 
 
-class Iterations(TypedDict):
-    forward: int
-    backward: int
+class Walk(Protocol):
+    def get_steps(self, first: int, last: int) -> List[Decimal]:
+        ...
 
 
-def determine_iterations(
-    zero_date: datetime.date,
-    start_date: datetime.date,
-    length: int,
-) -> Iterations:
-    end_date = start_date - datetime.timedelta(days=length)
-    return {
-        "forward": (start_date - zero_date).days if start_date > zero_date else 0,
-        "backward": (zero_date - end_date).days if end_date < zero_date else 0,
-    }
+class CheckpointedWalk(Walk):
+    """
+    Random walk that remembers the price every `interval` steps, so that
+    any window can be replayed from the closest checkpoint instead of from
+    the first step. The state of the generator at a checkpoint is recovered
+    by jumping ahead from the seed.
 
+    Once there are more than `max_checkpoints` checkpoints, every other one
+    is dropped and the interval doubles, so that memory stays bounded however
+    far the walk goes.
 
-def random_walk(
-    rand: Generator[float, None, None],
-    initial_value: Decimal,
-    gain: Decimal,
-    iterations: int,
-) -> List[Decimal]:
-    walk: List[Decimal] = []
-    current_value = initial_value
-    for _ in range(iterations):
-        sign = Decimal("-1") if next(rand) < 0.5 else Decimal("1")
-        current_value = current_value + sign * gain * current_value
-        walk = [*walk, current_value]
-    return walk
+    Steps are 1-based: step `n` is the price after `n` moves.
+    """
+
+    def __init__(
+        self,
+        rand_seed: int,
+        initial_value: Decimal,
+        gain: Decimal,
+        interval: int,
+        max_checkpoints: int,
+    ):
+        self.rand_seed = rand_seed
+        self.interval = interval
+        self.max_checkpoints = max_checkpoints
+        self.checkpoints = [initial_value]
+        self.up = Decimal("1") * gain
+        self.down = Decimal("-1") * gain
+        self._lock = threading.Lock()
+
+    def get_steps(self, first: int, last: int) -> List[Decimal]:
+        if first < 1 or last < first:
+            return []
+
+        with self._lock:
+            interval, checkpoints = self.interval, self.checkpoints
+        closest = min((first - 1) // interval, len(checkpoints) - 1)
+        step = closest * interval
+        current_value = checkpoints[closest]
+        randint = xorshift_32_randint(self.rand_seed, skip=step)
+        half = 2 ** 31
+
+        walk: List[Decimal] = []
+        while step < last:
+            move = self.down if next(randint) < half else self.up
+            current_value = current_value + move * current_value
+            step += 1
+            if step % interval == 0:
+                interval = self._save(interval, step, current_value)
+            if step >= first:
+                walk.append(current_value)
+        return walk
+
+    def _save(self, interval: int, step: int, price: Decimal) -> int:
+        """Saves `price` if `step` is the next checkpoint, returns the interval."""
+        with self._lock:
+            if interval != self.interval or len(self.checkpoints) * interval != step:
+                return self.interval
+
+            self.checkpoints.append(price)
+            if len(self.checkpoints) > self.max_checkpoints:
+                # checkpoint `i` moves to step `i * 2 * interval`
+                self.checkpoints = self.checkpoints[::2]
+                self.interval *= 2
+            return self.interval
+
+
+class GainPowers:
+    """Powers of `1 + gain` and `1 - gain`, shared by all the walks."""
+
+    def __init__(self, gain: Decimal):
+        self.up_factor = 1 + gain
+        self.down_factor = 1 - gain
+        self.up = [Decimal("1")]
+        self.down = [Decimal("1")]
+        self._lock = threading.Lock()
+
+    def get(self, ups: int, downs: int) -> Tuple[Decimal, Decimal]:
+        if ups >= len(self.up) or downs >= len(self.down):
+            with self._lock:
+                while len(self.up) <= ups:
+                    self.up.append(self.up[-1] * self.up_factor)
+                while len(self.down) <= downs:
+                    self.down.append(self.down[-1] * self.down_factor)
+        return self.up[ups], self.down[downs]
+
+
+class MoveBitmapWalk(Walk):
+    """
+    Random walk storing only the direction of each move, one bit per step,
+    for the first `horizon` steps. Steps beyond the horizon are delegated
+    to `fallback`.
+
+    The price after `n` steps with `u` up moves is
+    `initial_value * (1 + gain) ** u * (1 - gain) ** (n - u)`: it is found
+    with a rank query on the bitmap and two cached powers. Being computed
+    in a different order, it may differ from the step by step walk in the
+    last digits, but not at cent precision.
+    """
+
+    def __init__(
+        self,
+        rand_seed: int,
+        initial_value: Decimal,
+        powers: GainPowers,
+        horizon: int,
+        fallback: Walk,
+    ):
+        self.rand_seed = rand_seed
+        self.initial_value = initial_value
+        self.powers = powers
+        self.horizon = horizon
+        self.fallback = fallback
+        # bit `i` is set when the price moves up at step `i + 1`
+        self.moves = RankBitmap()
+        self._lock = threading.Lock()
+
+    def get_steps(self, first: int, last: int) -> List[Decimal]:
+        if first < 1 or last < first:
+            return []
+
+        walk: List[Decimal] = []
+        last_in_bitmap = min(last, self.horizon)
+        if first <= last_in_bitmap:
+            self._extend(last_in_bitmap)
+            ups = self.moves.rank(first - 1)
+            for step in range(first, last_in_bitmap + 1):
+                ups += self.moves[step - 1]
+                walk.append(self._get_price(step, ups))
+
+        return [
+            *walk,
+            *self.fallback.get_steps(max(first, self.horizon + 1), last),
+        ]
+
+    def _get_price(self, step: int, ups: int) -> Decimal:
+        up, down = self.powers.get(ups, step - ups)
+        return self.initial_value * up * down
+
+    def _extend(self, steps: int) -> None:
+        if steps <= len(self.moves):
+            return
+
+        with self._lock:
+            randint = xorshift_32_randint(self.rand_seed, skip=len(self.moves))
+            half = 2 ** 31
+            while len(self.moves) < steps:
+                word = 0
+                for bit in range(64):
+                    if next(randint) >= half:
+                        word |= 1 << bit
+                self.moves.append_word(word)
 
 
 class StockPriceGeneratorSeeds(TypedDict):
@@ -52,15 +181,73 @@ class StockPriceGeneratorSeeds(TypedDict):
 
 
 class StockPriceServiceRandomWalker(StockPriceService):
+    """
+    Generates prices with a random walk starting from `zero_date`,
+    moving forward and backward in time with two independent generators.
+
+    Walks are checkpointed every `checkpoint_interval` days, so the cost of
+    a request depends on its length and not on its distance from `zero_date`.
+    Each checkpoint is a single Decimal (~110 bytes): a symbol queried over
+    a span of `d` days keeps about `2 * d / checkpoint_interval` of them,
+    and at most `2 * max_checkpoints`. Past that, the interval of the walk
+    doubles. Raise the interval to trade replay time for memory.
+
+    With a positive `move_bitmap_horizon`, the first `move_bitmap_horizon`
+    days on both sides of `zero_date` are served by move bitmaps instead:
+    1 bit per day and symbol, and constant time lookups.
+    """
+
     def __init__(
         self,
         zero_date: datetime.date,
         seeds: List[StockPriceGeneratorSeeds],
         gain: Decimal,
+        checkpoint_interval: int = 64,
+        max_checkpoints: int = 1024,
+        move_bitmap_horizon: int = 0,
     ):
+        if checkpoint_interval < 1:
+            raise ValueError("checkpoint_interval must be positive")
+
+        if max_checkpoints < 1:
+            raise ValueError("max_checkpoints must be positive")
+
+        if move_bitmap_horizon < 0:
+            raise ValueError("move_bitmap_horizon can't be negative")
+
         self.zero_date = zero_date
         self.seeds = seeds
         self.gain = gain
+        self.checkpoint_interval = checkpoint_interval
+        self.max_checkpoints = max_checkpoints
+        self.move_bitmap_horizon = move_bitmap_horizon
+        self.powers = GainPowers(gain)
+        self.walks: Dict[StockSymbol, Tuple[Walk, Walk]] = {
+            s["symbol"]: (
+                self._create_walk(s["forward_rand_seed"], s["price"]),
+                self._create_walk(s["backward_rand_seed"], s["price"]),
+            )
+            for s in seeds
+        }
+
+    def _create_walk(self, rand_seed: int, initial_value: Decimal) -> Walk:
+        walk = CheckpointedWalk(
+            rand_seed=rand_seed,
+            initial_value=initial_value,
+            gain=self.gain,
+            interval=self.checkpoint_interval,
+            max_checkpoints=self.max_checkpoints,
+        )
+        if self.move_bitmap_horizon == 0:
+            return walk
+
+        return MoveBitmapWalk(
+            rand_seed=rand_seed,
+            initial_value=initial_value,
+            powers=self.powers,
+            horizon=self.move_bitmap_horizon,
+            fallback=walk,
+        )
 
     def get_history(
         self,
@@ -69,52 +256,22 @@ class StockPriceServiceRandomWalker(StockPriceService):
         length: int,
     ) -> HistoricalPrices:
         required_seeds = [seed for seed in self.seeds if seed["symbol"] in symbols]
-        iterations = determine_iterations(
-            zero_date=self.zero_date,
-            start_date=start_from,
-            length=length,
-        )
-        forward_walks = {
-            s["symbol"]: random_walk(
-                rand=xorshift_32_rand(s["forward_rand_seed"]),
-                initial_value=s["price"],
-                gain=self.gain,
-                iterations=iterations["forward"],
-            )
-            for s in required_seeds
-        }
-        historical_prices_after_zero_date = {
-            (self.zero_date + datetime.timedelta(days=i + 1)): {
-                symbol: walk[i] for symbol, walk in forward_walks.items()
-            }
-            for i in range(iterations["forward"])
-        }
 
-        backward_walks = {
-            s["symbol"]: random_walk(
-                rand=xorshift_32_rand(s["backward_rand_seed"]),
-                initial_value=s["price"],
-                gain=self.gain,
-                iterations=iterations["backward"],
-            )
-            for s in required_seeds
-        }
-        historical_prices_before_zero_date = {
-            (self.zero_date - datetime.timedelta(days=i + 1)): {
-                symbol: walk[i] for symbol, walk in backward_walks.items()
-            }
-            for i in range(iterations["backward"])
-        }
+        # offsets from zero_date of the first and the last required dates
+        newest = (start_from - self.zero_date).days
+        oldest = newest - length + 1
 
-        generated_historical_prices = {
-            **historical_prices_after_zero_date,
-            self.zero_date: {s["symbol"]: s["price"] for s in required_seeds},
-            **historical_prices_before_zero_date,
-        }
-
-        # this must include the start_from
-        required_dates = [
-            start_from - datetime.timedelta(days=i) for i in range(length)
-        ]
+        walks: Dict[StockSymbol, List[Decimal]] = {}
+        for seed in required_seeds:
+            forward, backward = self.walks[seed["symbol"]]
+            before_zero_date = backward.get_steps(max(1, -newest), -oldest)
+            after_zero_date = forward.get_steps(max(1, oldest), newest)
+            at_zero_date = [seed["price"]] if oldest <= 0 <= newest else []
+            # descending by date, as the required dates
+            walks[seed["symbol"]] = [
+                *reversed(after_zero_date),
+                *at_zero_date,
+                *before_zero_date,
+            ]
 
-        return {date: generated_historical_prices[date] for date in required_dates}
+        return HistoricalPrices(start_from=start_from, length=length, prices=walks)
@@ -0,0 +1,177 @@
+import datetime
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from littlejohn.adapters.stock_price_service import (
+    StockPriceGeneratorSeeds,
+    StockPriceServiceRandomWalker,
+)
+from littlejohn.domain.entities import HistoricalPrices, StockSymbol, to_cents
+from littlejohn.domain.service import StockPriceService
+from littlejohn.libs.random import xorshift_32_matrix
+
+__all__ = [
+    "StockPriceServiceVectorized",
+]
+
+
+LANE_LENGTH = 64
+
+
+def generate_moves(rand_seeds: List[int], steps: int) -> np.ndarray:
+    """
+    Returns a boolean matrix with a row for each seed, where column `n`
+    tells whether the walk moves up at step `n + 1`.
+
+    Each stream is split in lanes of `LANE_LENGTH` steps. The initial states
+    of all the lanes are found at once by multiplying the seeds with the
+    jump-ahead matrices, then all the lanes of all the seeds are advanced
+    together.
+    """
+    lanes = max(1, -(-steps // LANE_LENGTH))
+    jumps = np.array(
+        [xorshift_32_matrix(lane * LANE_LENGTH) for lane in range(lanes)],
+        dtype=np.uint64,
+    )
+    seeds = np.array(rand_seeds, dtype=np.uint64)
+    seed_bits = (seeds[:, np.newaxis] >> np.arange(32, dtype=np.uint64)) & 1
+    states = np.bitwise_xor.reduce(
+        jumps[np.newaxis, :, :] * seed_bits[:, np.newaxis, :],
+        axis=2,
+    ).ravel()
+
+    moves = np.empty((len(states), LANE_LENGTH), dtype=bool)
+    # the reference generator shifts left before truncating to 32 bits:
+    # 64 bits leave enough room for the intermediate values
+    for step in range(LANE_LENGTH):
+        states ^= states << np.uint64(13)
+        states ^= states >> np.uint64(17)
+        states ^= states << np.uint64(5)
+        states &= np.uint64(0xFFFFFFFF)
+        moves[:, step] = states.astype(np.uint32) >= np.uint32(2 ** 31)
+    return moves.reshape(len(rand_seeds), lanes * LANE_LENGTH)[:, :steps]
+
+
+class StockPriceServiceVectorized(StockPriceService):
+    """
+    Same prices as `StockPriceServiceRandomWalker`, computed with NumPy for
+    all the requested symbols at once.
+
+    The price after `n` steps with `u` up moves is
+    `price * (1 + gain) ** u * (1 - gain) ** (n - u)`: it is evaluated in
+    floating point and rounded to cents. The few prices too close to half a
+    cent to be rounded safely are computed exactly with the reference walker,
+    so the result is identical to the reference at cent precision.
+    """
+
+    def __init__(
+        self,
+        zero_date: datetime.date,
+        seeds: List[StockPriceGeneratorSeeds],
+        gain: Decimal,
+    ):
+        for seed in seeds:
+            if not 0 <= seed["forward_rand_seed"] < 2 ** 32:
+                raise ValueError("forward_rand_seed must be a 32 bits integer")
+            if not 0 <= seed["backward_rand_seed"] < 2 ** 32:
+                raise ValueError("backward_rand_seed must be a 32 bits integer")
+
+        self.zero_date = zero_date
+        self.seeds = seeds
+        self.gain = gain
+        self.up_factor = float(1 + gain)
+        self.down_factor = float(1 - gain)
+        self.reference = StockPriceServiceRandomWalker(
+            zero_date=zero_date,
+            seeds=seeds,
+            gain=gain,
+        )
+
+    def get_history(
+        self,
+        symbols: List[StockSymbol],
+        start_from: datetime.date,
+        length: int,
+    ) -> HistoricalPrices:
+        required_seeds = [seed for seed in self.seeds if seed["symbol"] in symbols]
+
+        # offsets from zero_date of the first and the last required dates
+        newest = (start_from - self.zero_date).days
+        oldest = newest - length + 1
+
+        cents: Dict[Tuple[StockSymbol, int], int] = {}
+        if oldest <= 0 <= newest:
+            for seed in required_seeds:
+                cents[seed["symbol"], 0] = to_cents(seed["price"])
+
+        forward_seeds = [seed["forward_rand_seed"] for seed in required_seeds]
+        backward_seeds = [seed["backward_rand_seed"] for seed in required_seeds]
+        for direction, rand_seeds, first, last in [
+            (1, forward_seeds, max(1, oldest), newest),
+            (-1, backward_seeds, max(1, -newest), -oldest),
+        ]:
+            if first > last or not required_seeds:
+                continue
+            window = self._get_cents(
+                rand_seeds=rand_seeds,
+                initial_prices=[seed["price"] for seed in required_seeds],
+                first=first,
+                last=last,
+            )
+            for row, seed in enumerate(required_seeds):
+                for column, step in enumerate(range(first, last + 1)):
+                    offset = direction * step
+                    value = int(window[row, column])
+                    if value < 0:
+                        value = self._get_exact_cents(seed["symbol"], offset)
+                    cents[seed["symbol"], offset] = value
+
+        return HistoricalPrices(
+            start_from=start_from,
+            length=length,
+            prices={
+                seed["symbol"]: [
+                    Decimal(cents[seed["symbol"], newest - i]).scaleb(-2)
+                    for i in range(length)
+                ]
+                for seed in required_seeds
+            },
+        )
+
+    def _get_cents(
+        self,
+        rand_seeds: List[int],
+        initial_prices: List[Decimal],
+        first: int,
+        last: int,
+    ) -> np.ndarray:
+        """
+        Prices in cents of steps `first..last`, one row per seed.
+        Prices that can't be rounded safely are set to -1.
+        """
+        moves = generate_moves(rand_seeds, steps=last)
+        ups = np.cumsum(moves, axis=1, dtype=np.int64)[:, first - 1 :]
+        downs = np.arange(first, last + 1, dtype=np.int64) - ups
+        prices = (
+            np.array([float(p) for p in initial_prices])[:, np.newaxis]
+            * np.power(self.up_factor, ups)
+            * np.power(self.down_factor, downs)
+        )
+        cents = prices * 100
+        # relative error of the float computation, with a generous margin
+        tolerance = cents * (last + 16) * 2.0 ** -48
+        ambiguous = np.abs(cents - np.floor(cents) - 0.5) <= tolerance
+        rounded: np.ndarray = np.floor(cents + 0.5).astype(np.int64)
+        rounded[ambiguous] = -1
+        return rounded
+
+    def _get_exact_cents(self, symbol: StockSymbol, offset: int) -> int:
+        date = self.zero_date + datetime.timedelta(days=offset)
+        history = self.reference.get_history(
+            symbols=[symbol],
+            start_from=date,
+            length=1,
+        )
+        return to_cents(history.prices[symbol][0])
@@ -1,23 +1,37 @@
 import datetime
 from decimal import Decimal
-from typing import List, Mapping, Optional
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
 
 __all__ = [
+    "DEFAULT_HISTORY_LENGTH",
     "HistoricalPrices",
+    "MAX_HISTORY_LENGTH",
+    "MultipleStockPriceHistory",
+    "PortfolioPriceHistory",
     "PriceAtDate",
     "StockSymbol",
     "StockPrice",
+    "StockPriceHistoryColumns",
+    "SymbolPriceHistory",
 ]
 
 StockSymbol = str
 
+# days in a page of history
+DEFAULT_HISTORY_LENGTH = 90
+MAX_HISTORY_LENGTH = 1000
+
 
 def encode_price(price: Decimal) -> str:
     return str(price.quantize(Decimal(".01")))
 
 
+def to_cents(price: Decimal) -> int:
+    return int(price.quantize(Decimal(".01")).scaleb(2))
+
+
 class SymbolNotFound(BaseModel):
     symbol: StockSymbol
 
@@ -38,13 +52,97 @@ class PriceAtDate(BaseModel):
         json_encoders = {Decimal: encode_price}
 
 
-HistoricalPrices = Mapping[datetime.date, Mapping[StockSymbol, Decimal]]
+class HistoricalPrices(NamedTuple):
+    """
+    Prices of consecutive dates in columns: `prices[symbol][i]` is the
+    price of `symbol` at `start_from` minus `i` days, for `i` in
+    `0..length - 1`. Unknown symbols are left out of `prices`.
+    """
+
+    start_from: datetime.date
+    length: int
+    prices: Mapping[StockSymbol, Sequence[Decimal]]
+
+    def dates(self) -> List[datetime.date]:
+        """The dates of the columns, in descending order."""
+        return [
+            self.start_from - datetime.timedelta(days=i) for i in range(self.length)
+        ]
 
 
 class StockPriceHistoryCursor(BaseModel):
+    """
+    A page of `length` days from `start_from` backwards. When `until` is
+    set, pages stop at `until`, included.
+    """
+
     start_from: datetime.date
+    length: int = Field(DEFAULT_HISTORY_LENGTH, ge=1, le=MAX_HISTORY_LENGTH)
+    until: Optional[datetime.date] = None
+
+    @validator("until")
+    def until_is_not_after_start_from(
+        cls,
+        until: Optional[datetime.date],
+        values: Dict[str, Any],
+    ) -> Optional[datetime.date]:
+        start_from = values.get("start_from")
+        if until is not None and start_from is not None and until > start_from:
+            raise ValueError("until can't be after start_from")
+        return until
+
+    def page_length(self) -> int:
+        """`length`, or less for the last page of a range or of the calendar."""
+        return min(self.length, (self.start_from - self.oldest()).days + 1)
+
+    def next_page(self) -> Optional["StockPriceHistoryCursor"]:
+        """The cursor of the following page, None after the last one."""
+        page_length = self.page_length()
+        if (self.start_from - self.oldest()).days < page_length:
+            return None
+
+        start_from = self.start_from - datetime.timedelta(days=page_length)
+        return self.copy(update={"start_from": start_from})
+
+    def oldest(self) -> datetime.date:
+        """The oldest date pages can reach: `until`, or `date.min`."""
+        return self.until if self.until is not None else datetime.date.min
 
 
 class StockPriceHistory(BaseModel):
     data: List[PriceAtDate]
     next: Optional[StockPriceHistoryCursor]
+
+
+class StockPriceHistoryColumns(NamedTuple):
+    """`StockPriceHistory` as plain lists, in descending date order."""
+
+    dates: List[datetime.date]
+    prices: Sequence[Decimal]
+    next: Optional[StockPriceHistoryCursor]
+
+
+class SymbolPriceHistory(BaseModel):
+    symbol: StockSymbol
+    data: List[PriceAtDate]
+
+    class Config:
+        json_encoders = {Decimal: encode_price}
+
+
+class MultipleStockPriceHistory(BaseModel):
+    data: List[Union[SymbolPriceHistory, SymbolNotFound]]
+    next: Optional[StockPriceHistoryCursor]
+
+    class Config:
+        json_encoders = {Decimal: encode_price}
+
+
+class PortfolioPriceHistory(BaseModel):
+    holdings: List[SymbolPriceHistory]
+    # sum of the prices of the holdings at each date
+    total: List[PriceAtDate]
+    next: Optional[StockPriceHistoryCursor]
+
+    class Config:
+        json_encoders = {Decimal: encode_price}
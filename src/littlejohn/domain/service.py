@@ -1,15 +1,37 @@
+import contextlib
 import datetime
+import functools
 import logging
-from typing import Callable, List, Optional, Protocol, Set, Union
+import time
+from decimal import Decimal
+from typing import (
+    AsyncIterator,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    Union,
+)
+
+from littlejohn.libs.prefetch import Prefetcher
+from littlejohn.libs.single_flight import SingleFlight
 
 from .entities import (
     HistoricalPrices,
+    MultipleStockPriceHistory,
+    PortfolioPriceHistory,
     PriceAtDate,
     StockPrice,
     StockPriceHistory,
+    StockPriceHistoryColumns,
     StockPriceHistoryCursor,
     StockSymbol,
     SymbolNotFound,
+    SymbolPriceHistory,
+    to_cents,
 )
 
 logger = logging.getLogger(__name__)
@@ -31,67 +53,367 @@ class StockPriceService(Protocol):
 
 
 GetTodayUtc = Callable[[], datetime.date]
+# name of a stage of a request, e.g. "prices", and its duration in seconds
+StageObserver = Callable[[str, float], None]
+
+
+def ignore_stage(stage: str, seconds: float) -> None:
+    pass
+
+
+def observe_stages(*observers: StageObserver) -> StageObserver:
+    """Reports each stage to all the `observers`."""
+
+    def observe_stage(stage: str, seconds: float) -> None:
+        for observer in observers:
+            observer(stage, seconds)
+
+    return observe_stage
+
 
+def get_page(
+    cursor: Optional[StockPriceHistoryCursor],
+    get_today_utc: GetTodayUtc,
+) -> StockPriceHistoryCursor:
+    """The page of `cursor`, the first page of the default length without one."""
+    return (
+        cursor
+        if cursor is not None
+        else StockPriceHistoryCursor(start_from=get_today_utc())
+    )
+
+
+def build_portfolio_price_history(
+    portfolio: List[StockSymbol],
+    price_history: HistoricalPrices,
+    next_cursor: Optional[StockPriceHistoryCursor],
+) -> PortfolioPriceHistory:
+    """
+    Totals are the sums of the prices rounded to cents, as returned for
+    each holding, computed in a single pass over the price columns.
+    """
+    dates = price_history.dates()
+    columns = [price_history.prices[symbol] for symbol in portfolio]
+    totals = (
+        [sum(map(to_cents, prices)) for prices in zip(*columns)]
+        if columns
+        else [0] * len(dates)
+    )
+
+    return PortfolioPriceHistory(
+        holdings=[
+            SymbolPriceHistory(
+                symbol=symbol,
+                data=[
+                    PriceAtDate(price=price, date=date)
+                    for date, price in zip(dates, column)
+                ],
+            )
+            for symbol, column in zip(portfolio, columns)
+        ],
+        total=[
+            PriceAtDate(price=Decimal(total).scaleb(-2), date=date)
+            for date, total in zip(dates, totals)
+        ],
+        next=next_cursor,
+    )
+
+
+class AsyncPortfolioRepository(Protocol):
+    async def get_user_portfolio(self, username: str) -> List[StockSymbol]:
+        ...
+
+
+class AsyncStockPriceService(Protocol):
+    async def get_history(
+        self,
+        symbols: List[StockSymbol],
+        start_from: datetime.date,
+        length: int,
+    ) -> HistoricalPrices:
+        ...
+
+
+# symbol, start_from, length, until
+HistoryPageKey = Tuple[StockSymbol, datetime.date, int, Optional[datetime.date]]
+
+
+def get_history_page_key(
+    symbol: StockSymbol,
+    page: StockPriceHistoryCursor,
+) -> HistoryPageKey:
+    return symbol, page.start_from, page.length, page.until
+
+
+class AsyncStockService:
+    """
+    Repositories and price services are awaited, so they must not block the
+    loop and have to offload CPU-heavy work themselves (see
+    `littlejohn.adapters.asynchronous`).
+
+    Concurrent requests for the same page of history are coalesced, see
+    `history_flights` for the number of coalesced requests. With a
+    `history_prefetcher`, the page following each page of history is
+    computed in the background, as clients usually follow the next link
+    right away.
+
+    Exports request their prices from `export_price_service`, by default
+    `stock_price_service`: a long export would otherwise fill the caches
+    of the price service with chunks no other request asks for.
+
+    The duration of each stage of a request is reported to `observe_stage`:
+    "portfolio" for the portfolio repository, "prices" for the price
+    service and "models" for building the returned models. Prefetched
+    pages are reported as "prefetch", as no request waits for them.
+    """
 
-class StockService:
     def __init__(
         self,
-        portfolio_repository: PortfolioRepository,
-        stock_price_service: StockPriceService,
+        portfolio_repository: AsyncPortfolioRepository,
+        stock_price_service: AsyncStockPriceService,
         get_today_utc: GetTodayUtc,
         allowed_stock_symbols: Set[StockSymbol],
+        history_prefetcher: Optional[
+            Prefetcher[HistoryPageKey, StockPriceHistoryColumns]
+        ] = None,
+        observe_stage: StageObserver = ignore_stage,
+        export_price_service: Optional[AsyncStockPriceService] = None,
     ) -> None:
         self.portfolio_repository = portfolio_repository
         self.get_today_utc = get_today_utc
         self.stock_price_service = stock_price_service
+        self.export_price_service = (
+            export_price_service
+            if export_price_service is not None
+            else stock_price_service
+        )
         self.allowed_stock_symbols = allowed_stock_symbols
+        self.history_flights: SingleFlight[
+            HistoryPageKey, StockPriceHistoryColumns
+        ] = SingleFlight()
+        self.history_prefetcher = history_prefetcher
+        self.observe_stage = observe_stage
 
-    def get_portfolio_current_prices(self, username: str) -> List[StockPrice]:
+    @contextlib.contextmanager
+    def _stage(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    async def get_portfolio_current_prices(self, username: str) -> List[StockPrice]:
         today = self.get_today_utc()
         logger.info(f"Returning portfolio of user {username}")
-        portfolio = self.portfolio_repository.get_user_portfolio(username=username)
+        with self._stage("portfolio"):
+            portfolio = await self.portfolio_repository.get_user_portfolio(
+                username=username
+            )
 
         logger.info(f"Retrieving stock prices of {today}")
-        price_history = self.stock_price_service.get_history(
-            symbols=portfolio,
-            start_from=today,
-            length=1,
-        )
-        current_prices = price_history[today]
+        with self._stage("prices"):
+            price_history = await self.stock_price_service.get_history(
+                symbols=portfolio,
+                start_from=today,
+                length=1,
+            )
+        current_prices = price_history.prices
 
-        return [
-            StockPrice(symbol=symbol, price=current_prices[symbol])
-            for symbol in portfolio
-        ]
+        with self._stage("models"):
+            return [
+                StockPrice(symbol=symbol, price=current_prices[symbol][0])
+                for symbol in portfolio
+            ]
 
-    def get_historical_prices(
+    async def get_historical_prices(
         self,
         symbol: StockSymbol,
         cursor: Optional[StockPriceHistoryCursor] = None,
     ) -> Union[StockPriceHistory, SymbolNotFound]:
+        columns = await self.get_historical_price_columns(symbol, cursor)
+        if isinstance(columns, SymbolNotFound):
+            return columns
+
+        with self._stage("models"):
+            data = [
+                PriceAtDate(price=price, date=date)
+                for date, price in zip(columns.dates, columns.prices)
+            ]
+
+            return StockPriceHistory(data=data, next=columns.next)
+
+    async def get_historical_price_columns(
+        self,
+        symbol: StockSymbol,
+        cursor: Optional[StockPriceHistoryCursor] = None,
+    ) -> Union[StockPriceHistoryColumns, SymbolNotFound]:
+        """
+        `get_historical_prices` without the models, for callers encoding the
+        prices themselves.
+        """
         if symbol not in self.allowed_stock_symbols:
             logger.info(f"Symbol not found: {symbol}")
             return SymbolNotFound(symbol=symbol)
 
-        history_length_in_days = 90
-        start_from = cursor.start_from if cursor is not None else self.get_today_utc()
-        next_cursor = StockPriceHistoryCursor(
-            start_from=start_from - datetime.timedelta(days=history_length_in_days)
+        page = get_page(cursor, self.get_today_utc)
+        return await self.history_flights.do(
+            get_history_page_key(symbol, page),
+            functools.partial(self._fetch_historical_price_columns, symbol, page),
         )
 
+    async def _fetch_historical_price_columns(
+        self,
+        symbol: StockSymbol,
+        page: StockPriceHistoryCursor,
+    ) -> StockPriceHistoryColumns:
+        if self.history_prefetcher is None:
+            return await self._get_historical_price_columns(symbol, page)
+
+        columns = await self.history_prefetcher.take(get_history_page_key(symbol, page))
+        if columns is None:
+            columns = await self._get_historical_price_columns(symbol, page)
+
+        if columns.next is not None:
+            self.history_prefetcher.schedule(
+                get_history_page_key(symbol, columns.next),
+                functools.partial(
+                    self._get_historical_price_columns,
+                    symbol,
+                    columns.next,
+                    stage="prefetch",
+                ),
+            )
+        return columns
+
+    async def _get_historical_price_columns(
+        self,
+        symbol: StockSymbol,
+        page: StockPriceHistoryCursor,
+        stage: str = "prices",
+    ) -> StockPriceHistoryColumns:
+        start_from, history_length_in_days = page.start_from, page.page_length()
+        next_cursor = page.next_page()
+
         logger.info(
-            "Get historical prices",
-            f" for the last {history_length_in_days}",
-            f" starting from {start_from}",
+            f"Get historical prices for the last {history_length_in_days}"
+            f" starting from {start_from}"
         )
-        price_history = self.stock_price_service.get_history(
-            symbols=[symbol],
-            start_from=start_from,
-            length=history_length_in_days,
+        with self._stage(stage):
+            price_history = await self.stock_price_service.get_history(
+                symbols=[symbol],
+                start_from=start_from,
+                length=history_length_in_days,
+            )
+
+        return StockPriceHistoryColumns(
+            dates=price_history.dates(),
+            prices=price_history.prices[symbol],
+            next=next_cursor,
         )
-        data = [
-            PriceAtDate(price=price_history[date][symbol], date=date)
-            for date in sorted(price_history.keys(), reverse=True)
+
+    async def get_multiple_historical_prices(
+        self,
+        symbols: List[StockSymbol],
+        cursor: Optional[StockPriceHistoryCursor] = None,
+    ) -> MultipleStockPriceHistory:
+        page = get_page(cursor, self.get_today_utc)
+        start_from, history_length_in_days = page.start_from, page.page_length()
+        next_cursor = page.next_page()
+
+        symbols = list(dict.fromkeys(symbols))
+        found_symbols = [
+            symbol for symbol in symbols if symbol in self.allowed_stock_symbols
         ]
+        logger.info(
+            f"Get historical prices of {len(found_symbols)} symbols"
+            f" for the last {history_length_in_days} starting from {start_from}"
+        )
+        with self._stage("prices"):
+            price_history = await self.stock_price_service.get_history(
+                symbols=found_symbols,
+                start_from=start_from,
+                length=history_length_in_days,
+            )
+        dates = price_history.dates()
+
+        with self._stage("models"):
+            return MultipleStockPriceHistory(
+                data=[
+                    SymbolPriceHistory(
+                        symbol=symbol,
+                        data=[
+                            PriceAtDate(price=price, date=date)
+                            for date, price in zip(dates, price_history.prices[symbol])
+                        ],
+                    )
+                    if symbol in self.allowed_stock_symbols
+                    else SymbolNotFound(symbol=symbol)
+                    for symbol in symbols
+                ],
+                next=next_cursor,
+            )
+
+    async def get_portfolio_historical_prices(
+        self,
+        username: str,
+        cursor: Optional[StockPriceHistoryCursor] = None,
+    ) -> PortfolioPriceHistory:
+        page = get_page(cursor, self.get_today_utc)
+        start_from, history_length_in_days = page.start_from, page.page_length()
+        next_cursor = page.next_page()
 
-        return StockPriceHistory(data=data, next=next_cursor)
+        logger.info(f"Returning portfolio history of user {username}")
+        with self._stage("portfolio"):
+            portfolio = await self.portfolio_repository.get_user_portfolio(
+                username=username
+            )
+        with self._stage("prices"):
+            price_history = await self.stock_price_service.get_history(
+                symbols=portfolio,
+                start_from=start_from,
+                length=history_length_in_days,
+            )
+
+        with self._stage("models"):
+            return build_portfolio_price_history(portfolio, price_history, next_cursor)
+
+    async def iter_historical_prices(
+        self,
+        symbols: List[StockSymbol],
+        first: datetime.date,
+        last: datetime.date,
+        chunk_length: int = 90,
+    ) -> AsyncIterator[HistoricalPrices]:
+        """
+        Prices of the known `symbols` from `last` down to `first`, requested
+        `chunk_length` days at a time: the next chunk is only generated when
+        the previous one has been consumed, so memory does not depend on the
+        number of days.
+        """
+        if chunk_length < 1:
+            raise ValueError("chunk_length must be positive")
+
+        found_symbols = [
+            symbol
+            for symbol in dict.fromkeys(symbols)
+            if symbol in self.allowed_stock_symbols
+        ]
+        logger.info(
+            f"Iterate historical prices of {len(found_symbols)} symbols"
+            f" from {last} to {first}"
+        )
+        remaining = max(0, (last - first).days + 1)
+        start_from = last
+        while remaining > 0:
+            length = min(chunk_length, remaining)
+            with self._stage("prices"):
+                prices = await self.export_price_service.get_history(
+                    symbols=found_symbols,
+                    start_from=start_from,
+                    length=length,
+                )
+            yield prices
+            remaining -= length
+            if remaining > 0:
+                # not before, as the day before `first` may not exist
+                start_from -= datetime.timedelta(days=length)
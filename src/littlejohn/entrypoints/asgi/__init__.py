@@ -1,62 +1,238 @@
+import os
 import random
 from datetime import date, datetime, timezone
 from decimal import Decimal
+from typing import List, Optional
 
 from fastapi import FastAPI
 
+from littlejohn.adapters.asynchronous import (
+    AsyncPortfolioRepositoryInline,
+    AsyncStockPriceServiceOffloaded,
+    AsyncStockPriceServiceSingleFlight,
+)
+from littlejohn.adapters.cached_stock_price_service import StockPriceServiceCache
 from littlejohn.adapters.portfolio_repository import PortfolioRepositoryGenerator
-from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
-from littlejohn.domain.service import StockService
+from littlejohn.adapters.price_table import StockPriceServicePriceTable
+from littlejohn.adapters.stock_price_service import (
+    StockPriceGeneratorSeeds,
+    StockPriceServiceRandomWalker,
+)
+from littlejohn.domain.entities import StockPriceHistoryColumns, StockSymbol
+from littlejohn.domain.service import (
+    AsyncStockService,
+    HistoryPageKey,
+    StockPriceService,
+    observe_stages,
+)
+from littlejohn.libs.prefetch import Prefetcher
 
-from . import api
+from . import api, timing
+from .metrics import Metrics
+from .profiling import ProfilingMiddleware
+from .response_cache import ResponseCache
+from .settings import Settings
+from .warmup import Warmup
 
+ZERO_DATE = date(2021, 11, 12)
+GAIN = Decimal("0.05")
+ALLOWED_STOCK_SYMBOLS = {
+    "AAPL",
+    "MSFT",
+    "GOOG",
+    "AMZN",
+    "FB",
+    "TSLA",
+    "NVDA",
+    "JPM",
+    "BABA",
+    "JNJ",
+    "WMT",
+    "PG",
+    "PYPL",
+    "DIS",
+    "ADBE",
+    "PFE",
+    "V",
+    "MA",
+    "CRM",
+    "NFLX",
+}
 
-def create_app() -> FastAPI:
+
+def create_stock_price_seeds(
+    symbols: List[StockSymbol],
+) -> List[StockPriceGeneratorSeeds]:
     random.seed(123)
-    allowed_stock_symbols = {
-        "AAPL",
-        "MSFT",
-        "GOOG",
-        "AMZN",
-        "FB",
-        "TSLA",
-        "NVDA",
-        "JPM",
-        "BABA",
-        "JNJ",
-        "WMT",
-        "PG",
-        "PYPL",
-        "DIS",
-        "ADBE",
-        "PFE",
-        "V",
-        "MA",
-        "CRM",
-        "NFLX",
-    }
+    return [
+        {
+            "symbol": symbol,
+            "price": Decimal(random.randrange(100, 150)),
+            "forward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+            "backward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+        }
+        for symbol in symbols
+    ]
+
+
+def create_stock_price_service(
+    settings: Settings,
+    zero_date: date,
+    seeds: List[StockPriceGeneratorSeeds],
+    gain: Decimal,
+) -> StockPriceService:
+    stock_price_service: StockPriceService
+    if settings.price_engine == "vectorized":
+        # numpy is an optional dependency
+        from littlejohn.adapters.vectorized_stock_price_service import (
+            StockPriceServiceVectorized,
+        )
+
+        stock_price_service = StockPriceServiceVectorized(
+            zero_date=zero_date,
+            seeds=seeds,
+            gain=gain,
+        )
+    else:
+        stock_price_service = StockPriceServiceRandomWalker(
+            zero_date=zero_date,
+            seeds=seeds,
+            gain=gain,
+            checkpoint_interval=settings.checkpoint_interval,
+            max_checkpoints=settings.max_checkpoints,
+            move_bitmap_horizon=settings.move_bitmap_horizon,
+        )
+
+    if settings.price_table_path is not None:
+        stock_price_service = StockPriceServicePriceTable(
+            path=settings.price_table_path,
+            fallback=stock_price_service,
+        )
+
+    return stock_price_service
+
+
+def get_today_utc() -> date:
+    return datetime.now(tz=timezone.utc).date()
+
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    settings = settings if settings is not None else Settings()
+    metrics = Metrics()
     portfolio_repository = PortfolioRepositoryGenerator(
-        stocks=allowed_stock_symbols,
+        stocks=ALLOWED_STOCK_SYMBOLS,
         min_stocks_in_portfolio=1,
         max_stocks_in_portfolio=10,
     )
-    stock_price_service = StockPriceServiceRandomWalker(
-        zero_date=date(2021, 11, 12),
-        seeds=[
-            {
-                "symbol": symbol,
-                "price": Decimal(random.randrange(100, 150)),
-                "forward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
-                "backward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
-            }
-            for symbol in allowed_stock_symbols
-        ],
-        gain=Decimal("0.05"),
-    )
-    service = StockService(
-        portfolio_repository=portfolio_repository,
+    stock_price_service = create_stock_price_service(
+        settings=settings,
+        zero_date=ZERO_DATE,
+        seeds=create_stock_price_seeds(sorted(ALLOWED_STOCK_SYMBOLS)),
+        gain=GAIN,
+    )
+    # exports are not cached: they would evict the pages of the other requests
+    export_price_service = AsyncStockPriceServiceOffloaded(stock_price_service)
+    if settings.price_cache_max_entries > 0:
+        price_cache = StockPriceServiceCache(
+            stock_price_service=stock_price_service,
+            get_today_utc=get_today_utc,
+            max_entries=settings.price_cache_max_entries,
+            max_bytes=settings.price_cache_max_bytes,
+        )
+        metrics.add_stats(
+            "littlejohn_price_cache",
+            "Price cache",
+            price_cache.stats,
+            counters=["hits", "misses", "evictions", "invalidations"],
+        )
+        stock_price_service = price_cache
+
+    offloaded = AsyncStockPriceServiceOffloaded(stock_price_service)
+    price_flights = AsyncStockPriceServiceSingleFlight(offloaded)
+    history_prefetcher: Optional[
+        Prefetcher[HistoryPageKey, StockPriceHistoryColumns]
+    ] = None
+    if settings.history_prefetch_max_concurrency > 0:
+        history_prefetcher = Prefetcher(
+            max_concurrency=settings.history_prefetch_max_concurrency,
+            max_entries=settings.history_prefetch_max_entries,
+        )
+        metrics.add_stats(
+            "littlejohn_history_prefetch",
+            "Prefetched pages of history",
+            history_prefetcher.stats,
+            counters=["scheduled", "skipped", "hits", "wasted"],
+        )
+
+    service = AsyncStockService(
+        # portfolios are generated in memory, prices are offloaded to threads
+        # once for all the concurrent identical requests
+        portfolio_repository=AsyncPortfolioRepositoryInline(portfolio_repository),
+        stock_price_service=price_flights,
+        get_today_utc=get_today_utc,
+        allowed_stock_symbols=ALLOWED_STOCK_SYMBOLS,
+        history_prefetcher=history_prefetcher,
+        observe_stage=observe_stages(metrics.observe_stage, timing.observe_stage),
+        export_price_service=export_price_service,
+    )
+    response_cache = ResponseCache(
+        max_entries=settings.response_cache_max_entries,
+        max_bytes=settings.response_cache_max_bytes,
+        today_ttl=settings.response_cache_today_ttl,
+    )
+    metrics.add_stats(
+        "littlejohn_price_offload",
+        "Price requests offloaded to threads",
+        offloaded.stats,
+    )
+    metrics.add_stats(
+        "littlejohn_price_flights",
+        "Price requests to the threads",
+        price_flights.stats,
+        counters=["calls", "coalesced"],
+    )
+    metrics.add_stats(
+        "littlejohn_history_flights",
+        "Requests of pages of history",
+        service.history_flights.stats,
+        counters=["calls", "coalesced"],
+    )
+    metrics.add_stats(
+        "littlejohn_response_cache",
+        "Cache of the encoded pages of history",
+        response_cache.stats,
+        counters=["hits", "misses", "evictions"],
+    )
+    warmup = Warmup(
         stock_price_service=stock_price_service,
-        get_today_utc=lambda: datetime.now(tz=timezone.utc).date(),
-        allowed_stock_symbols=allowed_stock_symbols,
+        symbols=ALLOWED_STOCK_SYMBOLS,
+        get_today_utc=get_today_utc,
+        history_pages=settings.warmup_history_pages,
+    )
+    if settings.warmup == "blocking":
+        warmup.run()
+    elif settings.warmup == "off":
+        warmup.ready = True
+
+    app = api.create(
+        service=service,
+        response_cache=response_cache,
+        metrics=metrics,
+        server_timing=settings.server_timing,
+        is_ready=lambda: warmup.ready,
     )
-    return api.create(service=service)
+    if settings.warmup == "background":
+        # started by each worker, after gunicorn forked it
+        app.add_event_handler("startup", warmup.start)
+    if settings.profile_dir is not None:
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        # outermost, to profile the whole request
+        app.add_middleware(
+            ProfilingMiddleware,
+            directory=settings.profile_dir,
+            profiler=settings.profiler,
+            sample_rate=settings.profile_sample_rate,
+            secret=settings.profile_secret,
+            max_files=settings.profile_max_files,
+        )
+    return app
@@ -1,98 +1,410 @@
 import base64
+import contextlib
+import datetime
 import logging
+import time
 import uuid
-from typing import List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from urllib.parse import quote
 
 import pydantic
-from fastapi import Depends, FastAPI, HTTPException, Response, status
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from starlette.routing import Route
 
 from littlejohn.domain.entities import (
-    PriceAtDate,
+    DEFAULT_HISTORY_LENGTH,
+    MAX_HISTORY_LENGTH,
     StockPrice,
     StockPriceHistoryCursor,
     StockSymbol,
     SymbolNotFound,
+    SymbolPriceHistory,
 )
-from littlejohn.domain.service import StockService
+from littlejohn.domain.service import AsyncStockService, observe_stages
+from littlejohn.libs.metrics import CONTENT_TYPE
+
+from .encoding import (
+    BINARY,
+    COLUMNS,
+    MEDIA_TYPES,
+    NDJSON,
+    encode_portfolio_binary,
+    encode_portfolio_columns,
+    encode_price_history,
+    encode_price_history_binary,
+    encode_price_history_columns,
+    encode_price_rows,
+    negotiate,
+)
+from .metrics import Metrics, MetricsMiddleware
+from .response_cache import ResponseCache, etag_matches
+from .timing import ServerTimingMiddleware
+from .timing import observe_stage as observe_request_stage
 
 logger = logging.getLogger(__name__)
 
+MAX_SYMBOLS_PER_REQUEST = 100
+
 
 class Healthcheck(pydantic.BaseModel):
     ok: bool
 
 
-def create(service: StockService) -> FastAPI:
+def decode_cursor(cursor: Optional[str]) -> Optional[StockPriceHistoryCursor]:
+    if cursor is None:
+        return None
+
+    try:
+        return StockPriceHistoryCursor.parse_raw(base64.urlsafe_b64decode(cursor))
+    except Exception:
+        logger.info("Cursor parsing failed")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid cursor",
+        )
+
+
+def encode_cursor(cursor: StockPriceHistoryCursor) -> str:
+    encoded = cursor.json(exclude_none=True).encode("utf-8")
+    return base64.urlsafe_b64encode(encoded).decode("utf-8")
+
+
+def parse_symbols(symbols: str) -> List[StockSymbol]:
+    requested_symbols = [symbol for symbol in symbols.split(",") if symbol]
+    if not requested_symbols:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="No symbols requested",
+        )
+
+    if len(requested_symbols) > MAX_SYMBOLS_PER_REQUEST:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {MAX_SYMBOLS_PER_REQUEST} symbols can be requested",
+        )
+
+    return requested_symbols
+
+
+def get_media_type(accept: Optional[str] = Header(None)) -> str:
+    media_type = negotiate(accept, MEDIA_TYPES)
+    if media_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Supported media types: {', '.join(MEDIA_TYPES)}",
+        )
+
+    return media_type
+
+
+HISTORY_ENCODERS = {
+    COLUMNS: encode_price_history_columns,
+    BINARY: encode_price_history_binary,
+}
+PORTFOLIO_ENCODERS = {
+    COLUMNS: encode_portfolio_columns,
+    BINARY: encode_portfolio_binary,
+}
+
+
+def always_ready() -> bool:
+    return True
+
+
+def create(
+    service: AsyncStockService,
+    response_cache: Optional[ResponseCache] = None,
+    metrics: Optional[Metrics] = None,
+    server_timing: bool = True,
+    is_ready: Callable[[], bool] = always_ready,
+) -> FastAPI:
+    # without a cache, pages are still sent with ETag and Cache-Control
+    response_cache = (
+        response_cache
+        if response_cache is not None
+        else ResponseCache(max_entries=0, max_bytes=1, today_ttl=60)
+    )
+    metrics = metrics if metrics is not None else Metrics()
+    observe_stage = observe_stages(metrics.observe_stage, observe_request_stage)
 
     api = FastAPI()
     auth = HTTPBasic()
 
-    def get_username(credentials: HTTPBasicCredentials = Depends(auth)) -> str:
+    @contextlib.contextmanager
+    def stage(name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe_stage(name, time.perf_counter() - start)
+
+    # handlers and dependencies are coroutines, so that requests are served
+    # on the event loop instead of the threadpool: the service offloads
+    # the CPU-heavy work explicitly
+    async def get_username(credentials: HTTPBasicCredentials = Depends(auth)) -> str:
         unauthorized = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Basic"},
         )
 
-        try:
-            username = uuid.UUID(credentials.username, version=4).hex
-        except Exception:
-            logger.info("Invalid username")
-            raise unauthorized
+        with stage("auth"):
+            try:
+                username = uuid.UUID(credentials.username, version=4).hex
+            except Exception:
+                logger.info("Invalid username")
+                raise unauthorized
+
+            if credentials.password != "":
+                logger.info("Wrong password")
+                raise unauthorized
+
+            return username
 
-        if credentials.password != "":
-            logger.info("Wrong password")
-            raise unauthorized
+    def serialize(
+        encode: Callable[..., bytes],
+        *args: Any,
+    ) -> bytes:
+        with stage("serialization"):
+            return encode(*args)
 
-        return username
+    def json_response(
+        content: Any,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        # serialized explicitly, instead of by FastAPI, to be timed
+        return Response(
+            content=serialize(
+                lambda: JSONResponse(jsonable_encoder(content)).body,
+            ),
+            media_type=JSONResponse.media_type,
+            headers=headers,
+        )
+
+    async def get_page(
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_HISTORY_LENGTH),
+        first: Optional[datetime.date] = Query(None, alias="from"),
+        last: Optional[datetime.date] = Query(None, alias="to"),
+    ) -> StockPriceHistoryCursor:
+        decoded_cursor = decode_cursor(cursor)
+        if decoded_cursor is not None:
+            # the cursor carries the parameters of the first page
+            if limit is not None or first is not None or last is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="cursor can't be combined with limit, from or to",
+                )
+            return decoded_cursor
+
+        start_from = last if last is not None else service.get_today_utc()
+        if limit is None:
+            # ranges are sent in as few pages as possible
+            limit = (
+                DEFAULT_HISTORY_LENGTH
+                if first is None
+                else max(1, min(MAX_HISTORY_LENGTH, (start_from - first).days + 1))
+            )
+        try:
+            return StockPriceHistoryCursor(
+                start_from=start_from,
+                length=limit,
+                until=first,
+            )
+        except pydantic.ValidationError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="from can't be after to",
+            )
 
     @api.get("/health")
-    def healthcheck() -> Healthcheck:
+    async def healthcheck(response: Response) -> Healthcheck:
+        # not ready while warming up, so that no traffic is routed yet
+        if not is_ready():
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            return Healthcheck(ok=False)
+
         return Healthcheck(ok=True)
 
     @api.get("/tickers")
-    def get_portfolio_current_prices(
+    async def get_portfolio_current_prices(
+        # authenticated first: unauthenticated clients get a 401, not a 406
         username: str = Depends(get_username),
-    ) -> List[StockPrice]:
-        return service.get_portfolio_current_prices(username=username)
+        media_type: str = Depends(get_media_type),
+    ) -> Response:
+        prices: List[StockPrice] = await service.get_portfolio_current_prices(
+            username=username
+        )
+        # JSON is negotiated too: caches must not serve it to binary clients
+        if media_type not in PORTFOLIO_ENCODERS:
+            return json_response(prices, {"Vary": "Accept"})
+
+        return Response(
+            content=serialize(
+                PORTFOLIO_ENCODERS[media_type],
+                [p.symbol for p in prices],
+                [p.price for p in prices],
+            ),
+            media_type=media_type,
+            headers={"Vary": "Accept"},
+        )
 
     @api.get("/tickers/{symbol}/history")
-    def get_historical_prices(
-        response: Response,
+    async def get_historical_prices(
         symbol: StockSymbol,
-        cursor: Optional[str] = None,
         _: str = Depends(get_username),
-    ) -> List[PriceAtDate]:
-        decoded_cursor: Optional[StockPriceHistoryCursor]
-        if cursor is not None:
-            try:
-                decoded_cursor = StockPriceHistoryCursor.parse_raw(
-                    base64.urlsafe_b64decode(cursor)
-                )
-            except Exception:
-                logger.info("Cursor parsing failed")
+        page: StockPriceHistoryCursor = Depends(get_page),
+        if_none_match: Optional[str] = Header(None),
+        media_type: str = Depends(get_media_type),
+    ) -> Response:
+        today = service.get_today_utc()
+        key = (symbol, page.start_from, page.length, page.until, media_type)
+        cached = response_cache.get(key)
+        if cached is None:
+            result = await service.get_historical_price_columns(
+                symbol=symbol,
+                cursor=page,
+            )
+            if isinstance(result, SymbolNotFound):
                 raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail="Invalid cursor",
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=result.dict(),
                 )
-        else:
-            decoded_cursor = None
 
-        result = service.get_historical_prices(symbol=symbol, cursor=decoded_cursor)
-        if isinstance(result, SymbolNotFound):
+            link = None
+            if result.next is not None:
+                next_cursor = encode_cursor(result.next)
+                next_href = f"/tickers/{symbol}/history?cursor={next_cursor}"
+                link = f'{next_href}; rel="next"'
+
+            encode = HISTORY_ENCODERS.get(media_type, encode_price_history)
+            cached = response_cache.put(
+                key,
+                body=serialize(encode, result.dates, result.prices),
+                media_type=media_type,
+                link=link,
+                contains_today=today in result.dates,
+            )
+
+        if etag_matches(if_none_match, cached.etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers=cached.headers,
+            )
+
+        return Response(
+            content=cached.body,
+            media_type=cached.media_type,
+            headers=cached.headers,
+        )
+
+    @api.get("/tickers/history")
+    async def get_multiple_historical_prices(
+        symbols: str,
+        _: str = Depends(get_username),
+        page: StockPriceHistoryCursor = Depends(get_page),
+    ) -> Response:
+        requested_symbols = parse_symbols(symbols)
+        result = await service.get_multiple_historical_prices(
+            symbols=requested_symbols,
+            cursor=page,
+        )
+
+        headers = {}
+        if result.next is not None:
+            next_cursor = encode_cursor(result.next)
+            next_symbols = quote(",".join(requested_symbols), safe=",")
+            next_href = f"/tickers/history?symbols={next_symbols}&cursor={next_cursor}"
+            headers["Link"] = f'{next_href}; rel="next"'
+
+        # unknown symbols are reported along with the others
+        return json_response(
+            [
+                {"symbol": item.symbol, "data": item.data}
+                if isinstance(item, SymbolPriceHistory)
+                else {"symbol": item.symbol, "error": "Symbol not found"}
+                for item in result.data
+            ],
+            headers,
+        )
+
+    @api.get("/tickers/history/export")
+    async def export_historical_prices(
+        symbols: str,
+        first: datetime.date = Query(..., alias="from"),
+        last: datetime.date = Query(..., alias="to"),
+        _: str = Depends(get_username),
+    ) -> StreamingResponse:
+        requested_symbols = list(dict.fromkeys(parse_symbols(symbols)))
+        # errors must be raised before the first line is sent
+        unknown_symbols = [
+            symbol
+            for symbol in requested_symbols
+            if symbol not in service.allowed_stock_symbols
+        ]
+        if unknown_symbols:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=result.dict(),
+                detail=[SymbolNotFound(symbol=s).dict() for s in unknown_symbols],
             )
 
+        if first > last:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="from can't be after to",
+            )
+
+        async def lines() -> AsyncIterator[bytes]:
+            async for history in service.iter_historical_prices(
+                symbols=requested_symbols,
+                first=first,
+                last=last,
+            ):
+                yield encode_price_rows(
+                    history.dates(),
+                    requested_symbols,
+                    history.prices,
+                )
+
+        return StreamingResponse(lines(), media_type=NDJSON)
+
+    @api.get("/portfolio/history")
+    async def get_portfolio_historical_prices(
+        username: str = Depends(get_username),
+        page: StockPriceHistoryCursor = Depends(get_page),
+    ) -> Response:
+        result = await service.get_portfolio_historical_prices(
+            username=username,
+            cursor=page,
+        )
+
+        headers = {}
         if result.next is not None:
-            next_cursor = base64.urlsafe_b64encode(
-                result.next.json().encode("utf-8")
-            ).decode("utf-8")
-            next_href = f"/tickers/{symbol}/history?cursor={next_cursor}"
-            response.headers["Link"] = f'{next_href}; rel="next"'
+            next_cursor = encode_cursor(result.next)
+            next_href = f"/portfolio/history?cursor={next_cursor}"
+            headers["Link"] = f'{next_href}; rel="next"'
+
+        return json_response(
+            {"holdings": result.holdings, "total": result.total}, headers
+        )
 
-        return result.data
+    @api.get("/metrics")
+    async def get_metrics() -> Response:
+        return Response(content=metrics.render(), media_type=CONTENT_TYPE)
 
+    # the router stores the endpoint of the matched route in the scope
+    api.add_middleware(
+        MetricsMiddleware,
+        metrics=metrics,
+        routes={
+            route.endpoint: route.path
+            for route in api.routes
+            if isinstance(route, Route)
+        },
+    )
+    if server_timing:
+        api.add_middleware(ServerTimingMiddleware)
     return api
@@ -0,0 +1,228 @@
+"""
+Encodings of the price responses.
+
+Besides JSON, prices can be requested in compact formats with the `Accept`
+header:
+
+- `application/vnd.littlejohn.columns+json`: one JSON array per field.
+  History pages are `{"start_date": ..., "dates": [...], "prices": [...]}`,
+  where `dates` are offsets in days from `start_date`, portfolios are
+  `{"symbols": [...], "prices": [...]}`. Prices are JSON numbers with two
+  decimals.
+- `application/vnd.littlejohn.cents`: little-endian binary, prices are
+  int32 cents. History pages are a `HISTORY_HEADER` (magic `LJPH`, version,
+  ordinal of the first date, number of prices) followed by the prices, one
+  per day in descending date order from the first date. Portfolios are a
+  `PORTFOLIO_HEADER` (magic `LJPP`, version, number of prices, size of the
+  symbols) followed by the symbols in utf-8 separated by newlines, padded
+  to a multiple of 4 bytes, then the prices of the symbols in the same
+  order.
+
+Exports of date ranges are streamed as `application/x-ndjson`, one JSON
+object per line and date: `{"date": ..., "prices": {symbol: price, ...}}`.
+"""
+import datetime
+import json
+import struct
+import sys
+from array import array
+from decimal import Decimal
+from typing import List, Mapping, Optional, Sequence
+
+from littlejohn.domain.entities import StockSymbol, encode_price, to_cents
+
+__all__ = [
+    "BINARY",
+    "COLUMNS",
+    "HISTORY_HEADER",
+    "JSON",
+    "MEDIA_TYPES",
+    "NDJSON",
+    "PORTFOLIO_HEADER",
+    "encode_portfolio_binary",
+    "encode_portfolio_columns",
+    "encode_price_history",
+    "encode_price_history_binary",
+    "encode_price_history_columns",
+    "encode_price_rows",
+    "negotiate",
+]
+
+JSON = "application/json"
+COLUMNS = "application/vnd.littlejohn.columns+json"
+BINARY = "application/vnd.littlejohn.cents"
+# in order of preference when the client accepts more than one
+MEDIA_TYPES = [JSON, COLUMNS, BINARY]
+NDJSON = "application/x-ndjson"
+
+VERSION = 1
+HISTORY_HEADER = struct.Struct("<4sHxxII")
+PORTFOLIO_HEADER = struct.Struct("<4sHxxII")
+
+
+def negotiate(accept: Optional[str], media_types: List[str]) -> Optional[str]:
+    """
+    The media type of `media_types` preferred by the `Accept` header, None
+    if none is acceptable.
+
+    >>> negotiate("application/*;q=0.5, application/vnd.littlejohn.cents", MEDIA_TYPES)
+    'application/vnd.littlejohn.cents'
+    """
+    if accept is None or not accept.strip():
+        return media_types[0]
+
+    best = None
+    best_quality = 0.0
+    for media_type in media_types:
+        quality = _quality(accept, media_type)
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def _quality(accept: str, media_type: str) -> float:
+    type_, _ = media_type.split("/")
+    # the most specific range matching the media type decides its quality
+    quality, specificity = 0.0, -1
+    for accepted in accept.split(","):
+        accepted_type, *params = [p.strip() for p in accepted.split(";")]
+        if accepted_type == media_type:
+            range_specificity = 2
+        elif accepted_type == f"{type_}/*":
+            range_specificity = 1
+        elif accepted_type == "*/*":
+            range_specificity = 0
+        else:
+            continue
+        if range_specificity > specificity:
+            quality, specificity = _parse_quality(params), range_specificity
+    return quality
+
+
+def _parse_quality(params: List[str]) -> float:
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def encode_price_history(
+    dates: Sequence[datetime.date],
+    prices: Sequence[Decimal],
+) -> bytes:
+    """
+    Same bytes as `JSONResponse` renders for the list of `PriceAtDate` of
+    `dates` and `prices`, without building and encoding the models.
+
+    >>> encode_price_history([datetime.date(2021, 11, 12)], [Decimal("1.005")])
+    b'[{"date":"2021-11-12","price":"1.00"}]'
+    """
+    rows = ",".join(
+        [
+            f'{{"date":"{date.isoformat()}","price":"{encode_price(price)}"}}'
+            for date, price in zip(dates, prices)
+        ]
+    )
+    return f"[{rows}]".encode("utf-8")
+
+
+def encode_price_history_columns(
+    dates: Sequence[datetime.date],
+    prices: Sequence[Decimal],
+) -> bytes:
+    """
+    >>> encode_price_history_columns(
+    ...     [datetime.date(2021, 11, 12), datetime.date(2021, 11, 11)],
+    ...     [Decimal("1.005"), Decimal("2")],
+    ... )
+    b'{"start_date":"2021-11-12","dates":[0,-1],"prices":[1.00,2.00]}'
+    """
+    start_date = dates[0] if dates else None
+    offsets = ",".join([str((date - dates[0]).days) for date in dates])
+    return (
+        f'{{"start_date":{_encode_date(start_date)},'
+        f'"dates":[{offsets}],'
+        f'"prices":[{_encode_prices(prices)}]}}'
+    ).encode("utf-8")
+
+
+def encode_price_history_binary(
+    dates: Sequence[datetime.date],
+    prices: Sequence[Decimal],
+) -> bytes:
+    """`dates` must be consecutive, in descending order."""
+    first_day = dates[0].toordinal() if dates else 0
+    header = HISTORY_HEADER.pack(b"LJPH", VERSION, first_day, len(prices))
+    return header + _encode_cents(prices)
+
+
+def encode_portfolio_columns(
+    symbols: Sequence[StockSymbol],
+    prices: Sequence[Decimal],
+) -> bytes:
+    """
+    >>> encode_portfolio_columns(["AAPL", "MSFT"], [Decimal("1.005"), Decimal("2")])
+    b'{"symbols":["AAPL","MSFT"],"prices":[1.00,2.00]}'
+    """
+    encoded_symbols = json.dumps(list(symbols), separators=(",", ":"))
+    return (
+        f'{{"symbols":{encoded_symbols},"prices":[{_encode_prices(prices)}]}}'
+    ).encode("utf-8")
+
+
+def encode_portfolio_binary(
+    symbols: Sequence[StockSymbol],
+    prices: Sequence[Decimal],
+) -> bytes:
+    encoded_symbols = "\n".join(symbols).encode("utf-8")
+    header = PORTFOLIO_HEADER.pack(b"LJPP", VERSION, len(prices), len(encoded_symbols))
+    padding = b"\0" * (-len(encoded_symbols) % 4)
+    return header + encoded_symbols + padding + _encode_cents(prices)
+
+
+def encode_price_rows(
+    dates: Sequence[datetime.date],
+    symbols: Sequence[StockSymbol],
+    prices: Mapping[StockSymbol, Sequence[Decimal]],
+) -> bytes:
+    """
+    NDJSON lines of `dates`, with the prices of `symbols` in the same order.
+
+    >>> encode_price_rows(
+    ...     [datetime.date(2021, 11, 12)], ["AAPL"], {"AAPL": [Decimal("1.005")]}
+    ... )
+    b'{"date":"2021-11-12","prices":{"AAPL":"1.00"}}\\n'
+    """
+    keys = [json.dumps(symbol, ensure_ascii=False) for symbol in symbols]
+    columns = [prices[symbol] for symbol in symbols]
+    lines = []
+    for i, date in enumerate(dates):
+        fields = ",".join(
+            [f'{key}:"{encode_price(column[i])}"' for key, column in zip(keys, columns)]
+        )
+        lines.append(f'{{"date":"{date.isoformat()}","prices":{{{fields}}}}}\n')
+    return "".join(lines).encode("utf-8")
+
+
+def _encode_date(date: Optional[datetime.date]) -> str:
+    return f'"{date.isoformat()}"' if date is not None else "null"
+
+
+def _encode_prices(prices: Sequence[Decimal]) -> str:
+    return ",".join([encode_price(price) for price in prices])
+
+
+def _encode_cents(prices: Sequence[Decimal]) -> bytes:
+    cents = array("i")
+    for price in prices:
+        value = to_cents(price)
+        if not -(2 ** 31) <= value < 2 ** 31:
+            raise ValueError("Price does not fit in 32 bits")
+        cents.append(value)
+    if sys.byteorder != "little":
+        cents.byteswap()
+    return cents.tobytes()
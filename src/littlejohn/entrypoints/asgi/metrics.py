@@ -0,0 +1,123 @@
+import time
+from typing import Any, Awaitable, Callable, Collection, Dict, Mapping, MutableMapping
+
+from littlejohn.libs.metrics import (
+    CallbackGauge,
+    Histogram,
+    HistogramChild,
+    Registry,
+    StatsCollector,
+)
+
+__all__ = [
+    "Metrics",
+    "MetricsMiddleware",
+]
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# label of the requests not matching any route, e.g. 404s, so that
+# arbitrary paths do not create new series
+OTHER_ROUTE = "other"
+
+
+class Metrics:
+    """
+    The metrics of one process: with several workers, each one exposes its
+    own and they are summed by the monitoring system.
+    """
+
+    def __init__(self) -> None:
+        self.registry = Registry()
+        self.request_duration = Histogram(
+            "littlejohn_request_duration_seconds",
+            "Duration of the HTTP requests",
+            ["route", "status"],
+        )
+        self.stage_duration = Histogram(
+            "littlejohn_stage_duration_seconds",
+            "Duration of the stages of the requests",
+            ["stage"],
+        )
+        self.requests_in_flight = 0
+        self.registry.register(self.request_duration)
+        self.registry.register(self.stage_duration)
+        self.registry.register(
+            CallbackGauge(
+                "littlejohn_requests_in_flight",
+                "HTTP requests being served",
+                lambda: self.requests_in_flight,
+            )
+        )
+        self._stages: Dict[str, HistogramChild] = {}
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        child = self._stages.get(stage)
+        if child is None:
+            child = self._stages[stage] = self.stage_duration.labels(stage)
+        child.observe(seconds)
+
+    def add_stats(
+        self,
+        prefix: str,
+        documentation: str,
+        stats: Callable[[], Mapping[str, Any]],
+        counters: Collection[str] = (),
+    ) -> None:
+        self.registry.register(StatsCollector(prefix, documentation, stats, counters))
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class MetricsMiddleware:
+    """
+    Observes the duration of the HTTP requests by route and status.
+
+    Routes are labelled by their path template, e.g. `/tickers/{symbol}/history`,
+    found from the endpoint the router stored in the scope.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: Metrics, routes: Mapping[Any, str]):
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+        # route -> status -> histogram child
+        self._children: Dict[str, Dict[int, HistogramChild]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.requests_in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.requests_in_flight -= 1
+            route = self.routes.get(scope.get("endpoint"), OTHER_ROUTE)
+            self._child(route, status).observe(time.perf_counter() - start)
+
+    def _child(self, route: str, status: int) -> HistogramChild:
+        children = self._children.get(route)
+        if children is None:
+            children = self._children[route] = {}
+        child = children.get(status)
+        if child is None:
+            child = children[status] = self.metrics.request_duration.labels(
+                route, str(status)
+            )
+        return child
@@ -0,0 +1,135 @@
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import time
+from typing import Callable, Optional
+
+from littlejohn.libs.profiling import SamplingProfiler
+
+from .metrics import ASGIApp, Message, Receive, Scope, Send
+from .settings import Profiler
+
+__all__ = [
+    "PROFILE_HEADER",
+    "ProfilingMiddleware",
+]
+
+logger = logging.getLogger(__name__)
+
+# requests with this header are profiled, responses carry the profile name
+PROFILE_HEADER = b"x-profile"
+
+PROFILE_EXTENSIONS = (".prof", ".folded")
+
+
+def get_profile_name(scope: Scope, profiler: Profiler) -> str:
+    """
+    >>> scope = {"method": "GET", "path": "/tickers/AAPL/history"}
+    >>> get_profile_name(scope, "cprofile").endswith("-GET-tickers-AAPL-history.prof")
+    True
+    """
+    path = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-")[:64]
+    extension = "prof" if profiler == "cprofile" else "folded"
+    return (
+        f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        f"-{scope['method']}-{path}.{extension}"
+    )
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests sent with an `X-Profile: <secret>` header, and a
+    `sample_rate` fraction of the others, into `directory`. Without a
+    `secret`, the header is ignored. Only the `max_files` newest profiles
+    are kept.
+
+    `cprofile` profiles write pstats files and only see the event loop
+    thread: handlers, models and serialization. `sampling` profiles write
+    folded stacks of all the threads, including the price computations
+    offloaded to threads. Either way, profiles include the other requests
+    served at the same time, and only one request is profiled at a time.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        directory: str,
+        profiler: Profiler = "sampling",
+        sample_rate: float = 0.0,
+        secret: Optional[str] = None,
+        max_files: int = 100,
+        get_random: Callable[[], float] = random.random,
+    ):
+        if max_files < 1:
+            raise ValueError("max_files must be positive")
+
+        self.app = app
+        self.directory = directory
+        self.profiler = profiler
+        self.sample_rate = sample_rate
+        self.secret = secret.encode("utf-8") if secret is not None else None
+        self.max_files = max_files
+        self.get_random = get_random
+        self._profiling = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._profiling or not self._is_profiled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = get_profile_name(scope, self.profiler)
+
+        async def send_with_name(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (PROFILE_HEADER, name.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        self._profiling = True
+        try:
+            if self.profiler == "cprofile":
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    await self.app(scope, receive, send_with_name)
+                finally:
+                    profile.disable()
+                    profile.dump_stats(os.path.join(self.directory, name))
+            else:
+                sampler = SamplingProfiler()
+                sampler.start()
+                try:
+                    await self.app(scope, receive, send_with_name)
+                finally:
+                    sampler.stop()
+                    with open(os.path.join(self.directory, name), "w") as file:
+                        file.write(sampler.folded())
+        finally:
+            self._profiling = False
+        logger.info(f"Wrote profile {name}")
+        self._remove_oldest_profiles()
+
+    def _is_profiled(self, scope: Scope) -> bool:
+        if self.secret is not None and any(
+            name == PROFILE_HEADER and hmac.compare_digest(value, self.secret)
+            for name, value in scope["headers"]
+        ):
+            return True
+        return self.sample_rate > 0 and self.get_random() < self.sample_rate
+
+    def _remove_oldest_profiles(self) -> None:
+        profiles = sorted(
+            (entry.stat().st_mtime_ns, entry.name)
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(PROFILE_EXTENSIONS)
+        )
+        for _, name in profiles[: -self.max_files]:
+            os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,152 @@
+import datetime
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple, TypedDict
+
+from littlejohn.domain.entities import StockSymbol
+
+__all__ = [
+    "CachedResponse",
+    "ResponseCache",
+    "ResponseCacheStats",
+    "etag_matches",
+]
+
+# symbol, start_from, length, until, media type
+ResponseCacheKey = Tuple[StockSymbol, datetime.date, int, Optional[datetime.date], str]
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    # ETag, Cache-Control, Vary and Link
+    headers: Dict[str, str]
+    # monotonic time after which the response is stale, None if immutable
+    expires_at: Optional[float]
+
+    @property
+    def etag(self) -> str:
+        return self.headers["ETag"]
+
+
+class ResponseCacheStats(TypedDict):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of `etag` with an `If-None-Match` header."""
+    if if_none_match is None:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded history pages, at most `max_entries` of them and
+    `max_bytes` of bodies, 0 entries disables it.
+
+    Pages are only computed from deterministic prices, so they never change:
+    they are sent with a strong ETag and cached by clients for a year. The
+    page containing today is the exception, it expires after `today_ttl`
+    seconds, both here and for clients.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        today_ttl: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_entries < 0:
+            raise ValueError("max_entries can't be negative")
+
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
+
+        if today_ttl < 0:
+            raise ValueError("today_ttl can't be negative")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.today_ttl = today_ttl
+        self.clock = clock
+        self._entries: "OrderedDict[ResponseCacheKey, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def stats(self) -> ResponseCacheStats:
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def get(self, key: ResponseCacheKey) -> Optional[CachedResponse]:
+        response = self._entries.get(key)
+        if response is not None and (
+            response.expires_at is None or response.expires_at > self.clock()
+        ):
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return response
+
+        if response is not None:
+            self._remove(key)
+        self._misses += 1
+        return None
+
+    def put(
+        self,
+        key: ResponseCacheKey,
+        body: bytes,
+        media_type: str,
+        link: Optional[str],
+        contains_today: bool,
+    ) -> CachedResponse:
+        """Caches and returns the response made of `body` and `link`."""
+        headers = {
+            "ETag": f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            "Cache-Control": (
+                f"private, max-age={self.today_ttl}"
+                if contains_today
+                else f"private, max-age={IMMUTABLE_MAX_AGE}, immutable"
+            ),
+            # pages are encoded according to the Accept header
+            "Vary": "Accept",
+        }
+        if link is not None:
+            headers["Link"] = link
+        response = CachedResponse(
+            body=body,
+            media_type=media_type,
+            headers=headers,
+            expires_at=self.clock() + self.today_ttl if contains_today else None,
+        )
+
+        if self.max_entries > 0:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = response
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+        return response
+
+    def _remove(self, key: ResponseCacheKey) -> None:
+        self._bytes -= len(self._entries.pop(key).body)
@@ -0,0 +1,67 @@
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseSettings, validator
+
+__all__ = [
+    "PriceEngine",
+    "Profiler",
+    "Settings",
+    "WarmupMode",
+]
+
+PriceEngine = Literal["random_walk", "vectorized"]
+Profiler = Literal["sampling", "cprofile"]
+WarmupMode = Literal["background", "blocking", "off"]
+
+
+class Settings(BaseSettings):
+    # "vectorized" requires numpy (`littlejohn[vectorized]`)
+    price_engine: PriceEngine = "random_walk"
+    # days between the checkpoints of the random walks, at most
+    # max_checkpoints of them per walk
+    checkpoint_interval: int = 64
+    max_checkpoints: int = 1024
+    # days around zero_date served by move bitmaps, 0 disables them
+    move_bitmap_horizon: int = 0
+    # table written by `littlejohn-price-table`, shared by all the workers
+    price_table_path: Optional[str] = None
+    # LRU cache of price windows, 0 entries disables it
+    price_cache_max_entries: int = 4096
+    price_cache_max_bytes: int = 32 * 2 ** 20
+    # LRU cache of encoded history pages, 0 entries disables it
+    response_cache_max_entries: int = 4096
+    response_cache_max_bytes: int = 32 * 2 ** 20
+    # seconds the page containing today is cached, by the server and clients
+    response_cache_today_ttl: int = 60
+    # pages of history computed ahead of the requests, 0 disables prefetching
+    history_prefetch_max_concurrency: int = 4
+    history_prefetch_max_entries: int = 1024
+    # durations of the stages of each request in a Server-Timing header
+    server_timing: bool = True
+    # directory of the profiles of the requests, None disables profiling
+    profile_dir: Optional[str] = None
+    profiler: Profiler = "sampling"
+    # fraction of the requests profiled, besides those asking for it
+    profile_sample_rate: float = 0.0
+    # value of the X-Profile header of the requests asking for a profile,
+    # None ignores the header
+    profile_secret: Optional[str] = None
+    # newest profiles kept in profile_dir
+    profile_max_files: int = 100
+    # "blocking" warms up in create_app, e.g. once before gunicorn forks
+    # with --preload, "background" in each worker once it has started
+    warmup: WarmupMode = "background"
+    # first pages of history of each symbol computed by the warmup
+    warmup_history_pages: int = 1
+
+    @validator("move_bitmap_horizon")
+    def move_bitmaps_require_random_walk(
+        cls, move_bitmap_horizon: int, values: Dict[str, Any]
+    ) -> int:
+        # the vectorized engine has no move bitmaps: reject instead of ignoring
+        if move_bitmap_horizon > 0 and values.get("price_engine") == "vectorized":
+            raise ValueError("move bitmaps require the random_walk price engine")
+        return move_bitmap_horizon
+
+    class Config:
+        env_prefix = "LITTLEJOHN_"
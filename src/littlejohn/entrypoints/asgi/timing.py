@@ -0,0 +1,77 @@
+import contextvars
+import time
+from typing import Dict, Optional
+
+from .metrics import ASGIApp, Message, Receive, Scope, Send
+
+__all__ = [
+    "ServerTimingMiddleware",
+    "format_server_timing",
+    "observe_stage",
+]
+
+_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "littlejohn_stages", default=None
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Adds `seconds` to the stage in the Server-Timing of the current request,
+    does nothing outside of a request.
+
+    Tasks started by the request, like the single flight computing its page,
+    share its stages: tasks that must not report to it, like prefetching,
+    are started in a new context.
+    """
+    stages = _stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def format_server_timing(stages: Dict[str, float], total: float) -> str:
+    """
+    >>> format_server_timing({"prices": 0.0123}, total=0.02)
+    'prices;dur=12.300, total;dur=20.000'
+    """
+    metrics = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in stages.items()]
+    metrics.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """
+    Sends the durations of the stages of each request, in milliseconds, in
+    a `Server-Timing` header. Only the stages completed before the response
+    starts are included, so streamed responses only report their first
+    chunk.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stages: Dict[str, float] = {}
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                value = format_server_timing(stages, time.perf_counter() - start)
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", value.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        token = _stages.set(stages)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _stages.reset(token)
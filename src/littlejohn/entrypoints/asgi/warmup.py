@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from typing import Collection
+
+from littlejohn.domain.entities import StockSymbol
+from littlejohn.domain.service import GetTodayUtc, StockPriceService, get_page
+
+__all__ = [
+    "Warmup",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """
+    Precomputes the prices requested first, so that they are not paid for
+    by the first requests: today's prices of all the `symbols` and, for
+    each symbol, the first `history_pages` pages of history.
+
+    Pages are requested as `AsyncStockService` requests them, one symbol at
+    a time, so that they are served by the price cache. `ready` is set once
+    the warmup is over, even if it failed, as it only makes requests faster.
+    """
+
+    def __init__(
+        self,
+        stock_price_service: StockPriceService,
+        symbols: Collection[StockSymbol],
+        get_today_utc: GetTodayUtc,
+        history_pages: int,
+    ):
+        if history_pages < 0:
+            raise ValueError("history_pages can't be negative")
+
+        self.stock_price_service = stock_price_service
+        self.symbols = sorted(symbols)
+        self.get_today_utc = get_today_utc
+        self.history_pages = history_pages
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        """Warms up, once: later calls return when the first one is over."""
+        with self._lock:
+            if self.ready:
+                return
+
+            start = time.perf_counter()
+            try:
+                self._warm_up()
+            except Exception:
+                logger.exception("Warmup failed")
+            else:
+                logger.info(f"Warmed up in {time.perf_counter() - start:.2f}s")
+            finally:
+                self.ready = True
+
+    def start(self) -> None:
+        """Warms up in a background thread."""
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def _warm_up(self) -> None:
+        today = self.get_today_utc()
+        self.stock_price_service.get_history(
+            symbols=self.symbols,
+            start_from=today,
+            length=1,
+        )
+        for symbol in self.symbols:
+            page = get_page(None, self.get_today_utc)
+            for _ in range(self.history_pages):
+                self.stock_price_service.get_history(
+                    symbols=[symbol],
+                    start_from=page.start_from,
+                    length=page.page_length(),
+                )
+                next_page = page.next_page()
+                if next_page is None:
+                    break
+                page = next_page
@@ -0,0 +1,69 @@
+import argparse
+import logging
+import os
+from datetime import date
+from typing import List, Optional
+
+from littlejohn.adapters.price_table import write_price_table
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+from littlejohn.entrypoints.asgi import (
+    ALLOWED_STOCK_SYMBOLS,
+    GAIN,
+    ZERO_DATE,
+    create_stock_price_seeds,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Writes the price table served with `LITTLEJOHN_PRICE_TABLE_PATH`.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("output", help="path of the table")
+    parser.add_argument(
+        "--from",
+        dest="first_date",
+        type=date.fromisoformat,
+        default=date(2011, 11, 12),
+        help="first date in the table (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--to",
+        dest="last_date",
+        type=date.fromisoformat,
+        default=date(2031, 11, 12),
+        help="last date in the table (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    if args.last_date < args.first_date:
+        parser.error("--to can't be before --from")
+
+    logging.basicConfig(level=logging.INFO)
+    seeds = create_stock_price_seeds(sorted(ALLOWED_STOCK_SYMBOLS))
+    stock_price_service = StockPriceServiceRandomWalker(
+        zero_date=ZERO_DATE,
+        seeds=seeds,
+        gain=GAIN,
+    )
+
+    # the table is replaced atomically, servers may have it mapped
+    temporary_path = f"{args.output}.tmp"
+    with open(temporary_path, "wb") as file:
+        write_price_table(
+            file,
+            stock_price_service=stock_price_service,
+            symbols=[s["symbol"] for s in seeds],
+            first_date=args.first_date,
+            days=(args.last_date - args.first_date).days + 1,
+        )
+    os.replace(temporary_path, args.output)
+    logger.info(
+        f"Price table from {args.first_date} to {args.last_date} written to"
+        f" {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Metrics in the Prometheus text exposition format.
+
+Metrics are meant to be updated from a single thread, the event loop, so
+they are plain counters without locks. Children are created once for each
+combination of label values and then reused: observing a value only
+increments a bucket and adds to a sum.
+"""
+from bisect import bisect_left
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Protocol,
+    Sequence,
+    Tuple,
+)
+
+__all__ = [
+    "CONTENT_TYPE",
+    "DEFAULT_BUCKETS",
+    "CallbackGauge",
+    "Histogram",
+    "Registry",
+    "StatsCollector",
+]
+
+# without charset, which starlette adds to text/* responses
+CONTENT_TYPE = "text/plain; version=0.0.4"
+# seconds, from half a millisecond to ten seconds
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Collector(Protocol):
+    def collect(self) -> Iterator[str]:
+        """Lines of the exposition format, without line breaks."""
+        ...
+
+
+def escape_label_value(value: str) -> str:
+    """
+    >>> print(escape_label_value('a "b"\\\\c'))
+    a \\"b\\"\\\\c
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+
+    labels = ",".join(
+        f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)
+    )
+    return f"{{{labels}}}"
+
+
+def format_value(value: float) -> str:
+    """
+    >>> format_value(3), format_value(0.25), format_value(float("inf"))
+    ('3', '0.25', '+Inf')
+    """
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class HistogramChild:
+    """The observations of a histogram for one combination of label values."""
+
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Sequence[float]):
+        self.upper_bounds = upper_bounds
+        # the last bucket is +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    """
+    >>> histogram = Histogram("latency_seconds", "Latency", ["route"], [0.1, 1])
+    >>> histogram.labels("/health").observe(0.5)
+    >>> print("\\n".join(histogram.collect()))
+    # HELP latency_seconds Latency
+    # TYPE latency_seconds histogram
+    latency_seconds_bucket{route="/health",le="0.1"} 0
+    latency_seconds_bucket{route="/health",le="1"} 1
+    latency_seconds_bucket{route="/health",le="+Inf"} 1
+    latency_seconds_sum{route="/health"} 0.5
+    latency_seconds_count{route="/health"} 1
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        if list(buckets) != sorted(buckets):
+            raise ValueError("buckets must be sorted")
+
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.upper_bounds = tuple(float(b) for b in buckets)
+        self._children: Dict[Tuple[str, ...], HistogramChild] = {}
+
+    def labels(self, *values: str) -> HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} has labels {self.labelnames}")
+            child = self._children[values] = HistogramChild(self.upper_bounds)
+        return child
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        bucket_names = (*self.labelnames, "le")
+        bounds = [format_value(b) for b in (*self.upper_bounds, float("inf"))]
+        for values, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                labels = format_labels(bucket_names, (*values, bound))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackGauge:
+    """Gauge whose value is read from `value` when collected."""
+
+    def __init__(self, name: str, documentation: str, value: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.value = value
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {format_value(self.value())}"
+
+
+class StatsCollector:
+    """
+    Exposes the `stats()` of a component, one metric per key: the keys in
+    `counters` are counters, named `<prefix>_<key>_total`, the others are
+    gauges.
+
+    >>> collector = StatsCollector(
+    ...     "cache", "Cache", lambda: {"hits": 3, "entries": 1}, counters=["hits"]
+    ... )
+    >>> print("\\n".join(collector.collect()))
+    # HELP cache_hits_total Cache, hits
+    # TYPE cache_hits_total counter
+    cache_hits_total 3
+    # HELP cache_entries Cache, entries
+    # TYPE cache_entries gauge
+    cache_entries 1
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        documentation: str,
+        stats: Callable[[], Mapping[str, Any]],
+        counters: Collection[str],
+    ):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+        self.counters = counters
+
+    def collect(self) -> Iterator[str]:
+        for key, value in self.stats().items():
+            if key in self.counters:
+                name, type_ = f"{self.prefix}_{key}_total", "counter"
+            else:
+                name, type_ = f"{self.prefix}_{key}", "gauge"
+            yield f"# HELP {name} {self.documentation}, {key}"
+            yield f"# TYPE {name} {type_}"
+            yield f"{name} {format_value(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.collectors: List[Collector] = []
+
+    def register(self, collector: Collector) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = [line for c in self.collectors for line in c.collect()]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,118 @@
+import asyncio
+import contextvars
+from collections import OrderedDict
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    TypedDict,
+    TypeVar,
+)
+
+__all__ = [
+    "PrefetchStats",
+    "Prefetcher",
+]
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+class PrefetchStats(TypedDict):
+    scheduled: int
+    skipped: int
+    hits: int
+    wasted: int
+    in_flight: int
+    entries: int
+
+
+class Prefetcher(Generic[K, T]):
+    """
+    Computes values in the background before they are asked for.
+
+    At most `max_concurrency` calls run at a time: calls scheduled while all
+    of them are busy are skipped, as they are only a guess. Results are kept
+    in an LRU of `max_entries` entries until `take` returns them, once.
+    Results evicted before being taken, and failed calls, are wasted.
+
+    >>> async def main():
+    ...     prefetcher = Prefetcher(max_concurrency=1, max_entries=1)
+    ...     async def call():
+    ...         return 42
+    ...     prefetcher.schedule("key", call)
+    ...     return await prefetcher.take("key"), await prefetcher.take("key")
+    >>> asyncio.run(main())
+    (42, None)
+    """
+
+    def __init__(self, max_concurrency: int, max_entries: int):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be positive")
+
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+
+        self.max_concurrency = max_concurrency
+        self.max_entries = max_entries
+        self._tasks: Dict[K, "asyncio.Future[T]"] = {}
+        self._results: "OrderedDict[K, T]" = OrderedDict()
+        self._scheduled = 0
+        self._skipped = 0
+        self._hits = 0
+        self._wasted = 0
+
+    def stats(self) -> PrefetchStats:
+        return {
+            "scheduled": self._scheduled,
+            "skipped": self._skipped,
+            "hits": self._hits,
+            "wasted": self._wasted,
+            "in_flight": len(self._tasks),
+            "entries": len(self._results),
+        }
+
+    def schedule(self, key: K, call: Callable[[], Awaitable[T]]) -> None:
+        """Starts `call` unless `key` is already prefetched."""
+        if key in self._tasks or key in self._results:
+            return
+
+        if len(self._tasks) >= self.max_concurrency:
+            self._skipped += 1
+            return
+
+        self._scheduled += 1
+        # in a new context: the call is not part of the current request
+        task = contextvars.Context().run(asyncio.ensure_future, call())
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._store(key, task))
+
+    async def take(self, key: K) -> Optional[T]:
+        """
+        The result prefetched for `key`, waiting for it if it is still being
+        computed, None if there is none.
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            # the result is stored by the done callback, before waking us up
+            await asyncio.wait([task])
+
+        if key not in self._results:
+            return None
+
+        self._hits += 1
+        return self._results.pop(key)
+
+    def _store(self, key: K, task: "asyncio.Future[T]") -> None:
+        del self._tasks[key]
+        if task.cancelled() or task.exception() is not None:
+            self._wasted += 1
+            return
+
+        self._results[key] = task.result()
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+            self._wasted += 1
@@ -0,0 +1,90 @@
+import collections
+import sys
+import threading
+from types import FrameType
+from typing import Counter, Optional, Tuple
+
+__all__ = [
+    "SamplingProfiler",
+]
+
+
+def format_frame(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all the threads every `interval` seconds, from a
+    background thread.
+
+    Unlike cProfile, which only sees the thread it is enabled in, samples
+    include the threads prices are offloaded to. Stacks are reported in the
+    folded format of flame graph tools (flamegraph.pl, speedscope): one line
+    per distinct stack, frames separated by semicolons, root first, followed
+    by the number of samples.
+
+    >>> profiler = SamplingProfiler(interval=0.001)
+    >>> profiler.start()
+    >>> sum(range(10 ** 6))
+    499999500000
+    >>> profiler.stop()
+    >>> profiler.samples > 0
+    True
+    """
+
+    def __init__(self, interval: float = 0.002):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter[Tuple[str, ...]] = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise RuntimeError("profiler already started")
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="sampling-profiler",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            raise RuntimeError("profiler not started")
+
+        self._stopped.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.items()
+        )
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        # sampled before waiting, so that short profiles are not empty
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self._sample(names.get(thread_id, str(thread_id)), frame)
+            self.samples += 1
+            if self._stopped.wait(self.interval):
+                return
+
+    def _sample(self, thread_name: str, frame: FrameType) -> None:
+        stack = []
+        current: Optional[FrameType] = frame
+        while current is not None:
+            stack.append(format_frame(current))
+            current = current.f_back
+        stack.append(thread_name)
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
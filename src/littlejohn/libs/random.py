@@ -1,14 +1,29 @@
-from typing import Generator
+import functools
+from typing import Generator, Tuple
 
+_MAX_VALUE = 2 ** 32
 
-def xorshift_32_rand(seed: int) -> Generator[float, None, None]:
+# A 32x32 matrix over GF(2), stored as the images of the 32 basis vectors.
+Matrix = Tuple[int, ...]
+
+
+def xorshift_32_rand(seed: int, skip: int = 0) -> Generator[float, None, None]:
     max_value = 2 ** 32
-    for value in xorshift_32_randint(seed):
+    for value in xorshift_32_randint(seed, skip=skip):
         yield value / max_value
 
 
-def xorshift_32_randint(seed: int) -> Generator[int, None, None]:
-    current_seed = seed
+def xorshift_32_randint(seed: int, skip: int = 0) -> Generator[int, None, None]:
+    """
+    Yields the xorshift sequence starting from `seed`.
+    The first `skip` values are jumped over in O(log skip).
+
+    >>> values = xorshift_32_randint(42)
+    >>> _ = [next(values) for _ in range(1000)]
+    >>> next(values) == next(xorshift_32_randint(42, skip=1000))
+    True
+    """
+    current_seed = xorshift_32_jump(seed, skip)
     max_value = 2 ** 32
     while True:
         current_seed ^= current_seed << 13
@@ -16,3 +31,92 @@ def xorshift_32_randint(seed: int) -> Generator[int, None, None]:
         current_seed ^= current_seed << 5
         current_seed %= max_value
         yield current_seed
+
+
+def xorshift_32_jump(seed: int, steps: int) -> int:
+    """
+    Returns the state reached after `steps` iterations from `seed`,
+    i.e. the `steps`-th value yielded by `xorshift_32_randint(seed)`.
+
+    Every iteration is a linear map over GF(2)^32, so the state after
+    `steps` iterations is the seed multiplied by the matrix of a single
+    iteration raised to `steps`. The powers of two of that matrix are
+    cached, hence a jump costs O(log steps).
+    """
+    if steps < 0:
+        raise ValueError("steps can't be negative")
+
+    if steps == 0:
+        return seed
+
+    # the seed may not fit in 32 bits: the first iteration truncates it
+    state = _xorshift_32(seed)
+    remaining_steps = steps - 1
+    power = 0
+    while remaining_steps:
+        if remaining_steps & 1:
+            state = _multiply(_jump_matrix(power), state)
+        remaining_steps >>= 1
+        power += 1
+    return state
+
+
+def xorshift_32_matrix(steps: int) -> Matrix:
+    """
+    Matrix over GF(2) advancing a 32 bits state by `steps` iterations.
+    Column `i` is the state reached from the state with only bit `i` set.
+    """
+    if steps < 0:
+        raise ValueError("steps can't be negative")
+
+    if steps == 0:
+        return tuple(1 << bit for bit in range(32))
+
+    return _power_matrix(steps)
+
+
+def _xorshift_32(value: int) -> int:
+    value ^= value << 13
+    value ^= value >> 17
+    value ^= value << 5
+    return value % _MAX_VALUE
+
+
+def _multiply(matrix: Matrix, vector: int) -> int:
+    result = 0
+    bit = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[bit]
+        vector >>= 1
+        bit += 1
+    return result
+
+
+def _compose(outer: Matrix, inner: Matrix) -> Matrix:
+    return tuple(_multiply(outer, column) for column in inner)
+
+
+@functools.lru_cache(maxsize=None)
+def _power_matrix(steps: int) -> Matrix:
+    """Matrix advancing the generator by `steps` iterations (`steps` > 0)."""
+    matrix = None
+    power = 0
+    while steps:
+        if steps & 1:
+            jump = _jump_matrix(power)
+            matrix = jump if matrix is None else _compose(jump, matrix)
+        steps >>= 1
+        power += 1
+    assert matrix is not None
+    return matrix
+
+
+@functools.lru_cache(maxsize=None)
+def _jump_matrix(power: int) -> Matrix:
+    """Matrix advancing the generator by 2 ** power iterations."""
+    if power == 0:
+        return tuple(_xorshift_32(1 << bit) for bit in range(32))
+
+    half_jump = _jump_matrix(power - 1)
+    return _compose(half_jump, half_jump)
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypedDict, TypeVar
+
+__all__ = [
+    "SingleFlight",
+    "SingleFlightStats",
+]
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+class SingleFlightStats(TypedDict):
+    calls: int
+    coalesced: int
+    in_flight: int
+
+
+class SingleFlight(Generic[K, T]):
+    """
+    Coalesces concurrent calls with the same key: while a call is in flight,
+    callers with the same key wait for it and share its result, or its
+    exception, instead of starting their own.
+
+    The shared call is not cancelled when a caller is, as the others still
+    wait for it.
+
+    >>> async def main():
+    ...     flights = SingleFlight()
+    ...     async def call():
+    ...         await asyncio.sleep(0)
+    ...         return 42
+    ...     results = await asyncio.gather(*[flights.do("key", call) for _ in "abc"])
+    ...     return results, flights.stats()
+    >>> asyncio.run(main())
+    ([42, 42, 42], {'calls': 3, 'coalesced': 2, 'in_flight': 0})
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[K, "asyncio.Future[T]"] = {}
+        self._calls = 0
+        self._coalesced = 0
+
+    def stats(self) -> SingleFlightStats:
+        return {
+            "calls": self._calls,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._flights),
+        }
+
+    async def do(self, key: K, call: Callable[[], Awaitable[T]]) -> T:
+        self._calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(call())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            self._coalesced += 1
+        return await asyncio.shield(flight)
+
+    def _land(self, key: K, flight: "asyncio.Future[T]") -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,119 @@
+import asyncio
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from littlejohn.adapters.asynchronous import (
+    AsyncPortfolioRepositoryInline,
+    AsyncStockPriceServiceOffloaded,
+    AsyncStockPriceServiceSingleFlight,
+)
+from littlejohn.adapters.portfolio_repository import PortfolioRepositoryGenerator
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+
+TODAY = datetime.date(2021, 11, 12)
+SEEDS = [
+    {
+        "symbol": f"TEST-{i}",
+        "price": Decimal(100 + i),
+        "forward_rand_seed": 2 ** 31 + i,
+        "backward_rand_seed": 2 ** 32 - 1 - i,
+    }
+    for i in range(3)
+]
+
+
+def test_inline_portfolio_repository_returns_portfolio():
+    repository = PortfolioRepositoryGenerator(
+        stocks={s["symbol"] for s in SEEDS},
+        min_stocks_in_portfolio=1,
+        max_stocks_in_portfolio=3,
+    )
+    portfolio = asyncio.run(
+        AsyncPortfolioRepositoryInline(repository).get_user_portfolio("user")
+    )
+    assert repository.get_user_portfolio("user") == portfolio
+
+
+def test_offloaded_stock_price_service_runs_in_executor(mocker):
+    walker = StockPriceServiceRandomWalker(
+        zero_date=TODAY,
+        seeds=SEEDS,
+        gain=Decimal("0.1"),
+    )
+    threads = []
+    get_history = walker.get_history
+
+    def spy(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return get_history(*args, **kwargs)
+
+    mocker.patch.object(walker, "get_history", spy)
+    symbols = [s["symbol"] for s in SEEDS]
+    with ThreadPoolExecutor(thread_name_prefix="prices") as executor:
+        service = AsyncStockPriceServiceOffloaded(walker, executor=executor)
+        history = asyncio.run(
+            service.get_history(symbols=symbols, start_from=TODAY, length=90)
+        )
+
+    assert 1 == len(threads)
+    assert threads[0].startswith("prices")
+    assert get_history(symbols, start_from=TODAY, length=90) == history
+
+
+def test_single_flight_stock_price_service_coalesces_identical_requests(mocker):
+    walker = StockPriceServiceRandomWalker(
+        zero_date=TODAY,
+        seeds=SEEDS,
+        gain=Decimal("0.1"),
+    )
+    spy = mocker.spy(walker, "get_history")
+    service = AsyncStockPriceServiceSingleFlight(
+        AsyncStockPriceServiceOffloaded(walker)
+    )
+    symbols = [s["symbol"] for s in SEEDS]
+
+    async def main():
+        return await asyncio.gather(
+            *[
+                service.get_history(symbols=symbols, start_from=TODAY, length=90)
+                for _ in range(10)
+            ],
+            service.get_history(symbols=symbols[:1], start_from=TODAY, length=90),
+        )
+
+    *histories, other_history = asyncio.run(main())
+    assert all(history is histories[0] for history in histories)
+    assert symbols[:1] == list(other_history.prices)
+    assert 2 == spy.call_count
+    assert {"calls": 11, "coalesced": 9, "in_flight": 0} == service.stats()
+
+
+def test_offloaded_stock_price_service_counts_queued_calls():
+    started = threading.Event()
+    release = threading.Event()
+
+    class BlockingStub:
+        def get_history(self, symbols, start_from, length):
+            started.set()
+            release.wait()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        service = AsyncStockPriceServiceOffloaded(BlockingStub(), executor=executor)
+
+        async def main():
+            calls = [
+                asyncio.ensure_future(
+                    service.get_history(symbols=[], start_from=TODAY, length=1)
+                )
+                for _ in range(3)
+            ]
+            await asyncio.get_running_loop().run_in_executor(None, started.wait)
+            stats = service.stats()
+            release.set()
+            await asyncio.gather(*calls)
+            return stats
+
+        assert {"pending": 3, "queued": 2} == asyncio.run(main())
+        assert {"pending": 0, "queued": 0} == service.stats()
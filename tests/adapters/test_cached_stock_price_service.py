@@ -0,0 +1,154 @@
+import datetime
+import random
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+
+from littlejohn.adapters.cached_stock_price_service import (
+    StockPriceServiceCache,
+    estimate_size,
+)
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+
+TODAY = datetime.date.today()
+SEEDS = [
+    {
+        "symbol": f"TEST-{i}",
+        "price": Decimal(random.randrange(100, 150)),
+        "forward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+        "backward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+    }
+    for i in range(5)
+]
+SYMBOLS = [s["symbol"] for s in SEEDS]
+
+
+@pytest.fixture
+def walker():
+    return StockPriceServiceRandomWalker(
+        zero_date=TODAY,
+        seeds=SEEDS,
+        gain=Decimal("0.1"),
+    )
+
+
+@pytest.fixture
+def make_cache(walker):
+    def make(
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        get_today_utc=lambda: TODAY,
+    ) -> StockPriceServiceCache:
+        return StockPriceServiceCache(
+            stock_price_service=walker,
+            get_today_utc=get_today_utc,
+            max_entries=max_entries if max_entries is not None else 100,
+            max_bytes=max_bytes if max_bytes is not None else 2 ** 30,
+        )
+
+    return make
+
+
+def describe_stock_price_service_cache():
+    @pytest.mark.parametrize("length", [0, 1, 90])
+    @pytest.mark.parametrize(
+        "symbols",
+        [
+            pytest.param([], id="no symbol"),
+            pytest.param(SYMBOLS[:1], id="single symbol"),
+            pytest.param(SYMBOLS, id="all symbols"),
+            pytest.param([*SYMBOLS[:2], "unknown"], id="unknown symbol"),
+        ],
+    )
+    def returns_history_of_wrapped_service(make_cache, walker, symbols, length):
+        cache = make_cache()
+        expected = walker.get_history(symbols, start_from=TODAY, length=length)
+        for _ in range(2):
+            history = cache.get_history(symbols, start_from=TODAY, length=length)
+            assert expected.dates() == history.dates()
+            assert expected.prices == {
+                symbol: list(prices) for symbol, prices in history.prices.items()
+            }
+
+    def computes_only_missing_symbols(make_cache, walker, mocker):
+        spy = mocker.spy(walker, "get_history")
+        cache = make_cache()
+        cache.get_history(SYMBOLS[:2], start_from=TODAY, length=90)
+        cache.get_history(SYMBOLS[:3], start_from=TODAY, length=90)
+        cache.get_history(SYMBOLS[:3], start_from=TODAY, length=90)
+
+        assert [
+            mocker.call(symbols=SYMBOLS[:2], start_from=TODAY, length=90),
+            mocker.call(symbols=SYMBOLS[2:3], start_from=TODAY, length=90),
+        ] == spy.call_args_list
+        assert {"hits": 5, "misses": 3, "entries": 3} == {
+            k: v
+            for k, v in cache.stats().items()
+            if k in {"hits", "misses", "entries"}
+        }
+
+    def different_ranges_are_different_entries(make_cache, walker, mocker):
+        spy = mocker.spy(walker, "get_history")
+        cache = make_cache()
+        cache.get_history(SYMBOLS[:1], start_from=TODAY, length=90)
+        cache.get_history(SYMBOLS[:1], start_from=TODAY, length=1)
+        cache.get_history(
+            SYMBOLS[:1],
+            start_from=TODAY - datetime.timedelta(days=1),
+            length=1,
+        )
+        assert 3 == spy.call_count
+
+    def evicts_least_recently_used_entries_over_max_entries(
+        make_cache,
+        walker,
+        mocker,
+    ):
+        cache = make_cache(max_entries=2)
+        for symbol in [SYMBOLS[0], SYMBOLS[1], SYMBOLS[0], SYMBOLS[2]]:
+            cache.get_history([symbol], start_from=TODAY, length=1)
+
+        spy = mocker.spy(walker, "get_history")
+        cache.get_history(SYMBOLS[:1], start_from=TODAY, length=1)
+        cache.get_history(SYMBOLS[1:2], start_from=TODAY, length=1)
+        assert [
+            mocker.call(symbols=SYMBOLS[1:2], start_from=TODAY, length=1)
+        ] == spy.call_args_list
+        assert 2 == cache.stats()["evictions"]
+
+    def evicts_least_recently_used_entries_over_max_bytes(make_cache, walker):
+        entry = walker.get_history(SYMBOLS[:1], start_from=TODAY, length=90)
+        entry_size = estimate_size(tuple(entry.prices[SYMBOLS[0]]))
+        cache = make_cache(max_bytes=entry_size * 3 + entry_size // 2)
+        for symbol in SYMBOLS:
+            cache.get_history([symbol], start_from=TODAY, length=90)
+
+        stats = cache.stats()
+        assert 2 == stats["evictions"]
+        assert 3 == stats["entries"]
+        assert stats["bytes"] <= entry_size * 3 + entry_size // 2
+
+    def is_invalidated_when_day_changes(make_cache, walker, mocker):
+        today = [TODAY]
+        cache = make_cache(get_today_utc=lambda: today[0])
+        cache.get_history(SYMBOLS, start_from=TODAY, length=1)
+
+        today[0] = TODAY + datetime.timedelta(days=1)
+        spy = mocker.spy(walker, "get_history")
+        cache.get_history(SYMBOLS, start_from=TODAY, length=1)
+        assert 1 == spy.call_count
+        assert 1 == cache.stats()["invalidations"]
+        assert len(SYMBOLS) == cache.stats()["entries"]
+
+
+@pytest.mark.parametrize(
+    "params, err_msg",
+    [
+        pytest.param({"max_entries": 0}, "max_entries must be positive"),
+        pytest.param({"max_bytes": 0}, "max_bytes must be positive"),
+    ],
+)
+def test_params_validation(make_cache, params, err_msg):
+    with pytest.raises(ValueError, match=err_msg):
+        make_cache(**params)
@@ -220,3 +220,19 @@ def test_generator_get_portfolio(make_repository, snapshot):
 def test_params_validation(make_repository, params, err_msg):
     with pytest.raises(ValueError, match=err_msg):
         make_repository(**params)
+
+
+@pytest.mark.parametrize(
+    "username",
+    [
+        pytest.param("8f14e45fceea167a5a36dedd4bea2543", id="hexadecimal"),
+        pytest.param("😀" * 100, id="outside of the table"),
+    ],
+)
+def test_generator_returns_same_portfolio_on_each_call(make_repository, username):
+    repository = make_repository()
+    portfolio = repository.get_user_portfolio(username=username)
+    expected = list(portfolio)
+    portfolio.clear()
+    assert expected == repository.get_user_portfolio(username=username)
+    assert expected == make_repository().get_user_portfolio(username=username)
@@ -0,0 +1,114 @@
+import datetime
+import random
+from decimal import Decimal
+
+import pytest
+
+from littlejohn.adapters.price_table import (
+    StockPriceServicePriceTable,
+    write_price_table,
+)
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+from littlejohn.domain.entities import encode_price
+
+ZERO_DATE = datetime.date.today()
+FIRST_DATE = ZERO_DATE - datetime.timedelta(days=200)
+DAYS = 400
+SEEDS = [
+    {
+        "symbol": f"TEST-{i}",
+        "price": Decimal(random.randrange(100, 150)),
+        "forward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+        "backward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+    }
+    for i in range(6)
+]
+SYMBOLS = [s["symbol"] for s in SEEDS]
+# the last symbol is only known to the fallback
+TABLE_SYMBOLS = SYMBOLS[:-1]
+
+
+def make_walker(seeds=SEEDS):
+    return StockPriceServiceRandomWalker(
+        zero_date=ZERO_DATE,
+        seeds=seeds,
+        gain=Decimal("0.1"),
+    )
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    path = tmp_path / "prices.bin"
+    with open(path, "wb") as file:
+        write_price_table(
+            file,
+            stock_price_service=make_walker(),
+            symbols=TABLE_SYMBOLS,
+            first_date=FIRST_DATE,
+            days=DAYS,
+        )
+    return str(path)
+
+
+def encode_history(history):
+    return history.dates(), {
+        symbol: [encode_price(price) for price in prices]
+        for symbol, prices in history.prices.items()
+    }
+
+
+def describe_price_table():
+    @pytest.mark.parametrize("length", [0, 1, 90, DAYS])
+    @pytest.mark.parametrize(
+        "start_from",
+        [
+            pytest.param(FIRST_DATE + datetime.timedelta(days=DAYS - 1), id="last"),
+            pytest.param(ZERO_DATE, id="middle"),
+            pytest.param(FIRST_DATE + datetime.timedelta(days=89), id="first"),
+            pytest.param(FIRST_DATE + datetime.timedelta(days=DAYS), id="after"),
+            pytest.param(FIRST_DATE, id="across first date"),
+        ],
+    )
+    @pytest.mark.parametrize(
+        "symbols",
+        [
+            pytest.param(TABLE_SYMBOLS, id="symbols in table"),
+            pytest.param(SYMBOLS[-2:], id="symbol not in table"),
+            pytest.param([*SYMBOLS[:1], "unknown"], id="unknown symbol"),
+        ],
+    )
+    def returns_same_prices_of_source_at_cent_precision(
+        table_path,
+        symbols,
+        start_from,
+        length,
+    ):
+        walker = make_walker()
+        table = StockPriceServicePriceTable(path=table_path, fallback=walker)
+        expected = walker.get_history(symbols, start_from=start_from, length=length)
+        history = table.get_history(symbols, start_from=start_from, length=length)
+        assert expected.dates() == history.dates()
+        assert encode_history(expected) == encode_history(history)
+
+    def refuses_fallback_with_different_prices(table_path):
+        seeds = [{**s, "price": s["price"] + 1} for s in SEEDS]
+        with pytest.raises(ValueError, match="does not match"):
+            StockPriceServicePriceTable(path=table_path, fallback=make_walker(seeds))
+
+    def refuses_files_that_are_not_price_tables(tmp_path):
+        path = tmp_path / "prices.bin"
+        path.write_bytes(b"\0" * 1024)
+        with pytest.raises(ValueError, match="is not a price table"):
+            StockPriceServicePriceTable(path=str(path), fallback=make_walker())
+
+
+def test_write_requires_positive_days(tmp_path):
+    with open(tmp_path / "prices.bin", "wb") as file:
+        with pytest.raises(ValueError, match="days must be positive"):
+            write_price_table(
+                file,
+                stock_price_service=make_walker(),
+                symbols=SYMBOLS,
+                first_date=FIRST_DATE,
+                days=0,
+            )
@@ -1,7 +1,7 @@
 import datetime
 import random
 from decimal import Decimal
-from typing import List, Optional
+from typing import Generator, List, Optional
 
 import pytest
 
@@ -9,6 +9,8 @@ from littlejohn.adapters.stock_price_service import (
     StockPriceGeneratorSeeds,
     StockPriceServiceRandomWalker,
 )
+from littlejohn.domain.entities import encode_price
+from littlejohn.libs.random import xorshift_32_rand
 
 ZERO_DATE = datetime.date.today()
 SEEDS = [
@@ -22,17 +24,42 @@ SEEDS = [
 ]
 
 
+def random_walk(
+    rand: Generator[float, None, None],
+    initial_value: Decimal,
+    gain: Decimal,
+    iterations: int,
+) -> List[Decimal]:
+    walk: List[Decimal] = []
+    current_value = initial_value
+    for _ in range(iterations):
+        sign = Decimal("-1") if next(rand) < 0.5 else Decimal("1")
+        current_value = current_value + sign * gain * current_value
+        walk = [*walk, current_value]
+    return walk
+
+
 @pytest.fixture
 def make_service():
     def make(
         zero_date: Optional[datetime.date] = None,
         seeds: Optional[List[StockPriceGeneratorSeeds]] = None,
         gain: Optional[Decimal] = None,
+        checkpoint_interval: Optional[int] = None,
+        max_checkpoints: Optional[int] = None,
+        move_bitmap_horizon: Optional[int] = None,
     ) -> StockPriceServiceRandomWalker:
         return StockPriceServiceRandomWalker(
             zero_date=zero_date if zero_date is not None else ZERO_DATE,
             seeds=seeds if seeds is not None else SEEDS,
             gain=gain if gain is not None else Decimal("0.1"),
+            checkpoint_interval=(
+                checkpoint_interval if checkpoint_interval is not None else 64
+            ),
+            max_checkpoints=max_checkpoints if max_checkpoints is not None else 1024,
+            move_bitmap_horizon=(
+                move_bitmap_horizon if move_bitmap_horizon is not None else 0
+            ),
         )
 
     return make
@@ -90,8 +117,7 @@ def describe_random_walk_generator_get_history():
             start_from=start_date,
             length=length,
         )
-        for date, prices in history.items():
-            assert set(symbols) == set(prices.keys())
+        assert set(symbols) == set(history.prices.keys())
 
     @pytest.mark.parametrize("symbols", SYMBOLS_TEST_PARAMS)
     @pytest.mark.parametrize("start_date", START_DATE_TEST_PARAMS)
@@ -105,7 +131,7 @@ def describe_random_walk_generator_get_history():
         expected_dates = {
             start_date - datetime.timedelta(days=i) for i in range(length)
         }
-        assert expected_dates == set(history.keys())
+        assert expected_dates == set(history.dates())
 
     @pytest.mark.parametrize("symbols", SYMBOLS_TEST_PARAMS)
     def price_at_given_date_remains_the_same_even_if_generate_from_different_instances(
@@ -129,8 +155,8 @@ def describe_random_walk_generator_get_history():
             length=period_after_zero_date.days,
         )
 
-        for date, prices in history_after_zero_date.items():
-            assert prices == all_history[date]
+        for symbol, prices in history_after_zero_date.prices.items():
+            assert prices == all_history.prices[symbol][: period_after_zero_date.days]
 
         history_before_zero_date = make_service().get_history(
             symbols=symbols,
@@ -138,5 +164,122 @@ def describe_random_walk_generator_get_history():
             length=period_before_zero_date.days,
         )
 
-        for date, prices in history_before_zero_date.items():
-            assert prices == all_history[date]
+        # ZERO_DATE is the first date before the period after it
+        for symbol, prices in history_before_zero_date.prices.items():
+            assert prices == all_history.prices[symbol][period_after_zero_date.days :]
+
+    @pytest.mark.parametrize("checkpoint_interval", [1, 7, 64, 10_000])
+    @pytest.mark.parametrize("start_date", START_DATE_TEST_PARAMS)
+    def history_does_not_depend_on_checkpoint_interval(
+        make_service,
+        checkpoint_interval,
+        start_date,
+    ):
+        symbols = [s["symbol"] for s in SEEDS]
+        expected = make_service(checkpoint_interval=1_000_000).get_history(
+            symbols=symbols,
+            start_from=start_date,
+            length=180,
+        )
+        service = make_service(checkpoint_interval=checkpoint_interval)
+        # the first call builds the checkpoints, the second one reuses them
+        for _ in range(2):
+            history = service.get_history(
+                symbols=symbols,
+                start_from=start_date,
+                length=180,
+            )
+            assert expected == history
+
+    @pytest.mark.parametrize("max_checkpoints", [1, 2, 3, 10])
+    @pytest.mark.parametrize("start_date", START_DATE_TEST_PARAMS)
+    def history_does_not_depend_on_max_checkpoints(
+        make_service,
+        max_checkpoints,
+        start_date,
+    ):
+        symbols = [s["symbol"] for s in SEEDS]
+        expected = make_service().get_history(
+            symbols=symbols,
+            start_from=start_date,
+            length=180,
+        )
+        service = make_service(checkpoint_interval=7, max_checkpoints=max_checkpoints)
+        for _ in range(2):
+            history = service.get_history(
+                symbols=symbols,
+                start_from=start_date,
+                length=180,
+            )
+            assert expected == history
+
+    def drops_every_other_checkpoint_over_max_checkpoints(make_service):
+        service = make_service(checkpoint_interval=10, max_checkpoints=4)
+        seed = random.choice(SEEDS)
+        service.get_history(
+            symbols=[seed["symbol"]],
+            start_from=ZERO_DATE + datetime.timedelta(days=100),
+            length=1,
+        )
+
+        forward, _ = service.walks[seed["symbol"]]
+        # checkpoints at 0, 10, 20, 30, 40, then 0, 20, 40, 60, 80, then 0, 40, 80
+        assert 40 == forward.interval
+        assert [0, 40, 80] == [
+            step * forward.interval for step in range(len(forward.checkpoints))
+        ]
+
+    def walk_matches_reference_random_walk(make_service):
+        seed = random.choice(SEEDS)
+        expected = random_walk(
+            rand=xorshift_32_rand(seed["forward_rand_seed"]),
+            initial_value=seed["price"],
+            gain=Decimal("0.1"),
+            iterations=200,
+        )
+        history = make_service().get_history(
+            symbols=[seed["symbol"]],
+            start_from=ZERO_DATE + datetime.timedelta(days=200),
+            length=200,
+        )
+        # the history is in descending date order
+        assert expected == list(reversed(history.prices[seed["symbol"]]))
+
+    @pytest.mark.parametrize("move_bitmap_horizon", [1, 64, 365, 365 * 30])
+    @pytest.mark.parametrize("start_date", START_DATE_TEST_PARAMS)
+    def move_bitmaps_return_same_prices_at_cent_precision(
+        make_service,
+        move_bitmap_horizon,
+        start_date,
+    ):
+        symbols = [s["symbol"] for s in SEEDS]
+        expected = make_service().get_history(
+            symbols=symbols,
+            start_from=start_date,
+            length=180,
+        )
+        history = make_service(move_bitmap_horizon=move_bitmap_horizon).get_history(
+            symbols=symbols,
+            start_from=start_date,
+            length=180,
+        )
+        assert expected.dates() == history.dates()
+        for symbol, prices in expected.prices.items():
+            assert [encode_price(p) for p in prices] == [
+                encode_price(p) for p in history.prices[symbol]
+            ]
+
+
+def test_checkpoint_interval_must_be_positive(make_service):
+    with pytest.raises(ValueError, match="checkpoint_interval must be positive"):
+        make_service(checkpoint_interval=0)
+
+
+def test_max_checkpoints_must_be_positive(make_service):
+    with pytest.raises(ValueError, match="max_checkpoints must be positive"):
+        make_service(max_checkpoints=0)
+
+
+def test_move_bitmap_horizon_can_not_be_negative(make_service):
+    with pytest.raises(ValueError, match="move_bitmap_horizon can't be negative"):
+        make_service(move_bitmap_horizon=-1)
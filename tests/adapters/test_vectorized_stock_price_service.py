@@ -0,0 +1,81 @@
+import datetime
+import random
+from decimal import Decimal
+
+import pytest
+
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+from littlejohn.domain.entities import encode_price
+
+pytest.importorskip("numpy")
+
+from littlejohn.adapters.vectorized_stock_price_service import (  # noqa: E402
+    StockPriceServiceVectorized,
+)
+
+ZERO_DATE = datetime.date.today()
+SEEDS = [
+    {
+        "symbol": f"TEST-{i}",
+        "price": Decimal(random.randrange(100, 150)),
+        "forward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+        "backward_rand_seed": random.randrange(2 ** 31, 2 ** 32),
+    }
+    for i in range(random.randrange(5, 10))
+]
+
+
+def encode_history(history):
+    return history.dates(), {
+        symbol: [encode_price(price) for price in prices]
+        for symbol, prices in history.prices.items()
+    }
+
+
+@pytest.mark.parametrize("gain", [Decimal("0.05"), Decimal("0.1")])
+@pytest.mark.parametrize("length", [0, 1, 90, 180])
+@pytest.mark.parametrize(
+    "start_date",
+    [
+        pytest.param(ZERO_DATE, id="zero date"),
+        pytest.param(ZERO_DATE + datetime.timedelta(days=45), id="across zero date"),
+        pytest.param(
+            ZERO_DATE + datetime.timedelta(days=365 * 11),
+            id="~11 years after zero date",
+        ),
+        pytest.param(
+            ZERO_DATE - datetime.timedelta(days=365 * 11),
+            id="~11 years before zero date",
+        ),
+    ],
+)
+def test_history_is_identical_to_random_walker_at_cent_precision(
+    gain,
+    length,
+    start_date,
+):
+    symbols = [s["symbol"] for s in random.sample(SEEDS, k=len(SEEDS) - 1)]
+    reference = StockPriceServiceRandomWalker(
+        zero_date=ZERO_DATE,
+        seeds=SEEDS,
+        gain=gain,
+    )
+    vectorized = StockPriceServiceVectorized(
+        zero_date=ZERO_DATE,
+        seeds=SEEDS,
+        gain=gain,
+    )
+    expected = reference.get_history(symbols, start_from=start_date, length=length)
+    history = vectorized.get_history(symbols, start_from=start_date, length=length)
+    assert expected.dates() == history.dates()
+    assert encode_history(expected) == encode_history(history)
+
+
+@pytest.mark.parametrize("key", ["forward_rand_seed", "backward_rand_seed"])
+def test_seeds_must_fit_32_bits(key):
+    with pytest.raises(ValueError, match=f"{key} must be a 32 bits integer"):
+        StockPriceServiceVectorized(
+            zero_date=ZERO_DATE,
+            seeds=[{**SEEDS[0], key: 2 ** 32}],
+            gain=Decimal("0.1"),
+        )
@@ -1,7 +1,15 @@
+import datetime
 import json
 from decimal import Decimal
 
-from littlejohn.domain.entities import StockPrice
+import pydantic
+import pytest
+
+from littlejohn.domain.entities import (
+    HistoricalPrices,
+    StockPrice,
+    StockPriceHistoryCursor,
+)
 
 
 def describe_stock_price():
@@ -17,3 +25,62 @@ def describe_stock_price():
             }
         )
         assert expected_json == stock_price.json()
+
+
+def describe_historical_prices():
+    def dates_are_in_descending_order():
+        history = HistoricalPrices(
+            start_from=datetime.date(2021, 11, 12),
+            length=2,
+            prices={
+                "OUCH": [Decimal("1.10"), Decimal("1.00")],
+                "AUCH": [Decimal("2.20"), Decimal("2.00")],
+            },
+        )
+        assert [datetime.date(2021, 11, 12), datetime.date(2021, 11, 11)] == (
+            history.dates()
+        )
+
+
+def describe_stock_price_history_cursor():
+    def pages_are_contiguous():
+        cursor = StockPriceHistoryCursor(start_from=datetime.date(2021, 11, 12))
+        assert 90 == cursor.page_length()
+        assert (
+            StockPriceHistoryCursor(start_from=datetime.date(2021, 8, 14))
+            == cursor.next_page()
+        )
+
+    def pages_stop_at_until():
+        cursor = StockPriceHistoryCursor(
+            start_from=datetime.date(2021, 11, 12),
+            length=7,
+            until=datetime.date(2021, 11, 3),
+        )
+        assert 7 == cursor.page_length()
+        last_page = cursor.next_page()
+        assert last_page is not None
+        assert 3 == last_page.page_length()
+        assert last_page.next_page() is None
+
+    def pages_stop_at_the_first_date():
+        cursor = StockPriceHistoryCursor(
+            start_from=datetime.date.min + datetime.timedelta(days=4),
+        )
+        assert 5 == cursor.page_length()
+        assert cursor.next_page() is None
+
+        bounded_cursor = cursor.copy(update={"until": datetime.date.min})
+        assert bounded_cursor.next_page() is None
+
+    @pytest.mark.parametrize(
+        "fields",
+        [
+            pytest.param({"length": 0}, id="empty page"),
+            pytest.param({"length": 1001}, id="page too long"),
+            pytest.param({"until": datetime.date(2021, 11, 13)}, id="reversed range"),
+        ],
+    )
+    def rejects_invalid_pages(fields):
+        with pytest.raises(pydantic.ValidationError):
+            StockPriceHistoryCursor(start_from=datetime.date(2021, 11, 12), **fields)
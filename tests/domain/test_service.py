@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+from decimal import Decimal
+
+from littlejohn.adapters.asynchronous import (
+    AsyncPortfolioRepositoryInline,
+    AsyncStockPriceServiceOffloaded,
+)
+from littlejohn.adapters.portfolio_repository import PortfolioRepositoryGenerator
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+from littlejohn.domain.entities import StockPriceHistoryCursor
+from littlejohn.domain.service import AsyncStockService
+from littlejohn.libs.prefetch import Prefetcher
+
+TODAY = datetime.date(2021, 11, 12)
+SYMBOLS = {"AAPL", "MSFT"}
+
+
+def make_service():
+    return AsyncStockService(
+        portfolio_repository=AsyncPortfolioRepositoryInline(
+            PortfolioRepositoryGenerator(
+                stocks=SYMBOLS,
+                min_stocks_in_portfolio=1,
+                max_stocks_in_portfolio=2,
+            )
+        ),
+        stock_price_service=AsyncStockPriceServiceOffloaded(
+            StockPriceServiceRandomWalker(
+                zero_date=TODAY,
+                seeds=[
+                    {
+                        "symbol": symbol,
+                        "price": Decimal(100),
+                        "forward_rand_seed": 2 ** 31 + i,
+                        "backward_rand_seed": 2 ** 31 - i,
+                    }
+                    for i, symbol in enumerate(sorted(SYMBOLS))
+                ],
+                gain=Decimal("0.05"),
+            )
+        ),
+        get_today_utc=lambda: TODAY,
+        allowed_stock_symbols=SYMBOLS,
+    )
+
+
+def describe_async_stock_service():
+    def coalesces_concurrent_requests_of_the_same_page(mocker):
+        service = make_service()
+        spy = mocker.spy(service.stock_price_service, "get_history")
+        cursor = StockPriceHistoryCursor(start_from=TODAY)
+
+        async def main():
+            return await asyncio.gather(
+                service.get_historical_price_columns(symbol="AAPL"),
+                service.get_historical_price_columns(symbol="AAPL", cursor=cursor),
+                service.get_historical_price_columns(symbol="MSFT"),
+            )
+
+        first, second, other = asyncio.run(main())
+        assert first is second
+        assert first.prices != other.prices
+        assert 2 == spy.call_count
+        assert 1 == service.history_flights.stats()["coalesced"]
+
+    def historical_prices_are_built_from_columns():
+        service = make_service()
+
+        async def main():
+            return await asyncio.gather(
+                service.get_historical_prices(symbol="AAPL"),
+                service.get_historical_price_columns(symbol="AAPL"),
+            )
+
+        history, columns = asyncio.run(main())
+        assert columns.next == history.next
+        assert list(zip(columns.dates, columns.prices)) == [
+            (d.date, d.price) for d in history.data
+        ]
+
+    def iterates_historical_prices_in_chunks(mocker):
+        service = make_service()
+        spy = mocker.spy(service.stock_price_service, "get_history")
+        first = TODAY - datetime.timedelta(days=99)
+
+        async def main():
+            return [
+                history
+                async for history in service.iter_historical_prices(
+                    symbols=["AAPL", "unknown"],
+                    first=first,
+                    last=TODAY,
+                    chunk_length=40,
+                )
+            ]
+
+        chunks = asyncio.run(main())
+        assert [40, 40, 20] == [call.kwargs["length"] for call in spy.call_args_list]
+        expected = asyncio.run(
+            service.stock_price_service.get_history(
+                symbols=["AAPL"],
+                start_from=TODAY,
+                length=100,
+            )
+        )
+        assert expected.dates() == [
+            date for history in chunks for date in history.dates()
+        ]
+        assert list(expected.prices["AAPL"]) == [
+            price for history in chunks for price in history.prices["AAPL"]
+        ]
+
+    def iterates_historical_prices_from_the_export_price_service(mocker):
+        service = make_service()
+        service.export_price_service = make_service().stock_price_service
+        spy = mocker.spy(service.stock_price_service, "get_history")
+        export_spy = mocker.spy(service.export_price_service, "get_history")
+
+        async def main():
+            return [
+                history
+                async for history in service.iter_historical_prices(
+                    symbols=["AAPL"],
+                    first=TODAY - datetime.timedelta(days=9),
+                    last=TODAY,
+                )
+            ]
+
+        asyncio.run(main())
+        assert 1 == export_spy.call_count
+        spy.assert_not_called()
+
+    def iterates_historical_prices_down_to_the_first_date():
+        service = make_service()
+        first = datetime.date.min
+
+        async def main():
+            return [
+                history
+                async for history in service.iter_historical_prices(
+                    symbols=["unknown"],
+                    first=first,
+                    last=first + datetime.timedelta(days=4),
+                    chunk_length=2,
+                )
+            ]
+
+        chunks = asyncio.run(main())
+        assert [2, 2, 1] == [history.length for history in chunks]
+        assert first == chunks[-1].dates()[-1]
+
+    def serves_next_pages_from_the_prefetcher(mocker):
+        service = make_service()
+        service.history_prefetcher = Prefetcher(max_concurrency=1, max_entries=4)
+        spy = mocker.spy(service.stock_price_service, "get_history")
+
+        async def main():
+            first = await service.get_historical_price_columns(symbol="AAPL")
+            second = await service.get_historical_price_columns(
+                symbol="AAPL",
+                cursor=first.next,
+            )
+            return first, second
+
+        first, second = asyncio.run(main())
+        assert first.next.start_from == second.dates[0]
+        assert first.next.start_from - datetime.timedelta(days=90) == (
+            spy.call_args_list[2].kwargs["start_from"]
+        )
+        assert 1 == service.history_prefetcher.stats()["hits"]
+        assert 3 == spy.call_count
+
+    def observes_the_stages_of_the_requests():
+        service = make_service()
+        stages = []
+        service.observe_stage = lambda stage, seconds: stages.append(stage)
+
+        asyncio.run(service.get_portfolio_historical_prices(username="user"))
+        assert ["portfolio", "prices", "models"] == stages
+
+    def reports_prefetched_pages_as_a_separate_stage():
+        service = make_service()
+        service.history_prefetcher = Prefetcher(max_concurrency=1, max_entries=4)
+        stages = []
+        service.observe_stage = lambda stage, seconds: stages.append(stage)
+
+        async def main():
+            first = await service.get_historical_price_columns(symbol="AAPL")
+            await service.get_historical_price_columns(
+                symbol="AAPL",
+                cursor=first.next,
+            )
+
+        asyncio.run(main())
+        assert ["prices", "prefetch"] == stages[:2]
+        assert "prices" not in stages[1:]
@@ -1,24 +1,35 @@
 import datetime
+import json
 import random
+import struct
 from decimal import Decimal
-from typing import List, Mapping, Optional
+from typing import Callable, List, Mapping, Optional
 from uuid import uuid4
 
 import pytest
 from fastapi.testclient import TestClient
 
+from littlejohn.adapters.asynchronous import (
+    AsyncPortfolioRepositoryInline,
+    AsyncStockPriceServiceOffloaded,
+)
 from littlejohn.domain.entities import (
     HistoricalPrices,
     PriceAtDate,
     StockPrice,
+    StockPriceHistoryCursor,
     StockSymbol,
 )
 from littlejohn.domain.service import (
+    AsyncStockService,
     PortfolioRepository,
+    StageObserver,
     StockPriceService,
-    StockService,
+    ignore_stage,
 )
-from littlejohn.entrypoints.asgi import api
+from littlejohn.entrypoints.asgi import api, timing
+from littlejohn.entrypoints.asgi.metrics import Metrics
+from littlejohn.entrypoints.asgi.response_cache import ResponseCache
 
 
 @pytest.fixture
@@ -29,8 +40,11 @@ def today():
 ALLOWED_STOCK_SYMBOLS = [f"TEST-{n}" for n in range(23)]
 
 
+PricesByDate = Mapping[datetime.date, Mapping[StockSymbol, Decimal]]
+
+
 class StockPriceServiceStub(StockPriceService):
-    def __init__(self, historical_prices: HistoricalPrices):
+    def __init__(self, historical_prices: PricesByDate):
         self.historical_prices = historical_prices
 
     def get_history(
@@ -39,11 +53,15 @@ class StockPriceServiceStub(StockPriceService):
         start_from: datetime.date,
         length: int,
     ) -> HistoricalPrices:
-        dates = (start_from - datetime.timedelta(days=d) for d in range(length))
-        return {
-            date: {symbol: self.historical_prices[date][symbol] for symbol in symbols}
-            for date in dates
-        }
+        dates = [start_from - datetime.timedelta(days=d) for d in range(length)]
+        return HistoricalPrices(
+            start_from=start_from,
+            length=length,
+            prices={
+                symbol: [self.historical_prices[date][symbol] for date in dates]
+                for symbol in symbols
+            },
+        )
 
 
 class PortfolioRepositoryStub(PortfolioRepository):
@@ -58,19 +76,55 @@ class PortfolioRepositoryStub(PortfolioRepository):
 def make_service(today):
     def make(
         portfolio_repository: PortfolioRepository = None,
-        historical_prices: Optional[HistoricalPrices] = None,
-    ) -> StockService:
-        return StockService(
-            portfolio_repository=(
+        historical_prices: Optional[PricesByDate] = None,
+        observe_stage: StageObserver = ignore_stage,
+    ) -> AsyncStockService:
+        return AsyncStockService(
+            portfolio_repository=AsyncPortfolioRepositoryInline(
                 portfolio_repository or PortfolioRepositoryStub(portfolios={})
             ),
-            stock_price_service=StockPriceServiceStub(
-                historical_prices=historical_prices
-                if historical_prices is not None
-                else {}
+            stock_price_service=AsyncStockPriceServiceOffloaded(
+                StockPriceServiceStub(
+                    historical_prices=historical_prices
+                    if historical_prices is not None
+                    else {}
+                )
             ),
             get_today_utc=lambda: today,
             allowed_stock_symbols=set(ALLOWED_STOCK_SYMBOLS),
+            observe_stage=observe_stage,
+        )
+
+    return make
+
+
+@pytest.fixture
+def make_stub_service(make_service):
+    def make(today: datetime.date, symbol: StockSymbol) -> AsyncStockService:
+        return make_service(
+            historical_prices={
+                today - datetime.timedelta(days=d): {symbol: Decimal(100 + d)}
+                for d in range(180)
+            },
+        )
+
+    return make
+
+
+@pytest.fixture
+def make_first_dates_service(make_service):
+    """Prices of the first 10 days of the calendar, from 0001-01-01."""
+
+    def make(portfolio_repository: PortfolioRepository = None) -> AsyncStockService:
+        return make_service(
+            portfolio_repository=portfolio_repository,
+            historical_prices={
+                datetime.date.min
+                + datetime.timedelta(days=d): {
+                    symbol: Decimal(1) for symbol in ALLOWED_STOCK_SYMBOLS
+                }
+                for d in range(10)
+            },
         )
 
     return make
@@ -89,8 +143,20 @@ def make_auth():
 
 @pytest.fixture
 def make_client(make_service):
-    def make(service: StockService = None):
-        app = api.create(service=service or make_service())
+    def make(
+        service: AsyncStockService = None,
+        response_cache: Optional[ResponseCache] = None,
+        metrics: Optional[Metrics] = None,
+        server_timing: bool = True,
+        is_ready: Callable[[], bool] = api.always_ready,
+    ):
+        app = api.create(
+            service=service or make_service(),
+            response_cache=response_cache,
+            metrics=metrics,
+            server_timing=server_timing,
+            is_ready=is_ready,
+        )
         return TestClient(app)
 
     return make
@@ -102,6 +168,86 @@ def test_healthcheck(make_client):
     assert {"ok": True} == response.json()
 
 
+def test_healthcheck_is_unavailable_until_ready(make_client):
+    response = make_client(is_ready=lambda: False).get("/health")
+    assert 503 == response.status_code
+    assert {"ok": False} == response.json()
+
+
+def describe_server_timing():
+    def sends_the_durations_of_the_stages(make_client, make_service, make_auth, today):
+        symbol = ALLOWED_STOCK_SYMBOLS[0]
+        service = make_service(
+            historical_prices={today: {symbol: Decimal(1)}},
+            observe_stage=timing.observe_stage,
+        )
+        response = make_client(service=service).get(
+            f"/tickers/{symbol}/history?limit=1",
+            auth=make_auth(),
+        )
+
+        server_timing = response.headers["server-timing"]
+        metrics = [metric.split(";dur=") for metric in server_timing.split(", ")]
+        assert ["auth", "prices", "serialization", "total"] == [
+            name for name, _ in metrics
+        ]
+        assert all(float(duration) >= 0 for _, duration in metrics)
+
+    def can_be_disabled(make_client):
+        response = make_client(server_timing=False).get("/health")
+        assert "server-timing" not in response.headers
+
+
+def describe_metrics():
+    def exposes_the_registry_in_the_text_format(make_client):
+        metrics = Metrics()
+        metrics.add_stats("test_cache", "Test cache", lambda: {"hits": 3}, ["hits"])
+        response = make_client(metrics=metrics).get("/metrics")
+
+        assert 200 == response.status_code
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "test_cache_hits_total 3\n" in response.text
+
+    def observes_requests_by_route_and_status(
+        make_client, make_stub_service, make_auth, today
+    ):
+        metrics = Metrics()
+        symbol = ALLOWED_STOCK_SYMBOLS[0]
+        client = make_client(
+            service=make_stub_service(today, symbol),
+            metrics=metrics,
+        )
+        client.get(f"/tickers/{symbol}/history", auth=make_auth())
+        client.get("/tickers/UNKNOWN/history", auth=make_auth())
+        client.get("/tickers/UNKNOWN/history", auth=make_auth())
+        client.get("/unknown/route")
+
+        lines = client.get("/metrics").text.splitlines()
+        name = "littlejohn_request_duration_seconds_count"
+        assert f'{name}{{route="/tickers/{{symbol}}/history",status="200"}} 1' in lines
+        assert f'{name}{{route="/tickers/{{symbol}}/history",status="404"}} 2' in lines
+        assert f'{name}{{route="other",status="404"}} 1' in lines
+
+    def observes_the_stages_of_the_requests(
+        make_client, make_service, make_auth, today
+    ):
+        metrics = Metrics()
+        symbol = ALLOWED_STOCK_SYMBOLS[0]
+        service = make_service(
+            historical_prices={today: {symbol: Decimal(1)}},
+            observe_stage=metrics.observe_stage,
+        )
+        client = make_client(service=service, metrics=metrics)
+        client.get(f"/tickers/{symbol}/history?limit=1", auth=make_auth())
+
+        lines = client.get("/metrics").text.splitlines()
+        for stage in ["auth", "prices", "serialization"]:
+            assert (
+                f'littlejohn_stage_duration_seconds_count{{stage="{stage}"}} 1'
+                in lines
+            )
+
+
 def serialize_stock_price(stock_price: StockPrice):
     return {
         "symbol": stock_price.symbol,
@@ -116,6 +262,22 @@ def serialize_price_at_date(price_at_date: PriceAtDate):
     }
 
 
+def serialize_symbol_history(
+    historical_prices: PricesByDate,
+    symbol: StockSymbol,
+    dates: List[datetime.date],
+):
+    return {
+        "symbol": symbol,
+        "data": [
+            serialize_price_at_date(
+                PriceAtDate(date=date, price=historical_prices[date][symbol])
+            )
+            for date in dates
+        ],
+    }
+
+
 def describe_get_portfolio_current_prices():
     def returns_unauthorized_if_no_credentials_are_submitted(make_client):
         response = make_client().get("/tickers")
@@ -134,6 +296,10 @@ def describe_get_portfolio_current_prices():
         assert 401 == response.status_code
         assert "Incorrect username or password" == response.json()["detail"]
 
+    def returns_unauthorized_before_negotiating_the_media_type(make_client):
+        response = make_client().get("/tickers", headers={"Accept": "text/html"})
+        assert 401 == response.status_code
+
     @pytest.mark.parametrize(
         "portfolio",
         [
@@ -192,8 +358,47 @@ def describe_get_portfolio_current_prices():
         )
         response = make_client(service=service).get("/tickers", auth=auth)
         assert 200 == response.status_code
+        assert "Accept" == response.headers["Vary"]
         assert expected_reponse == sorted(response.json(), key=lambda d: d["symbol"])
 
+    @pytest.mark.parametrize(
+        "accept",
+        [
+            "application/vnd.littlejohn.columns+json",
+            "application/vnd.littlejohn.cents",
+        ],
+    )
+    def returns_compact_formats_if_accepted(
+        make_client,
+        make_service,
+        make_auth,
+        today,
+        accept,
+    ):
+        auth = make_auth()
+        portfolio = sorted(random.sample(ALLOWED_STOCK_SYMBOLS, k=3))
+        service = make_service(
+            portfolio_repository=PortfolioRepositoryStub(
+                portfolios={auth[0]: portfolio},
+            ),
+            historical_prices={
+                today: {symbol: Decimal(i + 1) for i, symbol in enumerate(portfolio)}
+            },
+        )
+        response = make_client(service=service).get(
+            "/tickers",
+            auth=auth,
+            headers={"Accept": accept},
+        )
+        assert 200 == response.status_code
+        assert accept == response.headers["Content-Type"]
+        if accept.endswith("+json"):
+            assert {"symbols": portfolio, "prices": [1, 2, 3]} == response.json()
+        else:
+            symbols = "\n".join(portfolio).encode("utf-8")
+            prices = response.content[16 + len(symbols) + (-len(symbols) % 4) :]
+            assert (100, 200, 300) == struct.unpack("<3i", prices)
+
 
 def describe_get_historical_prices():
     def returns_unauthorized_if_no_credentials_are_submitted(make_client):
@@ -202,6 +407,11 @@ def describe_get_historical_prices():
         assert 401 == response.status_code
         assert "Not authenticated" == response.json()["detail"]
 
+    def returns_unauthorized_before_validating_the_page(make_client):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        response = make_client().get(f"/tickers/{symbol}/history?cursor=zzz")
+        assert 401 == response.status_code
+
     def returns_unauthorized_if_username_is_not_uuid4(make_client, make_auth):
         auth = make_auth(username="invalid")
         symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
@@ -291,6 +501,246 @@ def describe_get_historical_prices():
         assert 200 == response.status_code
         assert expected_reponse == response.json()
 
+    def returns_not_modified_if_etag_matches(
+        make_client,
+        make_stub_service,
+        make_auth,
+        today,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        client = make_client(
+            service=make_stub_service(today, symbol),
+            response_cache=ResponseCache(
+                max_entries=10, max_bytes=2 ** 20, today_ttl=60
+            ),
+        )
+        response = client.get(f"/tickers/{symbol}/history", auth=make_auth())
+        assert 200 == response.status_code
+
+        response = client.get(
+            f"/tickers/{symbol}/history",
+            auth=make_auth(),
+            headers={"If-None-Match": response.headers["ETag"]},
+        )
+        assert 304 == response.status_code
+        assert b"" == response.content
+
+    def caches_immutable_pages_for_a_long_time(
+        make_client,
+        make_stub_service,
+        make_auth,
+        today,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        client = make_client(service=make_stub_service(today, symbol))
+        response = client.get(f"/tickers/{symbol}/history", auth=make_auth())
+        assert "private, max-age=60" == response.headers["Cache-Control"]
+
+        response = client.get(response.links["next"]["url"], auth=make_auth())
+        assert 200 == response.status_code
+        assert "private, max-age=31536000, immutable" == (
+            response.headers["Cache-Control"]
+        )
+
+    def serves_cached_pages_without_computing_them(
+        make_client,
+        make_stub_service,
+        make_auth,
+        today,
+        mocker,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        client = make_client(
+            service=make_stub_service(today, symbol),
+            response_cache=ResponseCache(
+                max_entries=10, max_bytes=2 ** 20, today_ttl=60
+            ),
+        )
+        spy = mocker.spy(StockPriceServiceStub, "get_history")
+        responses = [
+            client.get(f"/tickers/{symbol}/history", auth=make_auth())
+            for _ in range(3)
+        ]
+        assert all(200 == r.status_code for r in responses)
+        assert all(responses[0].content == r.content for r in responses)
+        assert all(responses[0].headers["Link"] == r.headers["Link"] for r in responses)
+        assert 1 == spy.call_count
+
+    def returns_columns_if_accepted(make_client, make_stub_service, make_auth, today):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        client = make_client(service=make_stub_service(today, symbol))
+        response = client.get(
+            f"/tickers/{symbol}/history",
+            auth=make_auth(),
+            headers={"Accept": "application/vnd.littlejohn.columns+json"},
+        )
+        assert 200 == response.status_code
+        assert "application/vnd.littlejohn.columns+json" == (
+            response.headers["Content-Type"]
+        )
+        assert "Accept" == response.headers["Vary"]
+        assert {
+            "start_date": today.isoformat(),
+            "dates": [-d for d in range(90)],
+            "prices": [100 + d for d in range(90)],
+        } == response.json()
+        assert "next" in response.links
+
+    def returns_cents_if_accepted(make_client, make_stub_service, make_auth, today):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        client = make_client(service=make_stub_service(today, symbol))
+        response = client.get(
+            f"/tickers/{symbol}/history",
+            auth=make_auth(),
+            headers={"Accept": "application/vnd.littlejohn.cents"},
+        )
+        assert 200 == response.status_code
+        assert "application/vnd.littlejohn.cents" == response.headers["Content-Type"]
+        assert [(100 + d) * 100 for d in range(90)] == list(
+            struct.unpack_from("<90i", response.content, 16)
+        )
+
+    def returns_not_acceptable_if_no_media_type_is_accepted(
+        make_client,
+        make_auth,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        response = make_client().get(
+            f"/tickers/{symbol}/history",
+            auth=make_auth(),
+            headers={"Accept": "text/html"},
+        )
+        assert 406 == response.status_code
+
+    def returns_unauthorized_before_negotiating_the_media_type(make_client):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        response = make_client().get(
+            f"/tickers/{symbol}/history",
+            headers={"Accept": "text/html"},
+        )
+        assert 401 == response.status_code
+
+    def returns_limit_days_per_page(
+        make_client,
+        make_stub_service,
+        make_auth,
+        today,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        client = make_client(service=make_stub_service(today, symbol))
+        response = client.get(f"/tickers/{symbol}/history?limit=7", auth=make_auth())
+        assert 200 == response.status_code
+        assert [f"{100 + d}.00" for d in range(7)] == [
+            d["price"] for d in response.json()
+        ]
+
+        response = client.get(response.links["next"]["url"], auth=make_auth())
+        assert 200 == response.status_code
+        assert [f"{100 + d}.00" for d in range(7, 14)] == [
+            d["price"] for d in response.json()
+        ]
+
+    def returns_pages_of_the_requested_range(
+        make_client,
+        make_stub_service,
+        make_auth,
+        today,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        client = make_client(service=make_stub_service(today, symbol))
+        first = today - datetime.timedelta(days=30)
+        last = today - datetime.timedelta(days=10)
+
+        pages = []
+        url = f"/tickers/{symbol}/history?from={first}&to={last}&limit=8"
+        while url is not None:
+            response = client.get(url, auth=make_auth())
+            assert 200 == response.status_code
+            pages.append([d["date"] for d in response.json()])
+            url = response.links.get("next", {}).get("url")
+
+        assert [8, 8, 5] == [len(page) for page in pages]
+        assert [
+            (today - datetime.timedelta(days=d)).isoformat() for d in range(10, 31)
+        ] == [date for page in pages for date in page]
+
+    def returns_the_whole_range_in_one_page_without_limit(
+        make_client,
+        make_stub_service,
+        make_auth,
+        today,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        first = today - datetime.timedelta(days=119)
+        response = make_client(service=make_stub_service(today, symbol)).get(
+            f"/tickers/{symbol}/history?from={first}",
+            auth=make_auth(),
+        )
+        assert 200 == response.status_code
+        assert 120 == len(response.json())
+        assert "next" not in response.links
+
+    @pytest.mark.parametrize(
+        "query, length",
+        [
+            pytest.param("from=0001-01-01&to=0001-01-05", 5, id="range"),
+            pytest.param("to=0001-01-05", 5, id="to"),
+            pytest.param("cursor={cursor}", 10, id="cursor"),
+        ],
+    )
+    def returns_the_first_dates_of_the_calendar(
+        make_client,
+        make_first_dates_service,
+        make_auth,
+        query,
+        length,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        cursor = api.encode_cursor(
+            StockPriceHistoryCursor(start_from=datetime.date(1, 1, 10))
+        )
+        response = make_client(service=make_first_dates_service()).get(
+            f"/tickers/{symbol}/history?{query.format(cursor=cursor)}",
+            auth=make_auth(),
+        )
+        assert 200 == response.status_code
+        assert length == len(response.json())
+        assert "next" not in response.links
+
+    @pytest.mark.parametrize(
+        "query, detail",
+        [
+            pytest.param("limit=0", None, id="empty page"),
+            pytest.param("limit=1001", None, id="page too long"),
+            pytest.param(
+                "from=2021-11-12&to=2021-11-01",
+                "from can't be after to",
+                id="reversed range",
+            ),
+            pytest.param(
+                "cursor={cursor}&limit=7",
+                "cursor can't be combined with limit, from or to",
+                id="cursor and limit",
+            ),
+        ],
+    )
+    def returns_validation_error_if_page_is_invalid(
+        make_client,
+        make_auth,
+        today,
+        query,
+        detail,
+    ):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        cursor = api.encode_cursor(StockPriceHistoryCursor(start_from=today))
+        response = make_client().get(
+            f"/tickers/{symbol}/history?{query.format(cursor=cursor)}",
+            auth=make_auth(),
+        )
+        assert 422 == response.status_code
+        if detail is not None:
+            assert detail == response.json()["detail"]
+
     def returns_validation_error_if_cursor_is_malformed(make_client, make_auth):
         symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
         response = make_client().get(
@@ -311,3 +761,359 @@ def describe_get_historical_prices():
             auth=make_auth(),
         )
         assert 404 == response.status_code
+
+
+def describe_get_multiple_historical_prices():
+    def returns_unauthorized_if_no_credentials_are_submitted(make_client):
+        symbols = ",".join(random.sample(ALLOWED_STOCK_SYMBOLS, k=2))
+        response = make_client().get(f"/tickers/history?symbols={symbols}")
+        assert 401 == response.status_code
+        assert "Not authenticated" == response.json()["detail"]
+
+    def returns_unauthorized_before_validating_the_page(make_client):
+        symbol = random.choice(ALLOWED_STOCK_SYMBOLS)
+        response = make_client().get(f"/tickers/history?symbols={symbol}&cursor=zzz")
+        assert 401 == response.status_code
+
+    def returns_historical_prices_of_requested_symbols_with_one_lookup(
+        make_client,
+        make_service,
+        make_auth,
+        today,
+        mocker,
+    ):
+        date_range = [today - datetime.timedelta(days=d) for d in range(180)]
+        symbols = random.sample(ALLOWED_STOCK_SYMBOLS, k=3)
+        historical_prices = {
+            date: {symbol: Decimal(random.randint(10, 150)) for symbol in symbols}
+            for date in date_range
+        }
+        expected_reponse = [
+            {"symbol": "invalid", "error": "Symbol not found"},
+            *[
+                serialize_symbol_history(historical_prices, symbol, date_range[:90])
+                for symbol in symbols
+            ],
+        ]
+
+        spy = mocker.spy(StockPriceServiceStub, "get_history")
+        service = make_service(historical_prices=historical_prices)
+        response = make_client(service=service).get(
+            f"/tickers/history?symbols=invalid,{','.join(symbols)},{symbols[0]}",
+            auth=make_auth(),
+        )
+        assert 200 == response.status_code
+        assert expected_reponse == response.json()
+        assert 1 == spy.call_count
+
+    def supports_forward_pagination(
+        make_client,
+        make_service,
+        make_auth,
+        today,
+    ):
+        date_range = [today - datetime.timedelta(days=d) for d in range(180)]
+        symbols = random.sample(ALLOWED_STOCK_SYMBOLS, k=2)
+        historical_prices = {
+            date: {symbol: Decimal(random.randint(10, 150)) for symbol in symbols}
+            for date in date_range
+        }
+        expected_reponse = [
+            serialize_symbol_history(historical_prices, symbol, date_range[90:])
+            for symbol in symbols
+        ]
+
+        service = make_service(historical_prices=historical_prices)
+        response = make_client(service=service).get(
+            f"/tickers/history?symbols={','.join(symbols)}",
+            auth=make_auth(),
+        )
+        assert 200 == response.status_code
+
+        # follow pagination link
+        next_url = response.links["next"]["url"]
+        response = make_client(service=service).get(next_url, auth=make_auth())
+        assert 200 == response.status_code
+        assert expected_reponse == response.json()
+
+    @pytest.mark.parametrize(
+        "query, detail",
+        [
+            pytest.param("symbols=,", "No symbols requested", id="no symbols"),
+            pytest.param(
+                "symbols=" + ",".join(f"S{i}" for i in range(101)),
+                "At most 100 symbols can be requested",
+                id="too many symbols",
+            ),
+            pytest.param(
+                "symbols=AAPL&cursor=malformed",
+                "Invalid cursor",
+                id="malformed cursor",
+            ),
+        ],
+    )
+    def returns_validation_error_if_request_is_invalid(
+        make_client,
+        make_auth,
+        query,
+        detail,
+    ):
+        response = make_client().get(f"/tickers/history?{query}", auth=make_auth())
+        assert 422 == response.status_code
+        assert detail == response.json()["detail"]
+
+    def returns_the_first_dates_of_the_calendar(
+        make_client,
+        make_first_dates_service,
+        make_auth,
+    ):
+        symbols = random.sample(ALLOWED_STOCK_SYMBOLS, k=2)
+        response = make_client(service=make_first_dates_service()).get(
+            f"/tickers/history?symbols={','.join(symbols)}&to=0001-01-05",
+            auth=make_auth(),
+        )
+        assert 200 == response.status_code
+        assert [5, 5] == [len(item["data"]) for item in response.json()]
+        assert "next" not in response.links
+
+
+def describe_export_historical_prices():
+    def returns_unauthorized_if_no_credentials_are_submitted(make_client, today):
+        response = make_client().get(
+            f"/tickers/history/export?symbols={ALLOWED_STOCK_SYMBOLS[0]}"
+            f"&from={today}&to={today}"
+        )
+        assert 401 == response.status_code
+        assert "Not authenticated" == response.json()["detail"]
+
+    def streams_one_line_per_date_in_chunks(
+        make_client,
+        make_service,
+        make_auth,
+        today,
+        mocker,
+    ):
+        date_range = [today - datetime.timedelta(days=d) for d in range(250)]
+        symbols = random.sample(ALLOWED_STOCK_SYMBOLS, k=2)
+        historical_prices = {
+            date: {symbol: Decimal(random.randint(10, 150)) for symbol in symbols}
+            for date in date_range
+        }
+        first, last = date_range[-10], date_range[5]
+        expected_lines = [
+            {
+                "date": date.isoformat(),
+                "prices": {
+                    symbol: f"{historical_prices[date][symbol]:.2f}"
+                    for symbol in symbols
+                },
+            }
+            for date in date_range[5:-9]
+        ]
+
+        spy = mocker.spy(StockPriceServiceStub, "get_history")
+        service = make_service(historical_prices=historical_prices)
+        response = make_client(service=service).get(
+            f"/tickers/history/export?symbols={','.join(symbols)},{symbols[0]}"
+            f"&from={first}&to={last}",
+            auth=make_auth(),
+        )
+        assert 200 == response.status_code
+        assert "application/x-ndjson" == response.headers["Content-Type"]
+        lines = response.text.splitlines()
+        assert expected_lines == [json.loads(line) for line in lines]
+        assert {tuple(symbols)} == {tuple(json.loads(line)["prices"]) for line in lines}
+        assert [90, 90, 56] == [call.kwargs["length"] for call in spy.call_args_list]
+
+    def returns_not_found_if_a_symbol_is_unknown(make_client, make_auth, today):
+        response = make_client().get(
+            f"/tickers/history/export?symbols={ALLOWED_STOCK_SYMBOLS[0]},unknown"
+            f"&from={today}&to={today}",
+            auth=make_auth(),
+        )
+        assert 404 == response.status_code
+        assert [{"symbol": "unknown"}] == response.json()["detail"]
+
+    @pytest.mark.parametrize(
+        "query, detail",
+        [
+            pytest.param(
+                "symbols=,&from=2021-11-01&to=2021-11-12",
+                "No symbols requested",
+                id="no symbols",
+            ),
+            pytest.param(
+                f"symbols={ALLOWED_STOCK_SYMBOLS[0]}&from=2021-11-12&to=2021-11-01",
+                "from can't be after to",
+                id="reversed range",
+            ),
+        ],
+    )
+    def returns_validation_error_if_request_is_invalid(
+        make_client,
+        make_auth,
+        query,
+        detail,
+    ):
+        response = make_client().get(
+            f"/tickers/history/export?{query}",
+            auth=make_auth(),
+        )
+        assert 422 == response.status_code
+        assert detail == response.json()["detail"]
+
+    def returns_validation_error_if_dates_are_missing(make_client, make_auth):
+        response = make_client().get(
+            f"/tickers/history/export?symbols={ALLOWED_STOCK_SYMBOLS[0]}",
+            auth=make_auth(),
+        )
+        assert 422 == response.status_code
+
+    def streams_the_first_dates_of_the_calendar(
+        make_client,
+        make_first_dates_service,
+        make_auth,
+    ):
+        response = make_client(service=make_first_dates_service()).get(
+            f"/tickers/history/export?symbols={ALLOWED_STOCK_SYMBOLS[0]}"
+            "&from=0001-01-01&to=0001-01-10",
+            auth=make_auth(),
+        )
+        assert 200 == response.status_code
+        assert "0001-01-01" == json.loads(response.text.splitlines()[-1])["date"]
+        assert 10 == len(response.text.splitlines())
+
+
+def describe_get_portfolio_historical_prices():
+    def returns_unauthorized_if_no_credentials_are_submitted(make_client):
+        response = make_client().get("/portfolio/history")
+        assert 401 == response.status_code
+        assert "Not authenticated" == response.json()["detail"]
+
+    def returns_unauthorized_before_validating_the_page(make_client):
+        response = make_client().get("/portfolio/history?cursor=zzz")
+        assert 401 == response.status_code
+
+    @pytest.mark.parametrize(
+        "portfolio",
+        [
+            pytest.param(
+                random.sample(ALLOWED_STOCK_SYMBOLS, k=3),
+                id="multiple stocks",
+            ),
+            pytest.param([], id="no stocks"),
+        ],
+    )
+    def returns_holdings_and_total_with_one_lookup(
+        make_client,
+        make_service,
+        make_auth,
+        today,
+        mocker,
+        portfolio,
+    ):
+        auth = make_auth()
+        date_range = [today - datetime.timedelta(days=d) for d in range(180)]
+        historical_prices = {
+            date: {
+                symbol: Decimal(random.randint(1000, 15000)) / 100
+                for symbol in ALLOWED_STOCK_SYMBOLS
+            }
+            for date in date_range
+        }
+        expected_reponse = {
+            "holdings": [
+                serialize_symbol_history(historical_prices, symbol, date_range[:90])
+                for symbol in portfolio
+            ],
+            "total": [
+                serialize_price_at_date(
+                    PriceAtDate(
+                        date=date,
+                        price=sum(
+                            (historical_prices[date][symbol] for symbol in portfolio),
+                            Decimal(0),
+                        ),
+                    )
+                )
+                for date in date_range[:90]
+            ],
+        }
+
+        spy = mocker.spy(StockPriceServiceStub, "get_history")
+        service = make_service(
+            portfolio_repository=PortfolioRepositoryStub(
+                portfolios={auth[0]: portfolio},
+            ),
+            historical_prices=historical_prices,
+        )
+        response = make_client(service=service).get("/portfolio/history", auth=auth)
+        assert 200 == response.status_code
+        assert expected_reponse == response.json()
+        assert 1 == spy.call_count
+
+    def supports_forward_pagination(
+        make_client,
+        make_service,
+        make_auth,
+        today,
+    ):
+        auth = make_auth()
+        date_range = [today - datetime.timedelta(days=d) for d in range(180)]
+        portfolio = random.sample(ALLOWED_STOCK_SYMBOLS, k=2)
+        historical_prices = {
+            date: {symbol: Decimal(random.randint(10, 150)) for symbol in portfolio}
+            for date in date_range
+        }
+
+        service = make_service(
+            portfolio_repository=PortfolioRepositoryStub(
+                portfolios={auth[0]: portfolio},
+            ),
+            historical_prices=historical_prices,
+        )
+        response = make_client(service=service).get("/portfolio/history", auth=auth)
+        assert 200 == response.status_code
+
+        # follow pagination link
+        next_url = response.links["next"]["url"]
+        response = make_client(service=service).get(next_url, auth=auth)
+        assert 200 == response.status_code
+        assert [
+            serialize_symbol_history(historical_prices, symbol, date_range[90:])
+            for symbol in portfolio
+        ] == response.json()["holdings"]
+        assert [d.isoformat() for d in date_range[90:]] == [
+            d["date"] for d in response.json()["total"]
+        ]
+
+    def returns_validation_error_if_cursor_is_malformed(make_client, make_auth):
+        response = make_client().get(
+            "/portfolio/history?cursor=malformed",
+            auth=make_auth(),
+        )
+        assert 422 == response.status_code
+        assert "Invalid cursor" == response.json()["detail"]
+
+    def returns_the_first_dates_of_the_calendar(
+        make_client,
+        make_first_dates_service,
+        make_auth,
+    ):
+        auth = make_auth()
+        portfolio = random.sample(ALLOWED_STOCK_SYMBOLS, k=2)
+        service = make_first_dates_service(
+            portfolio_repository=PortfolioRepositoryStub(
+                portfolios={auth[0]: portfolio},
+            ),
+        )
+        response = make_client(service=service).get(
+            "/portfolio/history?to=0001-01-05",
+            auth=auth,
+        )
+        assert 200 == response.status_code
+        assert [5, 5] == [
+            len(holding["data"]) for holding in response.json()["holdings"]
+        ]
+        assert 5 == len(response.json()["total"])
+        assert "next" not in response.links
@@ -0,0 +1,79 @@
+import datetime
+import random
+import struct
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from littlejohn.domain.entities import PriceAtDate
+from littlejohn.entrypoints.asgi.encoding import (
+    BINARY,
+    COLUMNS,
+    HISTORY_HEADER,
+    JSON,
+    MEDIA_TYPES,
+    PORTFOLIO_HEADER,
+    encode_portfolio_binary,
+    encode_price_history,
+    encode_price_history_binary,
+    negotiate,
+)
+
+
+@pytest.mark.parametrize("length", [0, 1, 90])
+def test_encode_price_history_matches_json_response_of_models(length):
+    start_from = datetime.date(2021, 11, 12)
+    dates = [start_from - datetime.timedelta(days=d) for d in range(length)]
+    prices = [
+        Decimal(random.randrange(1, 10 ** 8)).scaleb(-random.randrange(0, 6))
+        for _ in range(length)
+    ]
+    models = [PriceAtDate(date=d, price=p) for d, p in zip(dates, prices)]
+    assert JSONResponse(jsonable_encoder(models)).body == (
+        encode_price_history(dates, prices)
+    )
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        pytest.param(None, JSON, id="missing"),
+        pytest.param("*/*", JSON, id="anything"),
+        pytest.param("application/json", JSON, id="json"),
+        pytest.param(COLUMNS, COLUMNS, id="columns"),
+        pytest.param(f"{BINARY}, {COLUMNS};q=0.5", BINARY, id="preferred"),
+        pytest.param(f"{COLUMNS};q=0.1, application/*", JSON, id="range"),
+        pytest.param(f"{BINARY}, */*;q=0", BINARY, id="not json"),
+        pytest.param("text/html", None, id="not acceptable"),
+        pytest.param(f"{BINARY};q=0", None, id="refused"),
+    ],
+)
+def test_negotiate(accept, expected):
+    assert expected == negotiate(accept, MEDIA_TYPES)
+
+
+def test_encode_price_history_binary():
+    start_from = datetime.date(2021, 11, 12)
+    body = encode_price_history_binary(
+        [start_from, start_from - datetime.timedelta(days=1)],
+        [Decimal("1.005"), Decimal("123456.789")],
+    )
+    magic, version, first_day, count = HISTORY_HEADER.unpack_from(body)
+    assert (b"LJPH", 1, start_from.toordinal(), 2) == (
+        magic,
+        version,
+        first_day,
+        count,
+    )
+    assert (100, 12345679) == struct.unpack_from("<2i", body, HISTORY_HEADER.size)
+
+
+def test_encode_portfolio_binary():
+    body = encode_portfolio_binary(["AAPL", "FB"], [Decimal("1.005"), Decimal("2")])
+    magic, version, count, symbols_size = PORTFOLIO_HEADER.unpack_from(body)
+    assert (b"LJPP", 1, 2, 7) == (magic, version, count, symbols_size)
+    symbols = body[PORTFOLIO_HEADER.size : PORTFOLIO_HEADER.size + symbols_size]
+    assert b"AAPL\nFB" == symbols
+    assert (100, 200) == struct.unpack_from("<2i", body, PORTFOLIO_HEADER.size + 8)
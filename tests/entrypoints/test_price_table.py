@@ -0,0 +1,52 @@
+import datetime
+import os
+import subprocess
+import sys
+
+from littlejohn.adapters.price_table import StockPriceServicePriceTable
+from littlejohn.adapters.stock_price_service import StockPriceServiceRandomWalker
+from littlejohn.entrypoints.asgi import (
+    ALLOWED_STOCK_SYMBOLS,
+    GAIN,
+    ZERO_DATE,
+    create_stock_price_seeds,
+)
+from littlejohn.entrypoints.price_table import main
+
+
+def test_builds_table_of_served_prices(tmp_path):
+    path = tmp_path / "prices.bin"
+    main([str(path), "--from", "2021-11-01", "--to", "2021-11-30"])
+
+    table = StockPriceServicePriceTable(
+        path=str(path),
+        fallback=StockPriceServiceRandomWalker(
+            zero_date=ZERO_DATE,
+            seeds=create_stock_price_seeds(sorted(ALLOWED_STOCK_SYMBOLS)),
+            gain=GAIN,
+        ),
+    )
+    assert datetime.date(2021, 11, 1) == table.first_date
+    assert datetime.date(2021, 11, 30) == table.last_date
+    assert ALLOWED_STOCK_SYMBOLS == set(table.rows)
+
+
+def test_builds_same_table_with_any_hash_seed(tmp_path):
+    paths = [tmp_path / f"prices-{seed}.bin" for seed in ("1", "2")]
+    for seed, path in zip(("1", "2"), paths):
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "littlejohn.entrypoints.price_table",
+                str(path),
+                "--from",
+                "2021-11-01",
+                "--to",
+                "2021-11-07",
+            ],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+            check=True,
+        )
+
+    assert paths[0].read_bytes() == paths[1].read_bytes()
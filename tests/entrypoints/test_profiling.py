@@ -0,0 +1,100 @@
+import os
+import pstats
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from littlejohn.entrypoints.asgi.profiling import ProfilingMiddleware
+
+
+def make_client(directory, **kwargs):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        return {"sum": sum(range(1000))}
+
+    kwargs.setdefault("secret", "s3cr3t")
+    app.add_middleware(ProfilingMiddleware, directory=str(directory), **kwargs)
+    return TestClient(app)
+
+
+def describe_profiling_middleware():
+    @pytest.mark.parametrize(
+        "profiler, extension",
+        [
+            pytest.param("sampling", ".folded", id="sampling"),
+            pytest.param("cprofile", ".prof", id="cprofile"),
+        ],
+    )
+    def profiles_requests_with_the_header(tmp_path, profiler, extension):
+        client = make_client(tmp_path, profiler=profiler)
+        response = client.get("/work", headers={"X-Profile": "s3cr3t"})
+
+        assert 200 == response.status_code
+        name = response.headers["x-profile"]
+        assert name.endswith(f"-GET-work{extension}")
+        assert [name] == [path.name for path in tmp_path.iterdir()]
+
+    def writes_pstats_files_with_cprofile(tmp_path):
+        client = make_client(tmp_path, profiler="cprofile")
+        name = client.get("/work", headers={"X-Profile": "s3cr3t"}).headers["x-profile"]
+
+        stats = pstats.Stats(str(tmp_path / name))
+        assert any(function == "work" for _, _, function in stats.stats)
+
+    @pytest.mark.parametrize(
+        "secret, header",
+        [
+            pytest.param("s3cr3t", "1", id="other value"),
+            pytest.param("s3cr3t", "", id="empty value"),
+            pytest.param(None, "1", id="without secret"),
+        ],
+    )
+    def does_not_profile_requests_without_the_secret(tmp_path, secret, header):
+        client = make_client(tmp_path, secret=secret)
+        response = client.get("/work", headers={"X-Profile": header})
+
+        assert 200 == response.status_code
+        assert "x-profile" not in response.headers
+        assert [] == list(tmp_path.iterdir())
+
+    def keeps_the_newest_profiles(tmp_path):
+        (tmp_path / "notes.txt").write_text("not a profile")
+        client = make_client(tmp_path, max_files=2)
+        for i in range(3):
+            response = client.get("/work", headers={"X-Profile": "s3cr3t"})
+            # profiles of the same second have the same name and may have the
+            # same mtime
+            path = tmp_path / response.headers["x-profile"]
+            path.rename(tmp_path / f"{i}.folded")
+            os.utime(tmp_path / f"{i}.folded", ns=(i, i))
+
+        assert {"1.folded", "2.folded", "notes.txt"} == {
+            path.name for path in tmp_path.iterdir()
+        }
+
+    def validates_max_files(tmp_path):
+        with pytest.raises(ValueError, match="max_files must be positive"):
+            ProfilingMiddleware(app=None, directory=str(tmp_path), max_files=0)
+
+    def does_not_profile_other_requests(tmp_path):
+        response = make_client(tmp_path).get("/work")
+
+        assert "x-profile" not in response.headers
+        assert [] == list(tmp_path.iterdir())
+
+    @pytest.mark.parametrize(
+        "random, profiled",
+        [
+            pytest.param(0.05, True, id="sampled"),
+            pytest.param(0.2, False, id="not sampled"),
+        ],
+    )
+    def profiles_a_sample_of_the_requests(tmp_path, random, profiled):
+        client = make_client(tmp_path, sample_rate=0.1, get_random=lambda: random)
+        response = client.get("/work")
+
+        assert profiled == ("x-profile" in response.headers)
+        assert profiled == any(tmp_path.iterdir())
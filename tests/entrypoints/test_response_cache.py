@@ -0,0 +1,182 @@
+import datetime
+
+import pytest
+
+from littlejohn.entrypoints.asgi.encoding import JSON
+from littlejohn.entrypoints.asgi.response_cache import ResponseCache, etag_matches
+
+TODAY = datetime.date(2021, 11, 12)
+
+
+@pytest.fixture
+def clock():
+    class Clock:
+        now = 0.0
+
+        def __call__(self):
+            return self.now
+
+    return Clock()
+
+
+@pytest.fixture
+def make_cache(clock):
+    def make(
+        max_entries: int = 2, max_bytes: int = 2 ** 20, today_ttl: int = 60
+    ) -> ResponseCache:
+        return ResponseCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            today_ttl=today_ttl,
+            clock=clock,
+        )
+
+    return make
+
+
+def describe_response_cache():
+    def returns_cached_responses(make_cache):
+        cache = make_cache()
+        assert cache.get(("AAPL", TODAY, 90, None, JSON)) is None
+        response = cache.put(
+            ("AAPL", TODAY, 90, None, JSON),
+            b"[]",
+            JSON,
+            link="next",
+            contains_today=False,
+        )
+        assert response is cache.get(("AAPL", TODAY, 90, None, JSON))
+        assert {
+            "hits": 1,
+            "misses": 1,
+            "evictions": 0,
+            "entries": 1,
+            "bytes": 2,
+        } == cache.stats()
+
+    def sends_immutable_pages_with_long_max_age(make_cache):
+        response = make_cache().put(
+            ("AAPL", TODAY, 90, None, JSON),
+            b"[]",
+            JSON,
+            link='/next; rel="next"',
+            contains_today=False,
+        )
+        assert response.etag.startswith('"')
+        assert {
+            "ETag": response.etag,
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "Vary": "Accept",
+            "Link": '/next; rel="next"',
+        } == response.headers
+
+    def expires_page_containing_today_after_ttl(make_cache, clock):
+        cache = make_cache(today_ttl=30)
+        response = cache.put(
+            ("AAPL", TODAY, 90, None, JSON), b"[]", JSON, link=None, contains_today=True
+        )
+        assert "private, max-age=30" == response.headers["Cache-Control"]
+        assert "Link" not in response.headers
+
+        clock.now = 29
+        assert response is cache.get(("AAPL", TODAY, 90, None, JSON))
+        clock.now = 30
+        assert cache.get(("AAPL", TODAY, 90, None, JSON)) is None
+        assert 0 == cache.stats()["entries"]
+
+    def evicts_least_recently_used_pages(make_cache):
+        cache = make_cache(max_entries=2)
+        for day in range(3):
+            cache.put(
+                ("AAPL", TODAY, 90, None, JSON),
+                b"[]",
+                JSON,
+                link=None,
+                contains_today=False,
+            )
+            cache.put(
+                ("MSFT", TODAY - datetime.timedelta(days=day), 90, None, JSON),
+                b"[]",
+                JSON,
+                link=None,
+                contains_today=False,
+            )
+            assert cache.get(("AAPL", TODAY, 90, None, JSON)) is not None
+
+        assert 2 == cache.stats()["entries"]
+        assert (
+            cache.get(("MSFT", TODAY - datetime.timedelta(days=1), 90, None, JSON))
+            is None
+        )
+
+    def evicts_least_recently_used_pages_over_max_bytes(make_cache):
+        cache = make_cache(max_entries=10, max_bytes=5)
+        for symbol, body in [("AAPL", b"[1]"), ("MSFT", b"[]"), ("GOOG", b"[]")]:
+            cache.put(
+                (symbol, TODAY, 90, None, JSON),
+                body,
+                JSON,
+                link=None,
+                contains_today=False,
+            )
+
+        assert cache.get(("AAPL", TODAY, 90, None, JSON)) is None
+        assert cache.get(("GOOG", TODAY, 90, None, JSON)) is not None
+        assert {
+            "hits": 1,
+            "misses": 1,
+            "evictions": 1,
+            "entries": 2,
+            "bytes": 4,
+        } == cache.stats()
+
+    def does_not_store_pages_larger_than_max_bytes(make_cache):
+        cache = make_cache(max_bytes=1)
+        response = cache.put(
+            ("AAPL", TODAY, 90, None, JSON),
+            b"[]",
+            JSON,
+            link=None,
+            contains_today=False,
+        )
+        assert b"[]" == response.body
+        assert cache.get(("AAPL", TODAY, 90, None, JSON)) is None
+        assert 0 == cache.stats()["bytes"]
+
+    def does_not_store_pages_without_entries(make_cache):
+        cache = make_cache(max_entries=0)
+        response = cache.put(
+            ("AAPL", TODAY, 90, None, JSON),
+            b"[]",
+            JSON,
+            link=None,
+            contains_today=False,
+        )
+        assert b"[]" == response.body
+        assert cache.get(("AAPL", TODAY, 90, None, JSON)) is None
+
+    @pytest.mark.parametrize(
+        "params, err_msg",
+        [
+            pytest.param({"max_entries": -1}, "max_entries can't be negative"),
+            pytest.param({"max_bytes": 0}, "max_bytes must be positive"),
+            pytest.param({"today_ttl": -1}, "today_ttl can't be negative"),
+        ],
+    )
+    def validates_params(make_cache, params, err_msg):
+        with pytest.raises(ValueError, match=err_msg):
+            make_cache(**params)
+
+
+@pytest.mark.parametrize(
+    "if_none_match, expected",
+    [
+        pytest.param(None, False, id="missing"),
+        pytest.param('"abc"', True, id="same"),
+        pytest.param('"other"', False, id="other"),
+        pytest.param('"other", W/"abc"', True, id="weak in list"),
+        pytest.param("*", True, id="any"),
+    ],
+)
+def test_etag_matches(if_none_match, expected):
+    assert expected == etag_matches(if_none_match, '"abc"')
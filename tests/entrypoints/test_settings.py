@@ -0,0 +1,13 @@
+import pydantic
+import pytest
+
+from littlejohn.entrypoints.asgi.settings import Settings
+
+
+def test_move_bitmaps_require_the_random_walk_engine():
+    with pytest.raises(pydantic.ValidationError, match="move bitmaps require"):
+        Settings(price_engine="vectorized", move_bitmap_horizon=1)
+
+
+def test_vectorized_engine_without_move_bitmaps_is_valid():
+    assert "vectorized" == Settings(price_engine="vectorized").price_engine
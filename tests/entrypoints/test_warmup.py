@@ -0,0 +1,63 @@
+import datetime
+
+import pytest
+
+from littlejohn.domain.entities import DEFAULT_HISTORY_LENGTH, HistoricalPrices
+from littlejohn.entrypoints.asgi.warmup import Warmup
+
+TODAY = datetime.date(2021, 11, 12)
+
+
+class StockPriceServiceRecorder:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.requests = []
+
+    def get_history(self, symbols, start_from, length):
+        self.requests.append((symbols, start_from, length))
+        if self.fail:
+            raise RuntimeError("failed")
+        return HistoricalPrices(start_from=start_from, length=length, prices={})
+
+
+def make_warmup(stock_price_service, history_pages=2):
+    return Warmup(
+        stock_price_service=stock_price_service,
+        symbols={"MSFT", "AAPL"},
+        get_today_utc=lambda: TODAY,
+        history_pages=history_pages,
+    )
+
+
+def describe_warmup():
+    def requests_today_and_the_first_pages_of_each_symbol():
+        service = StockPriceServiceRecorder()
+        warmup = make_warmup(service)
+        assert not warmup.ready
+
+        warmup.run()
+        second_page = TODAY - datetime.timedelta(days=DEFAULT_HISTORY_LENGTH)
+        assert [
+            (["AAPL", "MSFT"], TODAY, 1),
+            (["AAPL"], TODAY, DEFAULT_HISTORY_LENGTH),
+            (["AAPL"], second_page, DEFAULT_HISTORY_LENGTH),
+            (["MSFT"], TODAY, DEFAULT_HISTORY_LENGTH),
+            (["MSFT"], second_page, DEFAULT_HISTORY_LENGTH),
+        ] == service.requests
+        assert warmup.ready
+
+    def runs_once():
+        service = StockPriceServiceRecorder()
+        warmup = make_warmup(service, history_pages=0)
+        warmup.run()
+        warmup.run()
+        assert [(["AAPL", "MSFT"], TODAY, 1)] == service.requests
+
+    def is_ready_even_if_it_failed():
+        warmup = make_warmup(StockPriceServiceRecorder(fail=True))
+        warmup.run()
+        assert warmup.ready
+
+    def rejects_negative_history_pages():
+        with pytest.raises(ValueError):
+            make_warmup(StockPriceServiceRecorder(), history_pages=-1)
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from littlejohn.libs.bitmap import RankBitmap
+
+
+@pytest.fixture
+def bits():
+    return [random.random() < 0.5 for _ in range(64 * random.randrange(1, 40))]
+
+
+@pytest.fixture
+def bitmap(bits):
+    bitmap = RankBitmap()
+    for start in range(0, len(bits), 64):
+        bitmap.append_word(
+            sum(1 << i for i, bit in enumerate(bits[start : start + 64]) if bit)
+        )
+    return bitmap
+
+
+def describe_rank_bitmap():
+    def stores_appended_bits(bitmap, bits):
+        assert len(bits) == len(bitmap)
+        assert bits == [bitmap[i] for i in range(len(bitmap))]
+
+    def rank_counts_set_bits_before_position(bitmap, bits):
+        for position in range(len(bits) + 1):
+            assert sum(bits[:position]) == bitmap.rank(position)
+
+    @pytest.mark.parametrize("offset", [-1, 1])
+    def rank_rejects_positions_out_of_range(bitmap, offset):
+        position = -1 if offset < 0 else len(bitmap) + offset
+        with pytest.raises(IndexError, match="position out of range"):
+            bitmap.rank(position)
@@ -0,0 +1,78 @@
+import pytest
+
+from littlejohn.libs.metrics import (
+    CallbackGauge,
+    Histogram,
+    Registry,
+    StatsCollector,
+)
+
+
+def describe_histogram():
+    def counts_observations_in_cumulative_buckets():
+        histogram = Histogram("duration_seconds", "Duration", buckets=[0.1, 1])
+        for value in [0.05, 0.1, 0.5, 2]:
+            histogram.labels().observe(value)
+
+        assert [
+            "# HELP duration_seconds Duration",
+            "# TYPE duration_seconds histogram",
+            'duration_seconds_bucket{le="0.1"} 2',
+            'duration_seconds_bucket{le="1"} 3',
+            'duration_seconds_bucket{le="+Inf"} 4',
+            "duration_seconds_sum 2.65",
+            "duration_seconds_count 4",
+        ] == list(histogram.collect())
+
+    def reuses_children_for_the_same_label_values():
+        histogram = Histogram("duration_seconds", "Duration", ["route"])
+        assert histogram.labels("/a") is histogram.labels("/a")
+        assert histogram.labels("/a") is not histogram.labels("/b")
+
+    def escapes_label_values():
+        histogram = Histogram("duration_seconds", "Duration", ["route"], [1])
+        histogram.labels('/"a"\n').observe(1)
+        assert 'duration_seconds_count{route="/\\"a\\"\\n"} 1' in list(
+            histogram.collect()
+        )
+
+    @pytest.mark.parametrize(
+        "labelnames, values",
+        [
+            pytest.param(["route"], (), id="missing"),
+            pytest.param(["route"], ("/a", "200"), id="extra"),
+        ],
+    )
+    def rejects_wrong_number_of_label_values(labelnames, values):
+        histogram = Histogram("duration_seconds", "Duration", labelnames)
+        with pytest.raises(ValueError):
+            histogram.labels(*values)
+
+    def rejects_unsorted_buckets():
+        with pytest.raises(ValueError):
+            Histogram("duration_seconds", "Duration", buckets=[1, 0.1])
+
+
+def describe_stats_collector():
+    def reads_stats_when_collected():
+        stats = {"hits": 0, "entries": 0}
+        collector = StatsCollector("cache", "Cache", lambda: stats, ["hits"])
+        stats.update(hits=2, entries=1)
+
+        lines = list(collector.collect())
+        assert "cache_hits_total 2" in lines
+        assert "# TYPE cache_hits_total counter" in lines
+        assert "cache_entries 1" in lines
+        assert "# TYPE cache_entries gauge" in lines
+
+
+def describe_registry():
+    def renders_all_collectors():
+        registry = Registry()
+        registry.register(CallbackGauge("a", "A", lambda: 1))
+        registry.register(CallbackGauge("b", "B", lambda: 2.5))
+
+        assert (
+            "# HELP a A\n# TYPE a gauge\na 1\n# HELP b B\n# TYPE b gauge\nb 2.5\n"
+            == registry.render()
+        )
@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from littlejohn.libs.prefetch import Prefetcher
+
+
+def describe_prefetcher():
+    def returns_prefetched_results_once():
+        calls = []
+
+        async def call(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return [key]
+
+        async def main(prefetcher):
+            prefetcher.schedule("a", lambda: call("a"))
+            prefetcher.schedule("a", lambda: call("a"))
+            return [await prefetcher.take("a"), await prefetcher.take("a")]
+
+        prefetcher = Prefetcher(max_concurrency=2, max_entries=2)
+        assert [["a"], None] == asyncio.run(main(prefetcher))
+        assert ["a"] == calls
+        assert {
+            "scheduled": 1,
+            "skipped": 0,
+            "hits": 1,
+            "wasted": 0,
+            "in_flight": 0,
+            "entries": 0,
+        } == prefetcher.stats()
+
+    def skips_calls_beyond_max_concurrency():
+        async def call():
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def main(prefetcher):
+            for key in "abc":
+                prefetcher.schedule(key, call)
+            return [await prefetcher.take(key) for key in "abc"]
+
+        prefetcher = Prefetcher(max_concurrency=2, max_entries=4)
+        assert ["result", "result", None] == asyncio.run(main(prefetcher))
+        assert 1 == prefetcher.stats()["skipped"]
+
+    def counts_evicted_and_failed_results_as_wasted():
+        async def call(key):
+            if key == "failing":
+                raise ValueError("failed")
+            return key
+
+        async def main(prefetcher):
+            for key in ["a", "b", "failing"]:
+                prefetcher.schedule(key, lambda key=key: call(key))
+            await asyncio.sleep(0.01)
+            return [await prefetcher.take(key) for key in ["a", "b", "failing"]]
+
+        prefetcher = Prefetcher(max_concurrency=3, max_entries=1)
+        assert [None, "b", None] == asyncio.run(main(prefetcher))
+        assert 2 == prefetcher.stats()["wasted"]
+        assert 1 == prefetcher.stats()["hits"]
+
+    def runs_calls_outside_of_the_current_context():
+        request = contextvars.ContextVar("request", default=None)
+
+        async def call():
+            return request.get()
+
+        async def main(prefetcher):
+            request.set("current request")
+            prefetcher.schedule("a", call)
+            return await prefetcher.take("a")
+
+        assert None is asyncio.run(main(Prefetcher(max_concurrency=1, max_entries=1)))
+
+    @pytest.mark.parametrize(
+        "max_concurrency, max_entries",
+        [
+            pytest.param(0, 1, id="no concurrency"),
+            pytest.param(1, 0, id="no entries"),
+        ],
+    )
+    def rejects_invalid_limits(max_concurrency, max_entries):
+        with pytest.raises(ValueError):
+            Prefetcher(max_concurrency=max_concurrency, max_entries=max_entries)
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from littlejohn.libs.profiling import SamplingProfiler
+
+
+def describe_sampling_profiler():
+    def samples_the_stacks_of_other_threads():
+        started = threading.Event()
+        release = threading.Event()
+
+        def wait_in_thread():
+            started.set()
+            release.wait()
+
+        thread = threading.Thread(target=wait_in_thread, name="waiting")
+        thread.start()
+        started.wait()
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        profiler.stop()
+        release.set()
+        thread.join()
+
+        stacks = [line.rsplit(" ", 1)[0] for line in profiler.folded().splitlines()]
+        assert any(
+            stack.startswith("waiting;") and "wait_in_thread (" in stack
+            for stack in stacks
+        )
+        assert not any(stack.startswith("sampling-profiler") for stack in stacks)
+        assert profiler.samples >= 1
+
+    def reports_one_line_per_stack_with_its_count():
+        profiler = SamplingProfiler()
+        profiler.stacks[("main", "f (a.py:1)", "g (a.py:5)")] += 3
+        profiler.stacks[("main", "f (a.py:1)")] += 1
+        assert "main;f (a.py:1);g (a.py:5) 3\nmain;f (a.py:1) 1\n" == (
+            profiler.folded()
+        )
+
+    def rejects_invalid_interval():
+        with pytest.raises(ValueError):
+            SamplingProfiler(interval=0)
+
+    def can_only_be_started_once():
+        profiler = SamplingProfiler()
+        with pytest.raises(RuntimeError):
+            profiler.stop()
+        profiler.start()
+        with pytest.raises(RuntimeError):
+            profiler.start()
+        profiler.stop()
@@ -0,0 +1,51 @@
+import itertools
+import random
+
+import pytest
+
+from littlejohn.libs.random import (
+    xorshift_32_jump,
+    xorshift_32_matrix,
+    xorshift_32_rand,
+    xorshift_32_randint,
+)
+
+SEED = random.randrange(2 ** 31, 2 ** 32)
+
+
+def describe_xorshift_32_jump():
+    @pytest.mark.parametrize("steps", [0, 1, 2, 31, 32, 64, 1000, 4017])
+    @pytest.mark.parametrize(
+        "seed",
+        [
+            pytest.param(SEED, id="32 bits seed"),
+            pytest.param(sum(b" "), id="small seed"),
+            pytest.param(2 ** 40 + 12345, id="seed larger than 32 bits"),
+        ],
+    )
+    def is_equivalent_to_stepping(seed, steps):
+        values = xorshift_32_randint(seed)
+        expected = seed
+        for _ in range(steps):
+            expected = next(values)
+        assert expected == xorshift_32_jump(seed, steps)
+
+    @pytest.mark.parametrize("steps", [0, 1, 64, 1000])
+    def matches_jump_matrix(steps):
+        matrix = xorshift_32_matrix(steps)
+        expected = 0
+        for bit in range(32):
+            if SEED >> bit & 1:
+                expected ^= matrix[bit]
+        assert expected == xorshift_32_jump(SEED, steps)
+
+    def rejects_negative_steps():
+        with pytest.raises(ValueError, match="steps can't be negative"):
+            xorshift_32_jump(SEED, -1)
+
+
+@pytest.mark.parametrize("generator", [xorshift_32_randint, xorshift_32_rand])
+@pytest.mark.parametrize("skip", [0, 1, 365, 365 * 11])
+def test_generators_can_start_at_any_step(generator, skip):
+    expected = list(itertools.islice(generator(SEED), skip, skip + 10))
+    assert expected == list(itertools.islice(generator(SEED, skip=skip), 10))
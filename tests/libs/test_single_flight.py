@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from littlejohn.libs.single_flight import SingleFlight
+
+
+def describe_single_flight():
+    def coalesces_concurrent_calls_with_the_same_key():
+        calls = []
+
+        async def call(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return [key]
+
+        async def main(flights):
+            return await asyncio.gather(
+                *[flights.do(key, lambda key=key: call(key)) for key in "aaab"]
+            )
+
+        flights = SingleFlight()
+        results = asyncio.run(main(flights))
+        assert [["a"], ["a"], ["a"], ["b"]] == results
+        assert results[0] is results[1]
+        assert ["a", "b"] == calls
+        assert {"calls": 4, "coalesced": 2, "in_flight": 0} == flights.stats()
+
+    def does_not_coalesce_sequential_calls():
+        async def call():
+            return object()
+
+        async def main(flights):
+            return [await flights.do("key", call) for _ in range(2)]
+
+        flights = SingleFlight()
+        first, second = asyncio.run(main(flights))
+        assert first is not second
+        assert 0 == flights.stats()["coalesced"]
+
+    def shares_exceptions():
+        async def call():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        async def main(flights):
+            return await asyncio.gather(
+                flights.do("key", call),
+                flights.do("key", call),
+                return_exceptions=True,
+            )
+
+        flights = SingleFlight()
+        results = asyncio.run(main(flights))
+        assert all(isinstance(r, ValueError) for r in results)
+        assert 0 == flights.stats()["in_flight"]
+
+    def cancelled_caller_does_not_cancel_the_others():
+        async def call():
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def main(flights):
+            cancelled = asyncio.ensure_future(flights.do("key", call))
+            waiting = asyncio.ensure_future(flights.do("key", call))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            return await waiting
+
+        assert "result" == asyncio.run(main(SingleFlight()))